@@ -0,0 +1,163 @@
+'''
+module with a persistent index of dated files in a directory
+
+a directory is scanned once and each file name of the form
+<prefix><date><anything><suffix> is mapped to its date. The index is stored
+as json in FILE_INDEX_DIR together with the mtime of the directory and is
+only scanned again when the mtime of the directory changes. The mtime is
+checked at most once every REFRESH_SECONDS, so a range of days costs a single
+stat of the directory rather than a glob per day.
+'''
+
+import os
+import json
+import time
+from datetime import datetime
+from Utils.plogger import Logger
+
+FILE_INDEX_DIR = r'file_index'
+REFRESH_SECONDS = 2.0
+# file systems with a coarse mtime may not show a change made within this time
+MTIME_RESOLUTION = 2.0
+
+
+class FileIndex:
+    '''  index of the files in a directory by date
+
+         Parameters:
+         :prefix: directory and start of the file names, for example
+                  r'RAW_PSS/PSS_', a backslash is accepted as separator
+         :date_format: strftime format of the date in the file name
+         :suffix: end of the file names, for example '.csv'
+         :index_dir: directory of the json file with the stored index
+    '''
+    def __init__(self, prefix, date_format, suffix, index_dir=FILE_INDEX_DIR):
+        self.directory, self.prefix = os.path.split(prefix.replace('\\', '/'))
+        self.date_format = date_format
+        self.suffix = suffix
+        self.date_length = len(datetime(2000, 1, 1).strftime(date_format))
+        self.index_file = os.path.join(
+            index_dir, '_'.join([self.directory.replace('/', '_').strip('_.') or 'cwd',
+                                 self.prefix, suffix.strip('.')]) + '.json')
+        self.logger = Logger.getlogger()
+        self.mtime = None
+        self.scan_time = 0.0
+        self.checked = 0.0
+        self.files = {}
+        self.load()
+
+    def normcase(self, name):
+        # file names match case insensitive on windows like glob
+        return os.path.normcase(name)
+
+    def date_of_file(self, name):
+        '''  date of file name or None if name does not match the index '''
+        _name = self.normcase(name)
+        if not (_name.startswith(self.normcase(self.prefix)) and
+                _name.endswith(self.normcase(self.suffix))):
+            return None
+
+        start = len(self.prefix)
+        if len(name) < start + self.date_length + len(self.suffix):
+            return None
+
+        try:
+            return datetime.strptime(
+                name[start:start + self.date_length], self.date_format).date()
+        except ValueError:
+            return None
+
+    def load(self):
+        '''  read the stored index, an unreadable index is scanned again '''
+        try:
+            with open(self.index_file, 'rt') as index_object:
+                stored = json.load(index_object)
+
+            self.mtime = stored['mtime']
+            self.scan_time = stored['scan_time']
+            self.files = {}
+            for name in stored['files']:
+                _date = self.date_of_file(name)
+                if _date is not None:
+                    self.files.setdefault(_date, []).append(name)
+
+        except (OSError, ValueError, KeyError):
+            self.mtime = None
+
+    def store(self):
+        try:
+            os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
+            tmp_file = f'{self.index_file}.tmp-{os.getpid()}'
+            with open(tmp_file, 'wt') as index_object:
+                json.dump({'directory': self.directory,
+                           'mtime': self.mtime,
+                           'scan_time': self.scan_time,
+                           'files': sorted(name for names in self.files.values()
+                                           for name in names)},
+                          index_object)
+            os.replace(tmp_file, self.index_file)
+
+        except OSError as e:
+            self.logger.info(f'unable to store file index {self.index_file}: {e}')
+
+    def scan(self, mtime):
+        self.files = {}
+        try:
+            with os.scandir(self.directory or '.') as entries:
+                for entry in entries:
+                    _date = self.date_of_file(entry.name)
+                    if _date is not None and entry.is_file():
+                        self.files.setdefault(_date, []).append(entry.name)
+
+        except OSError as e:
+            self.logger.info(f'unable to scan {self.directory}: {e}')
+
+        for names in self.files.values():
+            names.sort()
+
+        self.mtime = mtime
+        self.scan_time = time.time()
+        self.store()
+        self.logger.info(f'scanned {self.directory}: {len(self.files)} dates')
+        for _date, names in self.ambiguous().items():
+            self.logger.warning(f'{self.directory}: more than one file for {_date}: {names}')
+
+    def refresh(self, force=False):
+        '''  scan the directory if its mtime has changed since the last scan '''
+        now = time.time()
+        if not force and now - self.checked < REFRESH_SECONDS:
+            return
+
+        self.checked = now
+        try:
+            mtime = os.stat(self.directory or '.').st_mtime_ns
+        except OSError:
+            mtime = None
+
+        # a change in the same mtime tick as the scan may not show in the mtime
+        unsettled = (self.mtime is not None and
+                     self.mtime / 1e9 > self.scan_time - MTIME_RESOLUTION)
+        if force or mtime != self.mtime or unsettled:
+            self.scan(mtime)
+
+    def files_for_date(self, _date):
+        '''  list of paths of the files for _date '''
+        self.refresh()
+        return [os.path.join(self.directory, name) for name in self.files.get(_date, [])]
+
+    def file_for_date(self, _date):
+        '''  path of the file for _date, None if there is no file or if the
+             match is ambiguous, which is logged with the candidates
+        '''
+        files = self.files_for_date(_date)
+        if len(files) == 1:
+            return files[0]
+
+        if len(files) > 1:
+            self.logger.warning(f'ambiguous files for {_date}: {files}')
+
+        return None
+
+    def ambiguous(self):
+        '''  dict of date: file names for the dates with more than one file '''
+        return {_date: names for _date, names in self.files.items() if len(names) > 1}
@@ -30,7 +30,9 @@ class Logger:
 
     @classmethod
     def getlogger(self):
-        return self.logger
+        ''' the logger, without handlers until set_logger is called
+        '''
+        return getattr(self, 'logger', logging.getLogger(__name__))
 
 
 # def timed(logger):
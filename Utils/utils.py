@@ -1,4 +1,5 @@
 import numpy as np
+import pandas as pd
 from datetime import date
 '''
 module for general purpose utility functions
@@ -36,6 +37,54 @@ def string_to_value_or_nan(string_value, type):
     return value
 
 
+def strings_to_values_or_nan(values, type):
+    '''  vectorized string_to_value_or_nan for an array of values, numbers are
+         taken as they are, so an integral float is a valid int
+         :input: values - array like of values of any type
+         :input: type ['int', 'float', 'date']
+         :output: pandas array, Int64 for int, float64 for float and object
+                  with datetime.date for date, missing values are NA or NaN
+    '''
+    values = pd.Series(values).reset_index(drop=True)
+    is_str = values.map(lambda value: isinstance(value, str)).to_numpy(dtype=bool)
+    numbers = pd.to_numeric(values.where(~is_str), errors='coerce').to_numpy(dtype=np.float64)
+    strings = values[is_str].astype(str)
+    str_index = np.flatnonzero(is_str)
+
+    if type == 'float':
+        numbers[str_index] = pd.to_numeric(strings.str.strip(), errors='coerce').to_numpy(
+            dtype=np.float64)
+        return pd.array(numbers, dtype='float64')
+
+    if type == 'int':
+        valid = np.isfinite(numbers) & (numbers == np.trunc(numbers))
+        is_int = strings.str.match(r'\s*[+-]?\d+\s*$').to_numpy(dtype=bool)
+        numbers[str_index[is_int]] = strings[is_int].astype(np.int64).to_numpy()
+        valid[str_index] = is_int
+        return pd.arrays.IntegerArray(np.where(valid, numbers, 0).astype(np.int64), ~valid)
+
+    assert type == 'date', 'invalid input, must be either int, float or date'
+    # YYYYMMDD, characters of the string value as in string_to_value_or_nan
+    text = values.astype(str)
+    parts = []
+    valid = np.ones(len(text), dtype=bool)
+    for part in (text.str[0:4], text.str[4:6], text.str[6:8]):
+        is_int = part.str.match(r'\s*[+-]?\d+\s*$').fillna(False).to_numpy(dtype=bool)
+        numbers = np.ones(len(part), dtype=np.int64)
+        numbers[is_int] = part[is_int].astype(np.int64).to_numpy()
+        parts.append(numbers)
+        valid &= is_int
+
+    years, months, days = parts
+    valid &= (years >= 1) & (years <= 9999) & (months >= 1) & (months <= 12) & (days >= 1)
+    year_months = np.where(valid, (years - 1970) * 12 + months - 1, 0).astype('M8[M]')
+    dates = year_months.astype('M8[D]') + np.where(valid, days - 1, 0)
+    # days beyond the end of the month run into the next month
+    valid &= dates.astype('M8[M]') == year_months
+    dates = np.where(valid, dates.astype(object), np.nan)
+    return pd.array(dates, dtype=object)
+
+
 def average_with_outlier_removed(input_list, allowed_range):
     '''  calculates average of elements in a list with values within an 
          allowed range. One outlier (i.e. an element with a value that exceeds
@@ -84,4 +133,87 @@ def average_with_outlier_removed(input_list, allowed_range):
         if abs(input_list[1] - input_list[-1]) < allowed_range:
             return sum(input_list[1:])/ (elements - 1)
         else:
-            return None
\ No newline at end of file
+            return None
+
+
+def average_with_outlier_removed_segments(values, offsets, allowed_range):
+    '''  batched version of average_with_outlier_removed. Values is a flat array
+         of segments, segment i is values[offsets[i]:offsets[i+1]]. For each
+         segment the same rules apply as in average_with_outlier_removed and
+         the sums are taken in the same (sorted) order, so the results are
+         identical to calling average_with_outlier_removed per segment.
+
+         Parameter:
+         :values: flat array with the values of all segments
+         :offsets: start of each segment followed by len(values)
+         :allowed_range: range that is allowed for values to deviate
+
+         Return:
+         :averages: average of each segment, NaN if the average is None
+         :valid: boolean array, False where average_with_outlier_removed
+                 would return None
+    '''
+    values = np.asarray(values, dtype=np.float64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    starts = offsets[:-1]
+    counts = np.diff(offsets)
+    segments = counts.size
+
+    # sort the values within each segment
+    segment_ids = np.repeat(np.arange(segments), counts)
+    values = values[np.lexsort((values, segment_ids))]
+
+    # sequential sums of all elements, all but the last and all but the first
+    sum_all = np.zeros(segments)
+    sum_but_last = np.zeros(segments)
+    sum_but_first = np.zeros(segments)
+    for j in range(counts.max() if segments else 0):
+        has_j = np.flatnonzero(counts > j)
+        value_j = values[starts[has_j] + j]
+        sum_all[has_j] += value_j
+        but_last = counts[has_j] - 1 > j
+        sum_but_last[has_j[but_last]] += value_j[but_last]
+        if j > 0:
+            sum_but_first[has_j] += value_j
+
+    averages = np.full(segments, np.nan)
+    valid = np.zeros(segments, dtype=bool)
+    if values.size == 0:
+        return averages, valid
+
+    # first, second, second last and last element of each segment
+    last = np.clip(starts + counts - 1, 0, values.size - 1)
+    first = np.minimum(starts, last)
+    x_0 = values[first]
+    x_1 = values[np.minimum(first + 1, last)]
+    x_l2 = values[np.maximum(last - 1, first)]
+    x_l = values[last]
+
+    # if there is only one element then return this value
+    one = counts == 1
+    averages[one] = x_0[one]
+    valid[one] = True
+
+    # if there are 2 elements they must be within allowed_range
+    two = (counts == 2) & (np.abs(x_1 - x_0) < allowed_range)
+    averages[two] = sum_all[two] / 2
+    valid[two] = True
+
+    # if all elements are within the allowed_range calculate average
+    more = counts > 2
+    all_in = more & (np.abs(x_l - x_0) < allowed_range)
+    averages[all_in] = sum_all[all_in] / counts[all_in]
+    valid[all_in] = True
+
+    # if there is a choice between the two ranges choose the smallest
+    choice = more & ~all_in
+    smallest_first = np.abs(x_0 - x_l2) < np.abs(x_1 - x_l)
+    but_last = choice & smallest_first & (np.abs(x_0 - x_l2) < allowed_range)
+    averages[but_last] = sum_but_last[but_last] / (counts[but_last] - 1)
+    valid[but_last] = True
+
+    but_first = choice & ~smallest_first & (np.abs(x_1 - x_l) < allowed_range)
+    averages[but_first] = sum_but_first[but_first] / (counts[but_first] - 1)
+    valid[but_first] = True
+
+    return averages, valid
@@ -0,0 +1,177 @@
+'''  store of the daily autoseis summary rows in a sqlite database
+
+     table summary has one row per date with the columns of the summary of
+     geo_stats in the order they were first stored, Date is the primary key as
+     text 'YYYY-MM-DD'. A rerun of a date replaces its row (upsert per date), so
+     appending a day does not depend on the length of the season.
+
+     the excel summary is generated from the store on demand in one write. On
+     the first use the rows of an existing excel summary are imported, so the
+     season so far is kept.
+
+     usage: python autoseis_summary.py to write the excel summary from the store
+'''
+
+import os
+import sqlite3
+from datetime import datetime, date
+import numpy as np
+import pandas as pd
+
+from geo_io import df_to_excel_stream
+from Utils.plogger import Logger
+
+SUMMARY_STORE_FILE = r'autoseis_summary.sqlite'
+EXCEL_SUMMARY_FILE = r'autoseis_summary.xlsx'
+DATE_COLUMN = 'Date'
+DATE_FORMAT = '%Y-%m-%d'
+
+logger = Logger.getlogger()
+
+
+def quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def to_sql_value(value):
+    '''  python value for sqlite, null values (None, NaN, NaT) as None and
+         numpy scalars as python scalars
+    '''
+    if isinstance(value, (list, tuple)):
+        value = value[0]
+
+    if isinstance(value, np.generic):
+        value = value.item()
+
+    if pd.isnull(value):
+        return None
+
+    return value
+
+
+class SummaryStore:
+    '''  methods for the sqlite summary store, see module docstring '''
+    def __init__(self, db_file=SUMMARY_STORE_FILE):
+        self.db_file = db_file
+        self.connection = sqlite3.connect(db_file)
+        self.create_tables()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def create_tables(self):
+        with self.connection:
+            self.connection.execute(
+                f'CREATE TABLE IF NOT EXISTS summary ({quote(DATE_COLUMN)} TEXT PRIMARY KEY)')
+
+    def columns(self):
+        return [row[1] for row in self.connection.execute('PRAGMA table_info(summary)')]
+
+    def add_columns(self, columns):
+        '''  add the columns that are not yet in the table, in order '''
+        existing = self.columns()
+        with self.connection:
+            for column in columns:
+                if column not in existing:
+                    self.connection.execute(f'ALTER TABLE summary ADD COLUMN {quote(column)}')
+                    existing.append(column)
+
+    def is_empty(self):
+        return self.connection.execute('SELECT COUNT(*) FROM summary').fetchone()[0] == 0
+
+    def upsert_rows(self, rows):
+        '''  insert or replace the summary rows in a single transaction
+
+             Parameters:
+             :rows: list of dicts of column: value, the value of Date is a date
+                    (or a list of one date as in geo_stats)
+             Returns:
+             :dates: list of the dates 'YYYY-MM-DD' stored
+        '''
+        if not rows:
+            return []
+
+        columns = list(dict.fromkeys(column for row in rows for column in row))
+        self.add_columns(columns)
+
+        dates = []
+        values = []
+        for row in rows:
+            _date = pd.Timestamp(to_sql_value(row[DATE_COLUMN])).strftime(DATE_FORMAT)
+            dates.append(_date)
+            values.append([_date if column == DATE_COLUMN else to_sql_value(row.get(column))
+                           for column in columns])
+
+        updates = ', '.join(f'{quote(column)} = excluded.{quote(column)}'
+                            for column in columns if column != DATE_COLUMN)
+        with self.connection:
+            self.connection.executemany(
+                f'INSERT INTO summary ({", ".join(quote(column) for column in columns)}) '
+                f'VALUES ({", ".join("?" * len(columns))}) '
+                f'ON CONFLICT({quote(DATE_COLUMN)}) DO UPDATE SET {updates}',
+                values)
+
+        return dates
+
+    def upsert_day(self, row):
+        '''  insert or replace the summary row of one date '''
+        _date = self.upsert_rows([row])[0]
+        logger.info(f'stored summary for {_date}')
+
+    def query(self):
+        '''  dataframe of all summary rows sorted by date, Date as datetime.date '''
+        columns = self.columns()
+        summary_df = pd.DataFrame(
+            self.connection.execute(
+                f'SELECT * FROM summary ORDER BY {quote(DATE_COLUMN)}').fetchall(),
+            columns=columns)
+        summary_df[DATE_COLUMN] = [datetime.strptime(_date, DATE_FORMAT).date()
+                                   for _date in summary_df[DATE_COLUMN]]
+        return summary_df
+
+    def import_excel(self, columns, filename=EXCEL_SUMMARY_FILE):
+        '''  import the rows of an excel summary written by df_to_excel, the
+             rows have no header and the columns are matched by position.
+             Rows of which the first cell is not a date are skipped.
+
+             Returns:
+             :number: number of rows imported
+        '''
+        if not os.path.isfile(filename):
+            return 0
+
+        excel_df = pd.read_excel(filename, header=None)
+        if excel_df.shape[1] != len(columns):
+            logger.info(f'{filename} has {excel_df.shape[1]} columns, expected '
+                        f'{len(columns)}, not imported')
+            return 0
+
+        excel_df.columns = columns
+        excel_df = excel_df[[isinstance(value, date) for value in excel_df[DATE_COLUMN]]]
+        dates = self.upsert_rows(excel_df.to_dict('records'))
+        logger.info(f'imported {len(dates)} summary rows from {filename}')
+        return len(dates)
+
+    def export_excel(self, filename=EXCEL_SUMMARY_FILE):
+        '''  write all summary rows sorted by date to filename in one write,
+             without header like the rows appended by df_to_excel before
+        '''
+        summary_df = self.query()
+        df_to_excel_stream(summary_df, filename, header=False)
+        logger.info(f'{len(summary_df)} summary rows written to {filename}')
+        return len(summary_df)
+
+
+if __name__ == '__main__':
+    logformat = '%(asctime)s - %(levelname)s - %(message)s'
+    Logger.set_logger('autoseis.log', logformat, 'INFO')
+
+    with SummaryStore() as summary_store:
+        rows = summary_store.export_excel()
+        print(f'summary rows written to {EXCEL_SUMMARY_FILE}: {rows}')
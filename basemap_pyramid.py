@@ -0,0 +1,248 @@
+'''  tiled multi resolution pyramid of the local basemap
+
+     the map image and its world file (.jgW) are decoded once and cut into
+     tiles of TILE_SIZE pixels at level 0 (full resolution) and at levels of
+     half the resolution of the level below, until a level fits in one tile.
+     The tiles are stored in PYRAMID_DIR with a meta.json with the
+     georeference and the size and mtime of the map image; the pyramid is
+     rebuilt when the map image changes.
+
+     LocalBasemap shows only the tiles that intersect the axes extent at the
+     level that matches the pixel density of the axes and loads them again
+     when the axes are zoomed or panned.
+
+     usage: python basemap_pyramid.py to build the pyramid beforehand
+'''
+
+import os
+import json
+import shutil
+from functools import lru_cache
+import numpy as np
+from PIL import Image
+from Utils.plogger import Logger
+
+MAP_FILE = r'BackgroundMap/3D_31256.jpg'
+PYRAMID_DIR = r'basemap_pyramid'
+META_FILE = 'meta.json'
+TILE_SIZE = 512
+TILE_FORMAT = 'jpg'
+TILE_QUALITY = 90
+TILE_CACHE_SIZE = 64  # decoded tiles kept in memory
+MAX_IMAGE_PIXELS = 2000000000
+
+
+def read_world_file(map_file):
+    '''  georeference of map_file from the world file with extension .jgW
+
+         Returns:
+         :dx, dy: pixel size in x and y (dy negative)
+         :x_min, y_max: coordinates of the upper left corner
+    '''
+    with open(os.path.splitext(map_file)[0] + '.jgW', 'tr') as jgw:
+        dx = float(jgw.readline())
+        _ = jgw.readline()  # to do with rotation of the map to be ignored
+        _ = jgw.readline()  # to do with rotation of the map to be ignored
+        dy = float(jgw.readline())
+        x_min = float(jgw.readline())
+        y_max = float(jgw.readline())
+
+    return dx, dy, x_min, y_max
+
+
+def source_stat(map_file):
+    stat = os.stat(map_file)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def tile_path(pyramid_dir, level, row, col):
+    return os.path.join(pyramid_dir, str(level), f'{row}_{col}.{TILE_FORMAT}')
+
+
+def build_pyramid(map_file=MAP_FILE, pyramid_dir=PYRAMID_DIR):
+    '''  decode map_file once and store its tiles at all levels in pyramid_dir
+
+         Returns:
+         :meta: dict of the georeference, tile size and sizes of the levels
+    '''
+    logger = Logger.getlogger()
+    dx, dy, x_min, y_max = read_world_file(map_file)
+    size, mtime = source_stat(map_file)
+
+    tmp_dir = f'{pyramid_dir}.tmp-{os.getpid()}'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+    image = Image.open(map_file).convert('RGB')
+    levels = []
+    level = 0
+    while True:
+        width, height = image.size
+        levels.append((width, height))
+        os.makedirs(os.path.join(tmp_dir, str(level)))
+        for row in range(-(-height // TILE_SIZE)):
+            for col in range(-(-width // TILE_SIZE)):
+                tile = image.crop((col * TILE_SIZE, row * TILE_SIZE,
+                                   min((col + 1) * TILE_SIZE, width),
+                                   min((row + 1) * TILE_SIZE, height)))
+                tile.save(tile_path(tmp_dir, level, row, col), quality=TILE_QUALITY)
+
+        if width <= TILE_SIZE and height <= TILE_SIZE:
+            break
+
+        image = image.reduce(2)
+        level += 1
+
+    meta = {'source': map_file, 'size': size, 'mtime': mtime,
+            'dx': dx, 'dy': dy, 'x_min': x_min, 'y_max': y_max,
+            'tile_size': TILE_SIZE, 'levels': levels}
+    with open(os.path.join(tmp_dir, META_FILE), 'wt') as meta_object:
+        json.dump(meta, meta_object)
+
+    shutil.rmtree(pyramid_dir, ignore_errors=True)
+    os.replace(tmp_dir, pyramid_dir)
+    read_tile.cache_clear()
+    logger.info(f'basemap pyramid built for {map_file}: {len(levels)} levels, '
+                f'level 0: {levels[0]}')
+    return meta
+
+
+def load_pyramid(map_file=MAP_FILE, pyramid_dir=PYRAMID_DIR):
+    '''  meta of the pyramid of map_file, the pyramid is built if it does not exist
+         or the map image has changed since. Without the map image an existing
+         pyramid is used.
+    '''
+    try:
+        with open(os.path.join(pyramid_dir, META_FILE), 'rt') as meta_object:
+            meta = json.load(meta_object)
+
+    except (OSError, ValueError):
+        meta = None
+
+    try:
+        current = source_stat(map_file)
+    except OSError:
+        current = None
+
+    if meta is None or (current is not None and
+                        current != (meta['size'], meta['mtime'])):
+        meta = build_pyramid(map_file, pyramid_dir)
+
+    return meta
+
+
+@lru_cache(maxsize=TILE_CACHE_SIZE)
+def read_tile(path):
+    with Image.open(path) as tile:
+        return np.asarray(tile.convert('RGB'))
+
+
+class LocalBasemap:
+    '''  basemap of the local map image shown as tiles of the pyramid
+
+         Parameters:
+         :ax: matplotlib axes in the CRS of the map (EPSG_31256_adapted)
+         :map_file: map image with world file
+         :pyramid_dir: directory of the pyramid
+    '''
+    def __init__(self, ax, map_file=MAP_FILE, pyramid_dir=PYRAMID_DIR):
+        self.ax = ax
+        self.pyramid_dir = pyramid_dir
+        self.meta = load_pyramid(map_file, pyramid_dir)
+        self.image = None
+        self.tiles = None
+        self.logger = Logger.getlogger()
+
+        # plain functions are referenced strongly by the callbacks, so the
+        # basemap lives as long as the axes
+        ax.callbacks.connect('xlim_changed', lambda _: self.update())
+        ax.callbacks.connect('ylim_changed', lambda _: self.update())
+        self.update()
+
+    def pixel_size(self, level):
+        '''  pixel size (dx, dy) of level, the halved sizes are rounded up '''
+        width, height = self.meta['levels'][level]
+        width_0, height_0 = self.meta['levels'][0]
+        return self.meta['dx'] * width_0 / width, self.meta['dy'] * height_0 / height
+
+    def select_level(self, x_range):
+        '''  coarsest level with at least the pixel density of the axes '''
+        width_pixels = max(self.ax.get_window_extent().width, 1)
+        map_pixels_per_pixel = x_range / width_pixels / abs(self.meta['dx'])
+        if map_pixels_per_pixel <= 1:
+            return 0
+
+        level = int(np.floor(np.log2(map_pixels_per_pixel)))
+        return min(level, len(self.meta['levels']) - 1)
+
+    def select_tiles(self):
+        '''  level and row, col ranges of the tiles in the axes extent, None if
+             the extent is outside the map
+        '''
+        x0, x1 = sorted(self.ax.get_xlim())
+        y0, y1 = sorted(self.ax.get_ylim())
+        level = self.select_level(x1 - x0)
+        width, height = self.meta['levels'][level]
+        tile_size = self.meta['tile_size']
+        dx, dy = self.pixel_size(level)
+        tile_dx = abs(dx) * tile_size
+        tile_dy = abs(dy) * tile_size
+
+        col_min = max(int(np.floor((x0 - self.meta['x_min']) / tile_dx)), 0)
+        col_max = min(int(np.floor((x1 - self.meta['x_min']) / tile_dx)),
+                      -(-width // tile_size) - 1)
+        row_min = max(int(np.floor((self.meta['y_max'] - y1) / tile_dy)), 0)
+        row_max = min(int(np.floor((self.meta['y_max'] - y0) / tile_dy)),
+                      -(-height // tile_size) - 1)
+        if col_min > col_max or row_min > row_max:
+            return None
+
+        return level, row_min, row_max, col_min, col_max
+
+    def update(self):
+        tiles = self.select_tiles()
+        if tiles == self.tiles:
+            return
+
+        self.tiles = tiles
+        if tiles is None:
+            if self.image is not None:
+                self.image.set_visible(False)
+            return
+
+        level, row_min, row_max, col_min, col_max = tiles
+        mosaic = np.vstack([
+            np.hstack([read_tile(tile_path(self.pyramid_dir, level, row, col))
+                       for col in range(col_min, col_max + 1)])
+            for row in range(row_min, row_max + 1)])
+
+        # extent of the mosaic from its pixels at the pixel size of the level
+        tile_size = self.meta['tile_size']
+        dx, dy = self.pixel_size(level)
+        x_left = self.meta['x_min'] + col_min * tile_size * dx
+        y_top = self.meta['y_max'] + row_min * tile_size * dy
+        extent = (x_left, x_left + mosaic.shape[1] * dx,
+                  y_top + mosaic.shape[0] * dy, y_top)
+
+        if self.image is None:
+            limits = self.ax.axis()
+            self.image = self.ax.imshow(mosaic, extent=extent, interpolation='bilinear')
+            self.ax.axis(limits)
+        else:
+            # the new extent must not autoscale the axes that are being zoomed
+            autoscale = self.ax.get_autoscalex_on(), self.ax.get_autoscaley_on()
+            self.ax.set_autoscale_on(False)
+            self.image.set_data(mosaic)
+            self.image.set_extent(extent)
+            self.image.set_visible(True)
+            self.ax.set_autoscalex_on(autoscale[0])
+            self.ax.set_autoscaley_on(autoscale[1])
+
+        self.logger.info(f'basemap level {level}, rows {row_min}-{row_max}, '
+                         f'cols {col_min}-{col_max}, pixels: {mosaic.shape[:2]}')
+
+
+if __name__ == '__main__':
+    logformat = '%(asctime)s - %(levelname)s - %(message)s'
+    Logger.set_logger('basemap_pyramid.log', logformat, 'INFO')
+    build_pyramid()
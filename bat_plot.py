@@ -1,17 +1,15 @@
 import set_gdal_pyproj_env_vars_and_logger
 from itertools import cycle
-import pandas as pd
+import numpy as np
 import matplotlib.pyplot as plt
 from cycler import cycler
-from geopandas import GeoDataFrame, GeoSeries
 import contextily as ctx
-from shapely.geometry import Point
 
 from Utils.plogger import Logger
 from geo_autoseis import calculate_bat_status
 from geo_io import (GeoData, get_date, df_to_excel,
-                    EPSG_31256_adapted, EPSG_OSM,
                     add_basemap_osm)
+from crs_transform import transform
 
 th_high = 15
 th_mid = 10
@@ -22,6 +20,12 @@ ORANGE = '#FF4F00'
 YELLOW = '#FFFF00'
 GREEN = '#00FF00'
 
+# color and label of the battery status categories of classify_bat_status
+BAT_CATEGORIES = ((GREEN, 'not exceeding'),
+                  (YELLOW, f'> {th_low} days'),
+                  (ORANGE, f'> {th_mid} days'),
+                  (RED, f'> {th_high} days'))
+
 MARKERSIZE = 3
 MARKERSIZE_ERROR = 7
 
@@ -29,55 +33,39 @@ logger = Logger.getlogger()
 nl = '\n'
 
 
+def classify_bat_status(days_over_threshold):
+    '''  category of the battery status of each station by days over threshold
+         input: days_over_threshold: float array, NaN where not applicable
+         return: int array: index in BAT_CATEGORIES, -1 where there is no status
+    '''
+    days = np.asarray(days_over_threshold, dtype=np.float64)
+    return np.select([np.isnan(days), days >= th_high, days >= th_mid, days >= th_low],
+                     [-1, 3, 2, 1], default=0)
+
+
 def plot_bat_status(geo_df, swaths_bnd_gdf):
     ''' function to plot the battery status
         Parameters:
         :geo_df: panda datafram with geophone stations data
-        :swaths_geo_polygon: shapely polygon of selected swaths
+        :swaths_bnd_gdf: GeoDataFrame of the swaths boundary in EPSG_OSM
         Returns: None
     '''
     _, ax = plt.subplots(figsize=(10, 10))
 
     _, _, days_over_threshold = calculate_bat_status(geo_df)
 
-    coordinates = {'1_high': [],
-                   '2_mid': [],
-                   '3_low': [],
-                   '4_ok': [],
-                  }
-    for index, row in geo_df.iterrows():
-        days = days_over_threshold[index]
-
-        if not pd.isnull(days):
-            coordinate_point = Point(row['LocalEasti'], row['LocalNorth'])
-            if days >= th_high:
-                coordinates['1_high'].append(coordinate_point)
-            elif days >= th_mid:
-                coordinates['2_mid'].append(coordinate_point)
-            elif days >= th_low:
-                coordinates['3_low'].append(coordinate_point)
-            else:
-                coordinates['4_ok'].append(coordinate_point)
-        else:
-            pass
-
-
-    # run in reversed key order to plot high days last
-    bat_colors = (GREEN, YELLOW, ORANGE, RED)
-    bat_labels = ('not exceeding', f'> {th_low} days', f'> {th_mid} days',
-                  f'> {th_high} days')
-    for index, (_, coords_for_index) in enumerate(sorted(list(coordinates.items()),
-                                                              key=lambda x:x[0], reverse=True)):
-        colors = [bat_colors[index] for _ in range(len(coords_for_index))]
-        if colors:
-            gdf = GeoDataFrame(crs=EPSG_31256_adapted, geometry=coords_for_index)
-            gdf = gdf.to_crs(f'epsg:{EPSG_OSM}')
-            gdf.plot(ax=ax, alpha=0.4, c=colors, markersize=MARKERSIZE,
-                    label=bat_labels[index])
-        else:
-            pass # just added so I have not overlooked the else!
-
-    swaths_bnd_gdf = swaths_bnd_gdf.to_crs(f'epsg:{EPSG_OSM}')
+    # transform all stations to the map in one go
+    x_map, y_map = transform(geo_df['LocalEasti'].to_numpy(),
+                             geo_df['LocalNorth'].to_numpy(), 'local', 'osm')
+    bat_status = classify_bat_status(days_over_threshold)
+
+    # plot in order of the categories, so high days are plotted last
+    for category, (color, label) in enumerate(BAT_CATEGORIES):
+        in_category = bat_status == category
+        if in_category.any():
+            ax.scatter(x_map[in_category], y_map[in_category], s=MARKERSIZE, c=color,
+                       alpha=0.4, label=label)
+
     swaths_bnd_gdf.plot(ax=ax, facecolor='none', edgecolor='black')
 
     # determine the plot area based on extent of swaths_bnd_gdf
@@ -105,6 +93,7 @@ if __name__ == "__main__":
         _date = get_date()
         valid = gd.read_geo_data(_date)
 
-    swaths, geo_df, _, swaths_bnd_gdf = gd.filter_geo_data_by_swaths(source_boundary=True)
+    swaths, geo_df, _, swaths_bnd_gdf = gd.filter_geo_data_by_swaths(
+        source_boundary=True, crs='osm')
 
     plot_bat_status(geo_df, swaths_bnd_gdf)
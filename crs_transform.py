@@ -0,0 +1,137 @@
+'''  coordinate transformations between the CRS of the project
+
+     the CRS are referred to by name:
+        wgs84: EPSG_WGS84, longitude, latitude of the PSS data
+        local: EPSG_31256_adapted, local easting, northing
+        osm: EPSG_OSM, web mercator of the OpenStreetMap tiles
+
+     Transformers are created once per pair of CRS and cached, coordinates
+     are transformed as numpy arrays in a single call. Axis order is always
+     x, y (longitude, latitude for wgs84).
+
+     python crs_transform.py runs benchmark(), which prints the time of both
+     ways for a season of 150 days of 5000 random VPs each, wgs84 -> local
+     -> osm: a GeoDataFrame of Points with to_crs per day against the bulk
+     arrays with the cached transformers. Timings depend on the machine and
+     the pyproj version.
+'''
+
+import time
+from functools import lru_cache
+import numpy as np
+from geopandas import GeoDataFrame, GeoSeries, points_from_xy
+from pyproj import Transformer
+
+EPSG_31256_adapted = "+proj=tmerc +lat_0=0 +lon_0=16.33333333333333"\
+                     " +k=1 +x_0=+500000 +y_0=0 +ellps=bessel "\
+                     "+towgs84=577.326,90.129,463.919,5.137,1.474,5.297,2.4232 "\
+                     "+units=m +no_defs"
+EPSG_OSM = 3857
+EPSG_WGS84 = 4326
+
+CRS = {'wgs84': f'epsg:{EPSG_WGS84}',
+       'local': EPSG_31256_adapted,
+       'osm': f'epsg:{EPSG_OSM}'}
+
+
+@lru_cache(maxsize=None)
+def get_transformer(from_crs, to_crs):
+    '''  cached Transformer from_crs -> to_crs, names of CRS '''
+    return Transformer.from_crs(CRS[from_crs], CRS[to_crs], always_xy=True)
+
+
+def transform(x, y, from_crs, to_crs):
+    '''  transform coordinate arrays x, y from from_crs to to_crs
+
+         Parameters:
+         :x, y: array likes or scalars of coordinates
+         :from_crs, to_crs: names of CRS, see CRS
+         Returns:
+         :x, y: numpy arrays (floats for scalars) of transformed coordinates
+    '''
+    if np.isscalar(x):
+        if from_crs == to_crs:
+            return float(x), float(y)
+
+        return get_transformer(from_crs, to_crs).transform(x, y)
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if from_crs == to_crs:
+        return x.copy(), y.copy()
+
+    return get_transformer(from_crs, to_crs).transform(x, y)
+
+
+def transform_points(points, from_crs, to_crs):
+    '''  transform a list of (x, y) tuples, returns a list of (x, y) tuples '''
+    if not points:
+        return []
+
+    x, y = transform(*zip(*points), from_crs, to_crs)
+    return list(zip(x.tolist(), y.tolist()))
+
+
+def points_gdf(x, y, crs, to_crs=None, **columns):
+    '''  GeoDataFrame of points x, y in crs, transformed in bulk to to_crs if
+         given, columns are added to the dataframe
+    '''
+    to_crs = crs if to_crs is None else to_crs
+    x, y = transform(x, y, crs, to_crs)
+    return GeoDataFrame(columns, crs=CRS[to_crs], geometry=points_from_xy(x, y))
+
+
+def gdf_to_crs(gdf, from_crs, to_crs):
+    '''  transform a GeoDataFrame or GeoSeries from from_crs to to_crs, point
+         geometries are transformed in bulk with the cached transformer,
+         other geometries by geopandas to_crs
+    '''
+    if gdf.empty or from_crs == to_crs:
+        return gdf
+
+    geometry = gdf.geometry if isinstance(gdf, GeoDataFrame) else gdf
+    if not (geometry.geom_type == 'Point').all():
+        if gdf.crs is None:
+            gdf = gdf.copy()
+            gdf.crs = CRS[from_crs]
+        return gdf.to_crs(CRS[to_crs])
+
+    x, y = transform(geometry.x.to_numpy(), geometry.y.to_numpy(), from_crs, to_crs)
+    points = GeoSeries(points_from_xy(x, y), index=gdf.index, crs=CRS[to_crs])
+    if isinstance(gdf, GeoDataFrame):
+        return gdf.set_geometry(points, crs=CRS[to_crs])
+
+    return points
+
+
+def benchmark(days=150, vps_per_day=5000):
+    '''  compare per day to_crs of Point GeoDataFrames with bulk transforms '''
+    from shapely.geometry import Point
+
+    rng = np.random.default_rng(0)
+    season = [(16.6 + 0.3 * rng.random(vps_per_day), 48.3 + 0.2 * rng.random(vps_per_day))
+              for _ in range(days)]
+
+    start = time.time()
+    for longs, lats in season:
+        gdf = GeoDataFrame(crs=CRS['wgs84'],
+                           geometry=[Point(xy) for xy in zip(longs, lats)])
+        gdf = gdf.to_crs(CRS['local']).to_crs(CRS['osm'])
+    time_to_crs = time.time() - start
+
+    start = time.time()
+    for longs, lats in season:
+        x, y = transform(longs, lats, 'wgs84', 'local')
+        x_map, y_map = transform(x, y, 'local', 'osm')
+    time_bulk = time.time() - start
+
+    error = max(np.abs(gdf.geometry.x.to_numpy() - x_map).max(),
+                np.abs(gdf.geometry.y.to_numpy() - y_map).max())
+    print(f'{days} days of {vps_per_day} VPs, wgs84 -> local -> osm')
+    print(f'per day GeoDataFrame to_crs: {time_to_crs:.2f} s')
+    print(f'bulk arrays, cached transformers: {time_bulk:.2f} s')
+    print(f'max difference: {error:.2e} m')
+
+
+if __name__ == '__main__':
+    benchmark()
@@ -1,5 +1,6 @@
 import set_gdal_pyproj_env_vars_and_logger
-from geo_io import GeoData, get_date, df_to_excel
+from geo_io import GeoData, get_date, df_to_excel_stream
+from autoseis_summary import SummaryStore
 import pandas as pd
 import numpy as np
 from shapely.geometry import Point
@@ -8,7 +9,7 @@ import matplotlib.pyplot as plt
 import collections
 from datetime import date
 from Utils.plogger import Logger
-from Utils.utils import string_to_value_or_nan
+from Utils.utils import strings_to_values_or_nan
 import inspect
 
 
@@ -21,49 +22,64 @@ th_low = 0
 
 # other constants
 logger = Logger.getlogger()
-EXCEL_SUMMARY_FILE = 'autoseis_summary.xlsx'
 NO_VALUE = 999
+BAT_STATUS_CSV = False  # export the battery status as csv instead of xlsx
+
+
+def parse_bat_types(bat_types):
+    '''  battery types as int array like int() per value, 0 where the value is
+         not a number
+    '''
+    bat_types = pd.Series(bat_types).reset_index(drop=True)
+    is_str = bat_types.map(lambda value: isinstance(value, str)).to_numpy(dtype=bool)
+
+    # numbers are truncated, strings must be integers
+    numbers = pd.to_numeric(bat_types.where(~is_str), errors='coerce').to_numpy(dtype=np.float64)
+    valid = np.isfinite(numbers)
+    types = np.where(valid, np.trunc(np.where(valid, numbers, 0)), 0).astype(np.int64)
+
+    strings = bat_types[is_str].astype(str)
+    is_int = strings.str.match(r'\s*[+-]?\d+\s*$').to_numpy(dtype=bool)
+    types[np.flatnonzero(is_str)[is_int]] = strings[is_int].astype(np.int64).to_numpy()
+    return types
 
 
 def calculate_bat_status(geo_df):
     '''  extracts battery status with respect to days in field
          input: geo_df
-         return: 3 lists: list days in field type 1, list days in field type 2
-                          list days over threshold
+         return: 3 float arrays: days in field type 1, days in field type 2
+                                 days over threshold, NaN where not applicable
     '''
-    days_in_field = geo_df['days_in_field'].tolist()
-    bat_types = geo_df['Battype'].tolist()
+    days_in_field = geo_df['days_in_field'].to_numpy(dtype=np.float64)
+    bat_types = parse_bat_types(geo_df['Battype'])
     assert len(days_in_field) == len(bat_types), "check match battype and days_in_field"
 
-    days_in_field_type1, days_in_field_type2, days_over_threshold = [], [], []
-    for bat in zip(bat_types, days_in_field):
-        try:
-            bat_type = int(bat[0])
-        except ValueError:
-            logger.info(f'{inspect.stack()[0][3]} - Exception ValueError: {bat}')
-            bat_type = 0
-            
-        if pd.isnull(bat[1]) or bat_type not in [1, 2]:
-            days_in_field_type1.append(np.NaN)
-            days_in_field_type2.append(np.NaN)
-            days_over_threshold.append(np.NaN)
-
-        elif bat_type == 1:
-            days_in_field_type1.append(bat[1])
-            days_in_field_type2.append(np.NaN)
-            days_over_threshold.append(bat[1] - thresholdtype1)
-
-        elif bat_type == 2:
-            days_in_field_type1.append(np.NaN)
-            days_in_field_type2.append(bat[1])
-            days_over_threshold.append(bat[1] - thresholdtype2)
-
-        else:
-            assert False, "this option cannot happen, check your code"
+    invalid = ~np.isin(bat_types, [1, 2])
+    if invalid.any():
+        logger.info(f'{inspect.stack()[0][3]} - battery type not 1 or 2 in '
+                    f'{np.count_nonzero(invalid)} rows')
+
+    type1 = bat_types == 1
+    type2 = bat_types == 2
+    days_in_field_type1 = np.where(type1, days_in_field, np.nan)
+    days_in_field_type2 = np.where(type2, days_in_field, np.nan)
+    days_over_threshold = np.where(
+        type1, days_in_field - thresholdtype1,
+        np.where(type2, days_in_field - thresholdtype2, np.nan))
 
     return days_in_field_type1, days_in_field_type2, days_over_threshold
 
 
+def count_days_over_threshold(days_over_threshold):
+    '''  number of batteries with days over threshold in the ranges
+         [th_low, th_mid), [th_mid, th_high) and [th_high, inf)
+    '''
+    days = np.asarray(days_over_threshold, dtype=np.float64)
+    days = days[~np.isnan(days)]
+    counts = np.bincount(np.digitize(days, [th_low, th_mid, th_high]), minlength=4)
+    return int(counts[1]), int(counts[2]), int(counts[3])
+
+
 def geo_stats(_date, swaths, geo_df):
     status_codes = collections.OrderedDict()
     status_codes = {'Date': '',
@@ -87,31 +103,27 @@ def geo_stats(_date, swaths, geo_df):
                     f'bats {th_high}d': 0,
                     'swaths': ''}
 
-    # make list of 'GP_TODO' column for rows for specific date '_date'
-    geo_status = geo_df[pd.to_datetime(geo_df['SAVED_TIMESTAMP']).dt.date == _date]['GP_TODO'].tolist()
+    # count the 'GP_TODO' values of the rows for specific date '_date'
+    geo_status = geo_df[pd.to_datetime(geo_df['SAVED_TIMESTAMP']).dt.date == _date]['GP_TODO']
+    status_counts = geo_status.value_counts()
 
-    # get the list of batteries days over threshold
+    # get the array of batteries days over threshold
     _, _, days_over_threshold = calculate_bat_status(geo_df)
 
     total = 0
     total_error = 0
     for key, _ in status_codes.items():
-        count = geo_status.count(key)
+        count = int(status_counts.get(key, 0))
         status_codes[key] = count
         total += count
         if 'needed' in key:
             total_error += count
 
     status_codes['total bats'] = len(days_over_threshold)
-    for days in days_over_threshold:
-        if days >= th_high:
-            status_codes[f'bats {th_high}d'] += 1
-
-        elif days >= th_mid:
-            status_codes[f'bats {th_mid}d'] += 1
-
-        elif days >= th_low:
-            status_codes[f'bats {th_low}d'] +=1
+    bats_low, bats_mid, bats_high = count_days_over_threshold(days_over_threshold)
+    status_codes[f'bats {th_high}d'] += bats_high
+    status_codes[f'bats {th_mid}d'] += bats_mid
+    status_codes[f'bats {th_low}d'] += bats_low
 
 
     # only one field has to be given as list, so dict status_codes can be readily converted to the pandas DataFrame
@@ -123,61 +135,47 @@ def geo_stats(_date, swaths, geo_df):
         status_codes['Perc. bad'] = total_error / status_codes['Total ex pickup']
     except ZeroDivisionError:
         logger.info(f'{inspect.stack()[0][3]} - Exception ZeroDivisionError: {total_error}')
-        status_codes['Perc. bad'] = np.NaN
+        status_codes['Perc. bad'] = np.nan
     
     status_codes['swaths'] = ', '.join([str(swath) for swath in swaths])
 
-    # save the summary to excel
+    # save the summary to the store, a rerun of the date replaces its row
     logger.info(f'date: {_date} -- status codes:\n{status_codes}')
-    df_to_excel(pd.DataFrame(status_codes),EXCEL_SUMMARY_FILE, 
-                       index=False, header=False, append=True)
+    with SummaryStore() as summary_store:
+        if summary_store.is_empty():
+            summary_store.import_excel(list(status_codes))
+        summary_store.upsert_day(status_codes)
     
 
-def output_bat_status_to_excel(geo_df):
-
+def output_bat_status_to_excel(geo_df, csv=BAT_STATUS_CSV):
+    '''  export the battery status per station to YYMMDD_bat_status.xlsx, the
+         columns are converted as arrays and the rows streamed to the workbook,
+         or to YYMMDD_bat_status.csv if csv is True
+    '''
     _, _, days_over_threshold = calculate_bat_status(geo_df)
-    
+
     logger.info(f"count:\n{geo_df.count()}"
                 f"\nlength days_over_threshold {len(days_over_threshold)}")
 
-    bat_status_list = {'Date': [], 
-                       'Line': [],
-                       'Station': [],
-                       'LocalEasting': [],
-                       'LocalNorthing': [],
-                       'Bat_type': [],
-                       'Days_in_field': [],
-                       'Daysoverthreshold': [],
-                      }
-
-    for index, row in geo_df.iterrows():
-        bat_status_list['Date'].append(string_to_value_or_nan(row['OUTDATE'], 'date'))
-        bat_status_list['Line'].append(string_to_value_or_nan(str(row['STATIONVIX'])[0:4], 'int'))
-        bat_status_list['Station'].append(string_to_value_or_nan(str(row['STATIONVIX'])[4:8], 'int'))
-        bat_status_list['LocalEasting'].append(string_to_value_or_nan(row['LocalEasti'], 'float'))
-        bat_status_list['LocalNorthing'].append(string_to_value_or_nan(row['LocalNorth'], 'float'))
-        bat_status_list['Bat_type'].append(string_to_value_or_nan(row['Battype'], 'int'))
-        bat_status_list['Days_in_field'].append(string_to_value_or_nan(row['days_in_field'], 'int'))
-        if not pd.isnull(days_over_threshold[index]):
-            bat_status_list['Daysoverthreshold'].append(string_to_value_or_nan(days_over_threshold[index], 'int'))
-        else:
-            bat_status_list['Daysoverthreshold'].append(NO_VALUE)
-
-    nl ='\n'
-    logger.info(f"{nl}length Date: {len(bat_status_list['Date'])}"
-                f"{nl}length Line: {len(bat_status_list['Line'])}"
-                f"{nl}length Station: {len(bat_status_list['Station'])}"
-                f"{nl}length LocalEasting: {len(bat_status_list['LocalEasting'])}"
-                f"{nl}length LocalNorthing: {len(bat_status_list['LocalNorthing'])}"
-                f"{nl}length Bat_type: {len(bat_status_list['Bat_type'])}"
-                f"{nl}length Days_in_field: {len(bat_status_list['Days_in_field'])}"
-                f"{nl}length Daysoverthreshold: {len(bat_status_list['Daysoverthreshold'])}"
-               ) 
-
-    bat_df = pd.DataFrame(bat_status_list)
-    filename = ''.join([_date.strftime('%Y%m%d')[2:9], '_bat_status.xlsx'])
-    df_to_excel(bat_df, filename=filename, index=False, header=True, append=False)
-    
+    days_over = strings_to_values_or_nan(days_over_threshold, 'int')
+    days_over[np.isnan(days_over_threshold)] = NO_VALUE
+    bat_df = pd.DataFrame({'Date': strings_to_values_or_nan(geo_df['OUTDATE'], 'date'),
+                           'Line': geo_df['Line'].array,
+                           'Station': geo_df['Station'].array,
+                           'LocalEasting': strings_to_values_or_nan(geo_df['LocalEasti'], 'float'),
+                           'LocalNorthing': strings_to_values_or_nan(geo_df['LocalNorth'], 'float'),
+                           'Bat_type': strings_to_values_or_nan(geo_df['Battype'], 'int'),
+                           'Days_in_field': strings_to_values_or_nan(geo_df['days_in_field'], 'int'),
+                           'Daysoverthreshold': days_over,
+                          })
+    logger.info(f'length bat status: {len(bat_df)}')
+
+    filename = ''.join([_date.strftime('%Y%m%d')[2:9], '_bat_status'])
+    if csv:
+        bat_df.to_csv(filename + '.csv', index=False)
+    else:
+        df_to_excel_stream(bat_df, filename + '.xlsx')
+
 
 def bat_histogram(geo_df):
 
@@ -233,6 +231,10 @@ if __name__ == "__main__":
 
     if input('Summarise geo date? [Y/N] ')[0] in ['y', 'Y']:
         geo_stats(_date, swaths, geo_df)
+
+    if input('Write summary to excel? [Y/N] ')[0] in ['y', 'Y']:
+        with SummaryStore() as summary_store:
+            summary_store.export_excel()
     
     output_bat_status_to_excel(geo_df)
     bat_histogram(geo_df)
@@ -1,36 +1,49 @@
-from datetime import date, timedelta
+import os
+from datetime import date, datetime, time, timedelta
 import inspect
 import re
-import glob
+import json
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 import pandas as pd
 import numpy as np
-from openpyxl import load_workbook
-from shapely.geometry import Point
+from openpyxl import Workbook, load_workbook
 from shapely.geometry.polygon import Polygon
 from shapely.ops import cascaded_union
 from geopandas import GeoSeries, GeoDataFrame, read_file, overlay
-import matplotlib.pyplot as plt
-from PIL import Image
 import contextily as ctx
 
 from Utils.plogger import Logger
-from Utils.utils import string_to_value_or_nan
+from Utils.file_index import FileIndex
+from crs_transform import EPSG_31256_adapted, EPSG_OSM, EPSG_WGS84  #pylint: disable=unused-import
+from crs_transform import gdf_to_crs
+from basemap_pyramid import LocalBasemap
+from osm_tiles import add_osm_tiles
 
 PREFIX = r'autoseis_data\OUT_'
 geo_shapefile = './areas_shapes/geo_shapefile.shp'
-EPSG_31256_adapted = "+proj=tmerc +lat_0=0 +lon_0=16.33333333333333"\
-                     " +k=1 +x_0=+500000 +y_0=0 +ellps=bessel "\
-                     "+towgs84=577.326,90.129,463.919,5.137,1.474,5.297,2.4232 "\
-                     "+units=m +no_defs"
-EPSG_OSM = 3857
-EPSG_WGS84 = 4326
+SWATH_FILE = r'./Points+Lines_SW_24_stay.xlsx'
+SWATH_CACHE_FILE = r'swath_cache/swath_table.pickle'
+BOUNDARY_CACHE_FILE = r'swath_cache/boundaries.pickle'
+GEO_CACHE_DIR = r'geo_cache'
+# python types of the values in object columns of the sidecar, the values are
+# stored as text with the index of their type in OBJECT_KINDS
+OBJECT_KINDS = ['none', 'str', 'bool', 'int', 'float', 'timestamp', 'datetime',
+                'date', 'time']
+GEO_WORKERS = 1  # worker processes to read a date range, 1 is serial
+# range of datetime.date as days since 1970-01-01
+DAY_MIN = (date(1, 1, 1) - date(1970, 1, 1)).days
+DAY_MAX = (date(9999, 12, 31) - date(1970, 1, 1)).days
+# columns of the autoseis workbooks used by the tools
+GEO_COLUMNS = ['STATIONVIX', 'LocalEasti', 'LocalNorth', 'Battype', 'BATSTART',
+               'BATSTART_NEW', 'OUTDATE', 'SAVED_TIMESTAMP', 'GP_TODO']
 
 ASK_DATE = 'date (YYMMDD) [q - quit]: '
 
-# start logger
-logformat = '%(asctime)s - %(levelname)s - %(message)s'
-Logger.set_logger('autoseis.log', logformat, 'INFO')
+# the logger is set by the scripts in __main__, not on import
 logger = Logger.getlogger()
+geo_files = FileIndex(PREFIX, '%Y%m%d', '.xlsx')
 
 def get_date():
     _date = input(ASK_DATE)
@@ -75,6 +88,203 @@ def get_date_range():
     return start_date, end_date
 
 
+class SwathTable:
+    '''  swath table of SWATH_FILE with memoized swath geometries
+
+         the parsed table and the geometries of each selected tuple of swaths
+         are kept in memory and pickled to SWATH_CACHE_FILE together with the
+         mtime of the workbook. The workbook is only read again when its mtime
+         changes, otherwise a startup reads the pickle.
+    '''
+    def __init__(self, swath_file=SWATH_FILE, cache_file=SWATH_CACHE_FILE):
+        self.swath_file = swath_file
+        self.cache_file = cache_file
+        self.mtime = None
+        self.swaths = {}
+        self.valid_swaths = []
+        self.geometries = {}
+
+    def load(self):
+        '''  make the table current, from memory, the pickle or the workbook '''
+        mtime = os.stat(self.swath_file).st_mtime_ns
+        if mtime == self.mtime:
+            return
+
+        try:
+            with open(self.cache_file, 'rb') as cache_object:
+                stored = pickle.load(cache_object)
+
+            if stored['mtime'] == mtime:
+                self.mtime = mtime
+                self.swaths = stored['swaths']
+                self.valid_swaths = stored['valid_swaths']
+                self.geometries = stored['geometries']
+                return
+
+        except (OSError, pickle.UnpicklingError, EOFError, KeyError, AttributeError):
+            pass
+
+        swath_df = pd.read_excel(self.swath_file, skiprows=5)
+        self.valid_swaths = swath_df['Swath'].tolist()
+        self.swaths = {}
+        for sd in swath_df[['Swath', '1st RL', 'last RL', '1st GP', 'last GP']].itertuples(
+                index=False, name=None):
+            # the first row of a swath is used
+            self.swaths.setdefault(sd[0], sd[1:])
+
+        self.geometries = {}
+        self.mtime = mtime
+        self.store()
+        logger.info(f'swath table read from {self.swath_file}')
+
+    def store(self):
+        try:
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            tmp_file = f'{self.cache_file}.tmp-{os.getpid()}'
+            with open(tmp_file, 'wb') as cache_object:
+                pickle.dump({'mtime': self.mtime,
+                             'swaths': self.swaths,
+                             'valid_swaths': self.valid_swaths,
+                             'geometries': self.geometries},
+                            cache_object)
+            os.replace(tmp_file, self.cache_file)
+
+        except OSError as e:
+            logger.info(f'unable to store swath cache {self.cache_file}: {e}')
+
+    def geometry(self, swaths):
+        '''  union polygons in (RL, RP) and (easting, northing) and the
+             rectangles of swaths, see swath_selection
+        '''
+        key = tuple(swaths)
+        if key in self.geometries:
+            return self.geometries[key]
+
+        swaths_pnt_polygon = []
+        swaths_geo_polygon = []
+        swaths_rectangles = []
+        for swath in swaths:
+            first_rl, last_rl, first_gp, last_gp = self.swaths[swath]
+            swaths_rectangles.append(
+                (min(first_rl, last_rl), max(first_rl, last_rl),
+                 min(first_gp, last_gp), max(first_gp, last_gp)))
+
+            point1 = (first_rl, first_gp)
+            point2 = (first_rl, last_gp)
+            point3 = (last_rl, last_gp)
+            point4 = (last_rl, first_gp)
+            _polygon = Polygon([point1, point2, point3, point4])
+            swaths_pnt_polygon.append(_polygon)
+
+            eastings, northings = grid_geometry.to_coords(
+                *zip(point1, point2, point3, point4))
+            _polygon = Polygon(zip(eastings, northings))
+            swaths_geo_polygon.append(_polygon)
+
+        self.geometries[key] = (
+            cascaded_union(swaths_pnt_polygon), cascaded_union(swaths_geo_polygon),
+            np.array(swaths_rectangles, dtype=np.float64).reshape(-1, 4))
+        self.store()
+        return self.geometries[key]
+
+
+swath_table = SwathTable()
+
+
+class BoundaryCache:
+    '''  boundaries of the swath selections made from geo_shapefile
+
+         the result of the overlays of the receiver and source boundaries with
+         the swaths is kept in memory and pickled to BOUNDARY_CACHE_FILE, in the
+         CRS local and osm. An entry is keyed by the selected swaths, the
+         source_boundary flag and the mtimes of the shapefile and the swath
+         workbook, entries of other mtimes are dropped when the cache is stored.
+    '''
+    def __init__(self, shapefile=geo_shapefile, cache_file=BOUNDARY_CACHE_FILE):
+        self.shapefile = shapefile
+        self.cache_file = cache_file
+        self.boundaries = None
+
+    def shapefile_mtime(self):
+        # the .shp comes with .shx, .dbf, .prj and others of the same name
+        directory, name = os.path.split(self.shapefile)
+        stem = os.path.splitext(name)[0]
+        with os.scandir(directory or '.') as entries:
+            return max(entry.stat().st_mtime_ns for entry in entries
+                       if os.path.splitext(entry.name)[0] == stem)
+
+    def load(self):
+        try:
+            with open(self.cache_file, 'rb') as cache_object:
+                self.boundaries = pickle.load(cache_object)
+
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            self.boundaries = {}
+
+    def store(self, mtimes):
+        self.boundaries = {key: value for key, value in self.boundaries.items()
+                           if key[2:] == mtimes}
+        try:
+            os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+            tmp_file = f'{self.cache_file}.tmp-{os.getpid()}'
+            with open(tmp_file, 'wb') as cache_object:
+                pickle.dump(self.boundaries, cache_object)
+            os.replace(tmp_file, self.cache_file)
+
+        except OSError as e:
+            logger.info(f'unable to store boundary cache {self.cache_file}: {e}')
+
+    def boundary(self, swaths, swaths_geo_polygon, source_boundary, crs='local'):
+        '''  GeoDataFrame of the boundary of the selected swaths
+
+             Parameters:
+             :swaths: list of selected swaths, empty list for all swaths
+             :swaths_geo_polygon: union of the swaths in (easting, northing)
+             :source_boundary: include the source boundary within the swaths
+             :crs: 'local' or 'osm', None is 'local' (maptype without map)
+             Returns:
+             :swaths_bnd_gdf: GeoDataFrame in crs
+        '''
+        crs = 'local' if crs is None else crs
+        if self.boundaries is None:
+            self.load()
+
+        mtimes = (self.shapefile_mtime(), swath_table.mtime)
+        key = (tuple(swaths), bool(source_boundary and swaths != [])) + mtimes
+        if key not in self.boundaries:
+            swaths_bnd_gdf = overlay_boundary(swaths, swaths_geo_polygon, source_boundary)
+            self.boundaries[key] = {'local': swaths_bnd_gdf,
+                                    'osm': gdf_to_crs(swaths_bnd_gdf, 'local', 'osm')}
+            self.store(mtimes)
+
+        return self.boundaries[key][crs].copy()
+
+
+def overlay_boundary(swaths, swaths_geo_polygon, source_boundary):
+    '''  overlay the boundaries of geo_shapefile with the swaths, see BoundaryCache '''
+    bnd_gdf = read_file(geo_shapefile)
+    bnd_gdf.crs = EPSG_31256_adapted
+    rcv_bnd_gdf = bnd_gdf[bnd_gdf['OBJECTID'] == 1]
+    src_bnd_gdf = bnd_gdf[bnd_gdf['OBJECTID'] > 1]
+    swaths_bnd_gdf = GeoDataFrame(geometry=GeoSeries(swaths_geo_polygon),)
+    swaths_bnd_gdf.crs = EPSG_31256_adapted
+    if swaths_geo_polygon:
+        swaths_bnd_gdf = overlay(rcv_bnd_gdf, swaths_bnd_gdf, how='intersection')
+    else:
+        swaths_bnd_gdf = rcv_bnd_gdf
+
+    if source_boundary and swaths != []:
+        src_bnd_gdf = overlay(src_bnd_gdf, swaths_bnd_gdf, how='intersection')
+        swaths_bnd_gdf = overlay(swaths_bnd_gdf, src_bnd_gdf, how='union')
+    else:
+        pass
+
+    return swaths_bnd_gdf
+
+
+boundary_cache = BoundaryCache()
+
+
 def swath_selection(swaths_selected=None):
     ''' Selection of swath. Swath information taken from the file:
            Points+Lines_SW_24_stay.xlsx
@@ -89,11 +299,12 @@ def swath_selection(swaths_selected=None):
         :swaths: list of selelected swaths, empty list if no swath is selected
         :swaths_pnt_polygon: union of selected swaths polygon in points (RL, RP)
         :swaths_geo_polygon: union of selected swaths polygon in (easting, northing)
+        :swaths_rectangles: array (n, 4) of (min RL, max RL, min RP, max RP) of
+                            the selected swaths
 
     '''
-    swath_file = r'./Points+Lines_SW_24_stay.xlsx'
-    swath_df = pd.read_excel(swath_file, skiprows=5)
-    valid_swaths = swath_df['Swath'].tolist()
+    swath_table.load()
+    valid_swaths = swath_table.valid_swaths
 
     swaths = []
     if swaths_selected is None:
@@ -119,31 +330,98 @@ def swath_selection(swaths_selected=None):
                 if swath in valid_swaths:
                     swaths.append(swath)
 
-    swaths_pnt_polygon = []
-    swaths_geo_polygon = []
-    for swath in swaths:
-        sd = swath_df[swath_df['Swath'] == swath].iloc[0]
+    swaths_pnt_polygon, swaths_geo_polygon, swaths_rectangles = swath_table.geometry(swaths)
+    return swaths, swaths_pnt_polygon, swaths_geo_polygon, swaths_rectangles
+
 
-        point1 = (sd['1st RL'], sd['1st GP'])
-        point2 = (sd['1st RL'], sd['last GP'])
-        point3 = (sd['last RL'], sd['last GP'])
-        point4 = (sd['last RL'], sd['1st GP'])
-        _polygon = Polygon([point1, point2, point3, point4])
-        swaths_pnt_polygon.append(_polygon)
+def stationvix_to_line_station(stationvix):
+    '''  parse receiver line and station from the STATIONVIX values, characters
+         0:4 and 4:8 of the string value, as float arrays with NaN where the
+         characters are not an integer
+    '''
+    stationvix = pd.Series(stationvix)
+    if pd.api.types.is_integer_dtype(stationvix.dtype):
+        values = stationvix.to_numpy(dtype=np.int64)
+        if ((values >= 10_000_000) & (values < 100_000_000)).all():
+            # eight digits LLLLSSSS, same as slicing the string
+            return (values // 10_000).astype(np.float64), (values % 10_000).astype(np.float64)
 
-        point1_coord = transformation(point1)
-        point2_coord = transformation(point2)
-        point3_coord = transformation(point3)
-        point4_coord = transformation(point4)
-        _polygon = Polygon([point1_coord, point2_coord, point3_coord, point4_coord])
-        swaths_geo_polygon.append(_polygon)
+    stationvix = stationvix.astype(str)
+    line_station = []
+    for part in (stationvix.str[0:4], stationvix.str[4:8]):
+        valid = part.str.match(r'\s*[+-]?\d+\s*$').fillna(False).to_numpy(dtype=bool)
+        values = np.full(len(part), np.nan)
+        values[valid] = part[valid].astype(np.int64).to_numpy()
+        line_station.append(values)
 
-    return swaths, cascaded_union(swaths_pnt_polygon), cascaded_union(swaths_geo_polygon)
+    return line_station[0], line_station[1]
+
+
+def yyyyjjj_to_days(values):
+    '''  convert dates as year and julian day YYYYJJJ, characters 0:4 and 4:7 of
+         the string value, to days since 1970-01-01
+
+         Parameters:
+         :values: array like of the dates, any type
+         Returns:
+         :days: int64 array of the day numbers
+         :valid: boolean array, False where the value is not a valid date
+    '''
+    values = pd.Series(values)
+    if values.dtype.kind in 'iuf':
+        numbers = values.to_numpy(dtype=np.float64)
+        finite = np.isfinite(numbers)
+        numbers = np.where(finite, numbers, 0)
+        if ((numbers[finite] >= 1_000_000) & (numbers[finite] < 10_000_000) &
+                (numbers[finite] == np.floor(numbers[finite]))).all():
+            # seven digits YYYYJJJ, same as slicing the string
+            years = np.where(finite, numbers // 1000, 1970).astype(np.int64)
+            julian_days = np.where(finite, numbers % 1000, 1).astype(np.int64)
+            return day_numbers(years, julian_days, finite)
+
+    values = values.astype(str)
+    years_julian_days = []
+    valid = np.ones(len(values), dtype=bool)
+    for part in (values.str[0:4], values.str[4:7]):
+        is_int = part.str.match(r'\s*[+-]?\d+\s*$').fillna(False).to_numpy(dtype=bool)
+        numbers = np.zeros(len(part), dtype=np.int64)
+        numbers[is_int] = part[is_int].astype(np.int64).to_numpy()
+        years_julian_days.append(numbers)
+        valid &= is_int
+
+    return day_numbers(*years_julian_days, valid)
+
+
+def day_numbers(years, julian_days, valid):
+    '''  days since 1970-01-01 of year and julian day, valid is cleared for
+         years or dates outside 1 - 9999
+    '''
+    valid = valid & (years >= 1) & (years <= 9999)
+    years = np.where(valid, years, 1970)
+    year_start = (years - 1970).astype('M8[Y]').astype('M8[D]').astype(np.int64)
+    days = year_start + np.where(valid, julian_days, 1) - 1
+    valid &= (days >= DAY_MIN) & (days <= DAY_MAX)
+    return np.where(valid, days, 0), valid
+
+
+def in_swaths(line, station, swaths_rectangles):
+    '''  boolean mask of the points (line, station) that are in or on the border
+         of any of the swaths_rectangles, see swath_selection
+    '''
+    line = np.asarray(line, dtype=np.float64)
+    station = np.asarray(station, dtype=np.float64)
+    mask = np.zeros(line.shape, dtype=bool)
+    for min_line, max_line, min_station, max_station in swaths_rectangles:
+        mask |= ((line >= min_line) & (line <= max_line) &
+                 (station >= min_station) & (station <= max_station))
+
+    return mask
 
 # 26-8-2019: replaced url: http://tile.stamen.com/terrain/tileZ/tileX/tileY.png'
 # 19-12-2020: rewrite module
 def add_basemap_osm(ax, source=ctx.providers.OpenStreetMap.Mapnik):
-    '''  load the map in OpenStreetMap format from source
+    '''  load the map in OpenStreetMap format from source, tiles are read from
+         the tile cache and only downloaded if not cached, see osm_tiles
 
          Parameters:
          :input:
@@ -152,39 +430,200 @@ def add_basemap_osm(ax, source=ctx.providers.OpenStreetMap.Mapnik):
         :output: none
     '''
     logger.info(f'basemap souce: {source}')
-    ctx.add_basemap(ax, source=source)
+    add_osm_tiles(ax, source=source)
 
 
 def add_basemap_local(ax):
-    '''  load the map in picture format and the georeference information from the jgW file
-         in the same folder; the crs has to be the same as the data
+    '''  show the map in picture format georeferenced by the jgW file in the same
+         folder; the crs has to be the same as the data. The map is shown from
+         the tiles of its pyramid at the resolution and extent of the axes, see
+         basemap_pyramid
          Parameters:
          :input: ax
-         :output: none
+         :output: LocalBasemap, which reloads the tiles on zoom and pan
+    '''
+    basemap = LocalBasemap(ax)
+    meta = basemap.meta
+    logger.info(f'filename: {meta["source"]}, levels: {meta["levels"]}, \n'\
+                f'extent map crs:{EPSG_31256_adapted}: \n {ax.axis()}')
+    return basemap
+
+def encode_object_column(values):
+    '''  text and kind arrays of an object column, so it is stored without
+         pickle. Values of a type not in OBJECT_KINDS are stored as str
+
+         Parameters:
+         :values: numpy object array
+         Returns:
+         :text: numpy unicode array
+         :kinds: int8 array of the index in OBJECT_KINDS
+    '''
+    text, kinds = [], []
+    for value in values:
+        if value is None:
+            kind, value = 'none', ''
+        elif isinstance(value, (bool, np.bool_)):
+            kind, value = 'bool', str(int(value))
+        elif isinstance(value, str):
+            kind = 'str'
+        elif isinstance(value, (int, np.integer)):
+            kind, value = 'int', str(value)
+        elif isinstance(value, (float, np.floating)):
+            kind, value = 'float', repr(float(value))
+        elif isinstance(value, pd.Timestamp) or value is pd.NaT:
+            kind, value = 'timestamp', str(value)
+        elif isinstance(value, (datetime, date, time)):
+            kind, value = type(value).__name__, value.isoformat()
+        else:
+            kind, value = 'str', str(value)
+
+        text.append(value)
+        kinds.append(OBJECT_KINDS.index(kind))
+
+    return np.array(text, dtype=str), np.array(kinds, dtype=np.int8)
+
+
+def decode_object_column(text, kinds):
+    '''  object array of the values encoded by encode_object_column '''
+    decoders = {'none': lambda value: None,
+                'str': str,
+                'bool': lambda value: value == '1',
+                'int': int,
+                'float': float,
+                'timestamp': pd.Timestamp,
+                'datetime': datetime.fromisoformat,
+                'date': date.fromisoformat,
+                'time': time.fromisoformat}
+    values = np.empty(len(text), dtype=object)
+    values[:] = [decoders[OBJECT_KINDS[kind]](value) for value, kind in zip(text, kinds)]
+    return values
+
+
+def read_geo_file(geo_file, cache_dir=GEO_CACHE_DIR):
+    '''  read the GEO_COLUMNS of an autoseis workbook and add the columns Line and
+         Station (nullable integers) parsed from STATIONVIX, other columns of
+         the workbook are not read
+
+         the typed columns are stored in a sidecar <workbook>.npz in cache_dir,
+         which is read instead of the workbook while its size and mtime are
+         unchanged. Object columns are stored as text and kind arrays, see
+         encode_object_column, so the sidecar is loaded without pickle
+
+         Parameters:
+         :geo_file: path of the workbook
+         :cache_dir: directory of the sidecars
+         Returns:
+         :geo_df: pandas DataFrame
+    '''
+    stat = os.stat(geo_file)
+    sidecar = os.path.join(cache_dir, os.path.basename(geo_file) + '.npz')
+    try:
+        with np.load(sidecar, allow_pickle=False) as npz:
+            meta = json.loads(str(npz['meta']))
+            if (meta['size'], meta['mtime']) == (stat.st_size, stat.st_mtime_ns):
+                geo_df = pd.DataFrame({
+                    column: (decode_object_column(npz[column], npz[f'{column}_kinds'])
+                             if column in meta['object_columns'] else npz[column])
+                    for column in meta['columns']})
+                for column in ['Line', 'Station']:
+                    geo_df[column] = pd.arrays.IntegerArray(
+                        npz[column], ~npz[f'{column}_valid'])
+                return geo_df
+
+    except (OSError, ValueError, KeyError, EOFError):
+        pass
+
+    geo_df = pd.read_excel(geo_file, usecols=lambda column: column in GEO_COLUMNS)
+    columns = {}
+    object_columns = []
+    for column in geo_df.columns:
+        if geo_df[column].dtype.kind in 'biufM':
+            columns[column] = geo_df[column].to_numpy()
+        else:
+            columns[column], columns[f'{column}_kinds'] = encode_object_column(
+                geo_df[column].to_numpy(dtype=object))
+            object_columns.append(column)
+
+    line, station = stationvix_to_line_station(geo_df['STATIONVIX'])
+    for column, values in zip(['Line', 'Station'], [line, station]):
+        valid = ~np.isnan(values)
+        columns[column] = np.where(valid, values, 0).astype(np.int64)
+        columns[f'{column}_valid'] = valid
+        geo_df[column] = pd.arrays.IntegerArray(columns[column], ~valid)
+
+    meta = {'size': stat.st_size, 'mtime': stat.st_mtime_ns,
+            'columns': [column for column in geo_df.columns
+                        if column not in ['Line', 'Station']],
+            'object_columns': object_columns}
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_file = f'{sidecar}.tmp-{os.getpid()}'
+        with open(tmp_file, 'wb') as sidecar_object:
+            np.savez(sidecar_object, meta=json.dumps(meta), **columns)
+        os.replace(tmp_file, sidecar)
+
+    except OSError as e:
+        logger.info(f'unable to store sidecar {sidecar}: {e}')
+
+    return geo_df
+
+
+def read_geo_day(_date, checked_only=False):
+    '''  read the autoseis workbook of _date with read_geo_file and add the
+         column date
+
+         Parameters:
+         :_date: datetime.date
+         :checked_only: keep only the rows with SAVED_TIMESTAMP on _date
+         Returns:
+         :geo_df: pandas DataFrame, None if there is no workbook for _date
+    '''
+    _geo_file = geo_files.file_for_date(_date)
+    if _geo_file is None:
+        return None
+
+    try:
+        geo_df = read_geo_file(_geo_file)
+
+    except FileNotFoundError:
+        logger.info(f'{inspect.stack()[0][3]} - Exception FileNotFoundError": '\
+                    f'{_geo_file}')
+        return None
+
+    if checked_only:
+        saved = pd.to_datetime(geo_df['SAVED_TIMESTAMP'], errors='coerce')
+        geo_df = geo_df[(saved.dt.normalize() == pd.Timestamp(_date)).to_numpy()]
+
+    geo_df.insert(0, 'date', pd.Timestamp(_date))
+    return geo_df.reset_index(drop=True)
+
+
+def read_geo_days(days, checked_only=False, workers=GEO_WORKERS):
+    '''  read the autoseis workbooks of days in a process pool if workers > 1
+
+         Parameters:
+         :days: list of datetime.date
+         :checked_only: keep only the rows saved on their day, see read_geo_day
+         :workers: number of worker processes, 1 is serial
+         Returns:
+         :geo_df: one pandas DataFrame of all days in the order of days with
+                  the column date (datetime64), empty if there are no workbooks
     '''
-    MAP_FILE = r'BackgroundMap/3D_31256.jpg'
-    Image.MAX_IMAGE_PIXELS = 2000000000
-
-    # read the map image file and set the extent
-    fname_jgW = MAP_FILE[:-4] + '.jgW'
-    basemap = plt.imread(MAP_FILE)
-    cols = basemap.shape[0]
-    rows = basemap.shape[1]
-
-    with open(fname_jgW, 'tr') as jgw:
-        dx = float(jgw.readline())
-        _ = jgw.readline()  # to do with rotation of the map to be ignored
-        _ = jgw.readline()  # to do with rotation of the map to be ignored
-        dy = float(jgw.readline())
-        x_min = float(jgw.readline())
-        y_max = float(jgw.readline())
-
-    x_max = x_min + rows * dx
-    y_min = y_max + cols * dy
-    logger.info(f'filename: {MAP_FILE}, (rows: {rows}, colums: {cols}), \n'\
-                f'extent map crs:{EPSG_31256_adapted}: \n {(x_min, x_max, y_min, y_max)}')
-
-    ax.imshow(basemap, extent=(x_min, x_max, y_min, y_max), interpolation='bilinear')
+    read_day = partial(read_geo_day, checked_only=checked_only)
+    if workers > 1 and len(days) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(days))) as executor:
+            geo_dfs = list(executor.map(read_day, days))
+
+    else:
+        geo_dfs = [read_day(_date) for _date in days]
+
+    geo_dfs = [geo_df for geo_df in geo_dfs if geo_df is not None]
+    logger.info(f'geo data read for {len(geo_dfs)} of {len(days)} days')
+    if not geo_dfs:
+        return pd.DataFrame(columns=['date'] + GEO_COLUMNS + ['Line', 'Station'])
+
+    return pd.concat(geo_dfs, ignore_index=True)
+
 
 class GeoData:
     '''  method for handling Geo data '''
@@ -192,23 +631,26 @@ class GeoData:
         self.geo_df = None
 
     def read_geo_data(self, _date):
+        '''  read the autoseis workbook of _date with read_geo_file, only the
+             GEO_COLUMNS and Line, Station are kept, and add days_in_field
+
+             Returns:
+             :read_is_valid: boolean, False if there is no workbook for _date
+        '''
         read_is_valid = False
-        _geo_file = ''.join([PREFIX,
-                             f'{_date.year:04}', f'{_date.month:02}', f'{_date.day:02}',
-                             f'*.xlsx'])
-        _geo_file = glob.glob(_geo_file)
+        _geo_file = geo_files.file_for_date(_date)
         logger.info(f'filename: {_geo_file}')
 
-        if len(_geo_file) == 1:
+        if _geo_file is not None:
             try:
-                self.geo_df = pd.read_excel(_geo_file[0])
+                self.geo_df = read_geo_file(_geo_file)
                 self.date = _date
                 self.add_bat_days_in_field_to_df()
                 read_is_valid = True
 
             except FileNotFoundError:
                 logger.info(f'{inspect.stack()[0][3]} - Exception FileNotFoundError": '\
-                            f'{_geo_file[0]}')
+                            f'{_geo_file}')
         else:
             pass
 
@@ -218,47 +660,40 @@ class GeoData:
             return False
 
     def get_geo_df(self):
+        '''  geo_df of read_geo_data: the GEO_COLUMNS of the workbook, Line,
+             Station and days_in_field, other columns are not read
+        '''
         return self.geo_df
 
     def add_bat_days_in_field_to_df(self):
-        days_in_field = []
-        for _, row in self.geo_df.iterrows():
-            bat_start = str(row['BATSTART'])
-            try:
-                _year = int(bat_start[0:4])
-                _julianday = int(bat_start[4:7])
-                _date_bat_start = date(_year, 1, 1) + timedelta(_julianday - 1)
-            except ValueError:
-                logger.info(f'{inspect.stack()[0][3]} '\
-                            f'- Exception ValueError - bat_start: {bat_start}')
-                _date_bat_start = date(1900, 1, 1)
-
-            bat_start_new = str(row['BATSTART_NEW'])
-            try:
-                _year = int(bat_start_new[0:4])
-                _julianday = int(bat_start_new[4:7])
-                _date_bat_start_new = date(_year, 1, 1) + timedelta(_julianday - 1)
-            except ValueError:
-                _date_bat_start_new = date(1900, 1, 1)
-
-            _date_bat_start = max(_date_bat_start_new, _date_bat_start)
-            if _date_bat_start != date(1900, 1, 1):
-                _days_in_field = (self.date - _date_bat_start).days
-            else:
-                _days_in_field = np.NaN
-
-            days_in_field.append(_days_in_field)
+        '''  days in field of the battery since the latest of BATSTART and
+             BATSTART_NEW (YYYYJJJ), NaN if neither is a valid date
+        '''
+        bat_start, valid = yyyyjjj_to_days(self.geo_df['BATSTART'])
+        bat_start_new, valid_new = yyyyjjj_to_days(self.geo_df['BATSTART_NEW'])
+        if not valid.all():
+            logger.warning(f'{inspect.stack()[0][3]} - invalid BATSTART in '
+                           f'{np.count_nonzero(~valid)} of {len(valid)} rows')
+
+        # invalid dates count as 1900-01-01, which is no date at all
+        no_date = (date(1900, 1, 1) - date(1970, 1, 1)).days
+        bat_start = np.maximum(np.where(valid, bat_start, no_date),
+                               np.where(valid_new, bat_start_new, no_date))
+        _date = (self.date - date(1970, 1, 1)).days
+        days_in_field = np.where(bat_start != no_date, _date - bat_start, np.nan)
 
         # add the columns to the dataframe
         self.geo_df['days_in_field'] = days_in_field
 
 
     def filter_geo_data_by_swaths(self, swaths_selected=None, swaths_only=False,
-                                  source_boundary=False):
+                                  source_boundary=False, crs='local'):
         ''' method to select geo_data depending on swaths selected
             Parameters:
             :self: instance of GeoData
             :swaths_only: boolean - True if swath selection is required, default False
+            :source_boundary: boolean - include the source boundary, default False
+            :crs: CRS of the boundary 'local' or 'osm', default 'local'
             Returns:
             :_date: date in datetime.date format
             :swaths: list of selected swaths
@@ -266,37 +701,17 @@ class GeoData:
             :swaths_pnt_polygon: union of selected swaths polygon in points (RL, RP)
             :swaths_geo_polygon: union of selected swaths polygon in (easting, northing)
         '''
-        swaths, swaths_pnt_polygon, swaths_geo_polygon = swath_selection(
+        swaths, swaths_pnt_polygon, swaths_geo_polygon, swaths_rectangles = swath_selection(
             swaths_selected=swaths_selected)
-        bnd_gdf = read_file(geo_shapefile)
-        bnd_gdf.crs = EPSG_31256_adapted
-        rcv_bnd_gdf = bnd_gdf[bnd_gdf['OBJECTID'] == 1]
-        src_bnd_gdf = bnd_gdf[bnd_gdf['OBJECTID'] > 1]
-        swaths_bnd_gdf = GeoDataFrame(geometry=GeoSeries(swaths_geo_polygon),)
-        swaths_bnd_gdf.crs = EPSG_31256_adapted
-        if swaths_pnt_polygon:
-            swaths_bnd_gdf = overlay(rcv_bnd_gdf, swaths_bnd_gdf, how='intersection')
-        else:
-            swaths_bnd_gdf = rcv_bnd_gdf
-
-        if source_boundary and swaths != []:
-            src_bnd_gdf = overlay(src_bnd_gdf, swaths_bnd_gdf, how='intersection')
-            swaths_bnd_gdf = overlay(swaths_bnd_gdf, src_bnd_gdf, how='union')
-        else:
-            pass
+        swaths_bnd_gdf = boundary_cache.boundary(
+            swaths, swaths_geo_polygon, source_boundary, crs=crs)
 
         if not swaths_only and swaths_pnt_polygon:
-            for index, row in self.geo_df.iterrows():
-                # check if point is within swath selection
-                line = string_to_value_or_nan(str(row['STATIONVIX'])[0:4], 'int')
-                station = string_to_value_or_nan(str(row['STATIONVIX'])[4:8], 'int')
-                point = Point(line, station)
-                if swaths_pnt_polygon.contains(point) or \
-                   swaths_pnt_polygon.intersects(point):
-                    pass  # point is in or on the polygon
-                else:
-                    self.geo_df = self.geo_df.drop([index])
-
+            # points in or on the swaths, NaN line or station is never inside
+            line = self.geo_df['Line'].astype('float64').to_numpy()
+            station = self.geo_df['Station'].astype('float64').to_numpy()
+            mask = in_swaths(line, station, swaths_rectangles)
+            self.geo_df = self.geo_df[mask]
             self.geo_df = self.geo_df.reset_index(drop=True)
 
         else:
@@ -371,35 +786,108 @@ def df_to_excel(df, filename, sheet_name='Sheet1', startrow=None,
                 exit()
 
 
+AZIMUTH = 30.0  # degrees, azimuth of the receiver lines of the prospect
+POINT_0 = (3400., 4213.)  # SPS receiver point (RL, RP) of the origin
+COORD_0 = (491074., 5358167.)  # (Easting, Northing) of the origin
+LINE_SPACING = 10.0  # m per RL number
+STATION_SPACING = 10.0  # m per RP number
+
+
+class GridGeometry:
+    '''  affine transformation between the grid of the prospect (RL, RP) and
+         (Easting, Northing), precomputed once from the azimuth, origin and
+         spacings. All methods take scalars or arrays and transform whole
+         arrays in one step.
+
+         crossline is along increasing RL, positive counterclockwise, inline is
+         along increasing RP, negative along the azimuth vector
+    '''
+    def __init__(self, azimuth=AZIMUTH, point_0=POINT_0, coord_0=COORD_0,
+                 line_spacing=LINE_SPACING, station_spacing=STATION_SPACING):
+        azimuth = np.radians(azimuth)
+        # unit vectors (dx, dy) of crossline and inline offsets in the columns
+        self.rotation = np.array([[np.cos(azimuth), -np.sin(azimuth)],
+                                  [-np.sin(azimuth), -np.cos(azimuth)]])
+        self.matrix = self.rotation @ np.diag([line_spacing, station_spacing])
+        self.inverse = np.linalg.inv(self.matrix)
+        self.point_0 = np.array(point_0, dtype=np.float64)
+        self.coord_0 = np.array(coord_0, dtype=np.float64)
+
+    @staticmethod
+    def _stack(u, v):
+        return np.stack(np.broadcast_arrays(
+            np.asarray(u, dtype=np.float64), np.asarray(v, dtype=np.float64)), axis=-1)
+
+    def to_coords(self, line, station):
+        '''  (RL, RP) to (Easting, Northing)
+
+             Parameters:
+             :line, station: receiver line and receiver point, scalars or arrays
+             Returns:
+             :easting, northing: arrays of the shape of line, station
+        '''
+        points = self._stack(line, station) - self.point_0
+        coords = points @ self.matrix.T + self.coord_0
+        return coords[..., 0], coords[..., 1]
+
+    def to_grid(self, easting, northing):
+        '''  (Easting, Northing) to fractional (RL, RP), inverse of to_coords '''
+        coords = self._stack(easting, northing) - self.coord_0
+        points = coords @ self.inverse.T + self.point_0
+        return points[..., 0], points[..., 1]
+
+    def nearest_grid_point(self, easting, northing):
+        '''  nearest (RL, RP) as integer arrays and the distance in m between
+             (Easting, Northing) and the grid point
+        '''
+        line, station = self.to_grid(easting, northing)
+        line, station = np.rint(line), np.rint(station)
+        grid_easting, grid_northing = self.to_coords(line, station)
+        distance = np.hypot(np.asarray(easting) - grid_easting,
+                            np.asarray(northing) - grid_northing)
+        return line.astype(np.int64), station.astype(np.int64), distance
+
+    def offsets(self, inline_offset, crossline_offset):
+        '''  inline and crossline offsets in m to (delta_easting, delta_northing) '''
+        deltas = self._stack(crossline_offset, inline_offset) @ self.rotation.T
+        return deltas[..., 0], deltas[..., 1]
+
+    def patch_corners(self, x, y, inline_offset, crossline_offset):
+        '''  corners of rotated patches around center points
+
+             Parameters:
+             :x, y: (Easting, Northing) of the center points, scalars or arrays
+             :inline_offset, crossline_offset: half sizes of the patch in m
+             Returns:
+             :corners: array (..., 4, 2) of the corners (Easting, Northing) in
+                       the order (+inline, +crossline), (+inline, -crossline),
+                       (-inline, -crossline), (-inline, +crossline)
+        '''
+        dx, dy = self.offsets(
+            np.array([1., 1., -1., -1.]) * inline_offset,
+            np.array([1., -1., -1., 1.]) * crossline_offset)
+        centers = self._stack(x, y)[..., np.newaxis, :]
+        return centers + np.stack([dx, dy], axis=-1)
+
+
+grid_geometry = GridGeometry()
+
+
 def transformation(point):
-    ''' transformation from RL-RP to Easting/ Northting
-        Origin point taken from SPS receiver point 3400-4213
-        Azimuth angle of prospect is 30 degrees
+    ''' transformation from RL-RP to Easting/ Northting, see GridGeometry
 
         Parameters:
         :point: a tuple of receiver line and receiver point (RL, RP)
         Returns:
         :transformed_point: a tuple of transformed point in (Easting, Northing)
     '''
-    azimuth = (np.pi * 30 / 180)  # converted to radians
-    dx_crossline = 10.0 * np.cos(azimuth)
-    dy_crossline = -10.0 * np.sin(azimuth)
-    dx_inline = -10.0 * np.sin(azimuth)
-    dy_inline = -10.0 * np.cos(azimuth)
-    POINT_0 = (3400., 4213.)
-    COORD_0 = (491074., 5358167.)
-
-    transformed_point = ((point[0] - POINT_0[0]) * dx_crossline +
-                         (point[1] - POINT_0[1]) * dx_inline + COORD_0[0],
-                         (point[0] - POINT_0[0]) * dy_crossline +
-                         (point[1] - POINT_0[1]) * dy_inline + COORD_0[1])
-    return transformed_point
+    easting, northing = grid_geometry.to_coords(*point)
+    return float(easting), float(northing)
 
 
 def offset_transformation(inline_offset, crossline_offset):
     '''  transformation from inline_offset, crossline offset to delta_easting,
-         delta_northing
-         Azimuth angle of prospect is 30 degrees
+         delta_northing, see GridGeometry
 
          Parameters:
          :inline_offset: inline offset in meters, negative along azimuth vector (float)
@@ -408,10 +896,38 @@ def offset_transformation(inline_offset, crossline_offset):
          :dx: (m) change in x direction (float)
          :dy: (m) change in y direction (float)
     '''
-    azimuth = (np.pi * 30 / 180)  # converted to radians
-    dx_crossline = crossline_offset * np.cos(azimuth)
-    dy_crossline = -crossline_offset * np.sin(azimuth)
-    dx_inline = -inline_offset * np.sin(azimuth)
-    dy_inline = -inline_offset * np.cos(azimuth)
+    dx, dy = grid_geometry.offsets(inline_offset, crossline_offset)
+    return float(dx), float(dy)
+
 
-    return dx_inline + dx_crossline, dy_inline + dy_crossline
+def df_to_excel_stream(df, filename, sheet_name='Sheet1', header=True):
+    '''  write a DataFrame to a new workbook with openpyxl in write-only mode,
+         rows are streamed to the file so memory does not grow with the cells.
+         The index is not written, NaN and NA are written as empty cells.
+
+         Parameters:
+         :df: dataframe to save
+         :filename: path of the workbook, an existing file is replaced
+         :sheet_name: name of the sheet
+         :header: write the column names as the first row
+         Returns: None
+    '''
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(sheet_name)
+    if header:
+        sheet.append([str(column) for column in df.columns])
+
+    columns = [df[column].astype(object).where(df[column].notna(), None).tolist()
+               for column in df.columns]
+    for row in zip(*columns):
+        sheet.append(row)
+
+    # save the workbook
+    valid = False
+    while not valid:
+        try:
+            workbook.save(filename)
+            valid = True
+        except PermissionError:
+            if input(f'Close file {filename} and enter or quit [Q] ') in ['q', 'Q']:
+                exit()
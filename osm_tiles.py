@@ -0,0 +1,279 @@
+'''  disk cache of the OpenStreetMap tiles for add_basemap_osm
+
+     tiles are stored as OSM_CACHE_DIR/<url key>/<z>/<x>/<y>.png, the url key
+     is a hash of the tile url so tiles of other servers are kept apart. A tile
+     is only downloaded if it is not in the cache. The total size of the cache
+     is capped by OSM_CACHE_MAX_BYTES, the least recently used tiles (by mtime,
+     which is touched on every read) are evicted first. The size is tracked from
+     the first download on, the cache is only walked to evict when it is over
+     the cap.
+
+     in offline mode no tiles are downloaded, a map is rendered from the
+     cached tiles only at the highest zoom that is fully cached.
+
+     OSM_TILE_URL overrides the url of the source, for example a local tile
+     server 'http://localhost:8000/{z}/{x}/{y}.png', OSM_OFFLINE=1 sets the
+     offline mode, both can be set as environment variables.
+
+     usage: python osm_tiles.py zoom [zoom ...]
+        downloads all tiles covering the boundary of the survey at the zoom levels
+'''
+
+import os
+import sys
+import io
+import hashlib
+import numpy as np
+import requests
+import mercantile
+from PIL import Image
+from shapely.geometry import box
+import contextily as ctx
+from crs_transform import transform
+from Utils.plogger import Logger
+
+OSM_CACHE_DIR = r'osm_tile_cache'
+OSM_CACHE_MAX_BYTES = 1024**3
+OSM_TILE_URL = os.environ.get('OSM_TILE_URL')
+OSM_OFFLINE = os.environ.get('OSM_OFFLINE', '0').lower() in ['1', 'true', 'yes']
+OSM_SOURCE = ctx.providers.OpenStreetMap.Mapnik
+USER_AGENT = 'geo_autoseis basemap'
+TIMEOUT = 10  # seconds
+TILE_PIXELS = 256
+
+
+class TileCache:
+    '''  disk cache of map tiles of one url
+
+         Parameters:
+         :url: tile url with {z}, {x}, {y}, by default of OSM_SOURCE,
+               OSM_TILE_URL takes precedence
+         :offline: only read tiles from the cache
+         :cache_dir: directory of the cache
+         :max_bytes: cap of the size of the cache
+    '''
+    def __init__(self, url=None, offline=None, cache_dir=OSM_CACHE_DIR,
+                 max_bytes=OSM_CACHE_MAX_BYTES):
+        self.url = OSM_TILE_URL or url or source_url(OSM_SOURCE)
+        self.offline = OSM_OFFLINE if offline is None else offline
+        self.tile_dir = os.path.join(
+            cache_dir, hashlib.sha1(self.url.encode()).hexdigest()[:12])
+        self.max_bytes = max_bytes
+        self.logger = Logger.getlogger()
+        self.session = None
+        self.size = None  # bytes of the tiles in the cache, None until a download
+
+    def tile_path(self, tile):
+        return os.path.join(self.tile_dir, str(tile.z), str(tile.x), f'{tile.y}.png')
+
+    def is_cached(self, tile):
+        return os.path.isfile(self.tile_path(tile))
+
+    def download(self, tile):
+        '''  download tile into the cache, returns the bytes or None on failure '''
+        if self.session is None:
+            self.session = requests.Session()
+            self.session.headers['User-Agent'] = USER_AGENT
+
+        url = self.url.format(z=tile.z, x=tile.x, y=tile.y)
+        try:
+            response = self.session.get(url, timeout=TIMEOUT)
+            response.raise_for_status()
+
+        except requests.RequestException as e:
+            self.logger.info(f'unable to download tile {url}: {e}')
+            return None
+
+        path = self.tile_path(tile)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_file = f'{path}.tmp-{os.getpid()}'
+        with open(tmp_file, 'wb') as tile_object:
+            tile_object.write(response.content)
+        os.replace(tmp_file, path)
+        if self.size is None:
+            self.size = self.cache_size()
+        else:
+            self.size += len(response.content)
+        return response.content
+
+    def get(self, tile):
+        '''  tile as RGBA array, from the cache or downloaded, None if the tile
+             is not available
+        '''
+        path = self.tile_path(tile)
+        try:
+            with open(path, 'rb') as tile_object:
+                content = tile_object.read()
+            os.utime(path)  # most recently used
+
+        except OSError:
+            content = None if self.offline else self.download(tile)
+
+        if content is None:
+            return None
+
+        try:
+            with Image.open(io.BytesIO(content)) as image:
+                return np.asarray(image.convert('RGBA'))
+
+        except OSError as e:
+            self.logger.info(f'invalid tile {path}: {e}')
+            return None
+
+    def cache_size(self):
+        '''  total bytes of the tiles in the cache '''
+        return sum(os.path.getsize(os.path.join(directory, name))
+                   for directory, _, names in os.walk(self.tile_dir) for name in names)
+
+    def evict(self):
+        '''  remove least recently used tiles until the cache is within max_bytes '''
+        tiles = []
+        for directory, _, names in os.walk(self.tile_dir):
+            for name in names:
+                path = os.path.join(directory, name)
+                stat = os.stat(path)
+                tiles.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in tiles)
+        self.size = total
+        if total <= self.max_bytes:
+            return
+
+        for _, size, path in sorted(tiles):
+            os.remove(path)
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+        self.size = total
+        self.logger.info(f'evicted tiles from {self.tile_dir}, size: {total} bytes')
+
+    def finish(self):
+        '''  evict if the tracked size of the cache is over max_bytes, the cache
+             is only walked once to start tracking on the first download
+        '''
+        if self.size is not None and self.size > self.max_bytes:
+            self.evict()
+
+    def mosaic(self, tiles):
+        '''  RGBA array of the tiles and its extent in EPSG_OSM, missing tiles
+             are transparent
+        '''
+        xs = [tile.x for tile in tiles]
+        ys = [tile.y for tile in tiles]
+        x_min, y_min = min(xs), min(ys)
+        image = np.zeros(((max(ys) - y_min + 1) * TILE_PIXELS,
+                          (max(xs) - x_min + 1) * TILE_PIXELS, 4), dtype=np.uint8)
+        missing = 0
+        for tile in tiles:
+            array = self.get(tile)
+            if array is None or array.shape[:2] != (TILE_PIXELS, TILE_PIXELS):
+                missing += 1
+                continue
+
+            row, col = (tile.y - y_min) * TILE_PIXELS, (tile.x - x_min) * TILE_PIXELS
+            image[row:row + TILE_PIXELS, col:col + TILE_PIXELS] = array
+
+        if missing:
+            self.logger.info(f'{missing} of {len(tiles)} tiles not available')
+
+        self.finish()
+        upper_left = mercantile.xy_bounds(mercantile.Tile(x_min, y_min, tiles[0].z))
+        lower_right = mercantile.xy_bounds(mercantile.Tile(max(xs), max(ys), tiles[0].z))
+        extent = (upper_left.left, lower_right.right, lower_right.bottom, upper_left.top)
+        return image, extent
+
+    def prefetch(self, boundary, zooms):
+        '''  download the tiles intersecting boundary at zooms
+
+             Parameters:
+             :boundary: shapely geometry in EPSG_OSM
+             :zooms: list of zoom levels
+             Returns:
+             :fetched, cached: number of tiles downloaded and already cached
+        '''
+        fetched, cached = 0, 0
+        west, south, east, north = bounds_to_lonlat(boundary.bounds)
+        for tile in mercantile.tiles(west, south, east, north, zooms):
+            if not boundary.intersects(box(*mercantile.xy_bounds(tile))):
+                continue
+
+            if self.is_cached(tile):
+                cached += 1
+            elif self.download(tile) is not None:
+                fetched += 1
+
+        self.finish()
+        self.logger.info(f'prefetch zooms {zooms}: {fetched} tiles downloaded, '
+                         f'{cached} tiles cached')
+        return fetched, cached
+
+
+def source_url(source):
+    '''  tile url of a contextily provider with {z}, {x}, {y} '''
+    if hasattr(source, 'build_url'):
+        return source.build_url()
+
+    # providers of older contextily versions are plain dicts
+    return source['url'].replace('{s}', source.get('subdomains', 'a')[0])
+
+
+def bounds_to_lonlat(bounds):
+    '''  (xmin, ymin, xmax, ymax) in EPSG_OSM to (west, south, east, north) '''
+    lons, lats = transform([bounds[0], bounds[2]], [bounds[1], bounds[3]], 'osm', 'wgs84')
+    return lons[0], lats[0], lons[1], lats[1]
+
+
+def calculate_zoom(west, south, east, north):
+    '''  zoom level for the bounds as chosen by contextily '''
+    zoom_lon = np.ceil(np.log2(360 * 2.0 / (east - west)))
+    zoom_lat = np.ceil(np.log2(360 * 2.0 / (north - south)))
+    return int(min(zoom_lon, zoom_lat))
+
+
+def add_osm_tiles(ax, source=OSM_SOURCE, zoom='auto', tile_cache=None):
+    '''  show the tiles of source covering the axes extent (EPSG_OSM) from the
+         tile cache. Offline the highest zoom that is fully cached is used.
+
+         Returns:
+         :image: matplotlib AxesImage or None if there are no tiles
+    '''
+    tile_cache = TileCache(url=source_url(source)) if tile_cache is None else tile_cache
+    limits = ax.axis()
+    west, south, east, north = bounds_to_lonlat(
+        (limits[0], limits[2], limits[1], limits[3]))
+    if zoom == 'auto':
+        zoom = calculate_zoom(west, south, east, north)
+    zoom = min(zoom, source.get('max_zoom', 19))
+
+    tiles = list(mercantile.tiles(west, south, east, north, zoom))
+    if tile_cache.offline:
+        while zoom > 0 and not all(tile_cache.is_cached(tile) for tile in tiles):
+            zoom -= 1
+            tiles = list(mercantile.tiles(west, south, east, north, zoom))
+
+    if not tiles:
+        return None
+
+    image, extent = tile_cache.mosaic(tiles)
+    basemap = ax.imshow(image, extent=extent, interpolation='bilinear')
+    ax.axis(limits)
+    ctx.add_attribution(ax, source.get('attribution', ''))
+    tile_cache.logger.info(f'osm tiles zoom {zoom}: {len(tiles)} tiles, '
+                           f'offline: {tile_cache.offline}')
+    return basemap
+
+
+def main(zooms):
+    from geo_io import GeoData
+
+    _, _, _, swaths_bnd_gdf = GeoData().filter_geo_data_by_swaths(
+        swaths_selected=[0], swaths_only=True, source_boundary=True, crs='osm')
+    TileCache(offline=False).prefetch(swaths_bnd_gdf.unary_union, zooms)
+
+
+if __name__ == '__main__':
+    logformat = '%(asctime)s - %(levelname)s - %(message)s'
+    Logger.set_logger('autoseis.log', logformat, 'INFO')
+
+    main([int(zoom) for zoom in sys.argv[1:]])
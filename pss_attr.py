@@ -1,6 +1,7 @@
 '''' Dict of PSS attributes 
      Each attribute has following dicts:
-     :col: column in csv
+     :col: column in csv, for reference only as columns are resolved
+           by name from the header of the file (see pss_table)
      :range: range of values pss data has to be within
      :min: minimum value for color bar
      :max: maximum valuw for color bar
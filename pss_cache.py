@@ -0,0 +1,278 @@
+'''  persistent columnar cache for the daily PSS csv files
+
+     each parsed file is stored as a directory with one .npy file per column
+     and a meta.json with the header, the column kinds and the size and mtime
+     of the source file. Later reads memory map the columns so no text parsing
+     is done. An entry is rebuilt when size or mtime of the source changes.
+     The total size of the cache is capped, least recently used entries
+     (by mtime of their meta.json) are evicted first.
+
+     column kinds:
+        int: int64, or float64 with NaN if the column has blanks
+        float: float64 with NaN for blanks
+        str: fixed width unicode
+'''
+
+import os
+import csv
+import json
+import time
+import shutil
+import hashlib
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+
+from geo_io import get_date_range, daterange
+from Utils.plogger import Logger
+
+PSS_CACHE_DIR = r'pss_cache'
+PSS_CACHE_MAX_BYTES = 2 * 1024**3
+META_FILE = 'meta.json'
+TMP_MARKER = '.tmp-'
+
+logger = Logger.getlogger()
+
+PssColumns = namedtuple('PssColumns', ['header', 'columns', 'kinds'])
+
+
+def type_column(values):
+    '''  convert a list of strings to a typed numpy array
+
+         Parameters:
+         :values: list of strings
+         Returns:
+         :column: numpy array
+         :kind: 'int', 'float' or 'str'
+    '''
+    text = np.array(values, dtype=str)
+    blank = text == ''
+    filled = np.where(blank, '0', text)
+    try:
+        column = filled.astype(np.int64)
+        if blank.any():
+            column = np.where(blank, np.nan, column)
+        return column, 'int'
+
+    except (ValueError, OverflowError):
+        pass
+
+    try:
+        column = filled.astype(np.float64)
+        column[blank] = np.nan
+        return column, 'float'
+
+    except ValueError:
+        return text, 'str'
+
+
+def unique_names(header):
+    '''  column names of header with duplicates mangled to 'name.1', 'name.2', ... '''
+    names = []
+    for name in header:
+        _name, i = name, 0
+        while _name in names:
+            i += 1
+            _name = f'{name}.{i}'
+        names.append(_name)
+
+    return names
+
+
+def dataframe_from_columns(pss_columns):
+    '''  pandas dataframe as read by pd.read_csv, blanks in str columns are NaN
+         and duplicate column names are mangled to 'name.1', 'name.2', ...
+    '''
+    data = {}
+    for name, column, kind in zip(unique_names(pss_columns.header),
+                                  pss_columns.columns, pss_columns.kinds):
+        if kind == 'str':
+            column = column.astype(object)
+            column[column == ''] = np.nan
+
+        data[name] = column
+
+    return pd.DataFrame(data)
+
+
+def parse_pss_csv(csv_file):
+    '''  parse a PSS csv file into typed columns '''
+    with open(csv_file) as csvobject:
+        content = csv.reader(csvobject, delimiter=',')
+        try:
+            header = next(content)
+        except StopIteration:
+            return PssColumns([], [], [])
+
+        width = len(header)
+        rows = [(row + [''] * (width - len(row)))[:width] for row in content]
+
+    columns, kinds = [], []
+    for j in range(width):
+        column, kind = type_column([row[j] for row in rows])
+        columns.append(column)
+        kinds.append(kind)
+
+    return PssColumns(header, columns, kinds)
+
+
+class PssCache:
+    '''  methods for the columnar PSS file cache '''
+    def __init__(self, cache_dir=PSS_CACHE_DIR, max_bytes=PSS_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def entry_dir(self, csv_file):
+        _path = os.path.abspath(csv_file)
+        key = hashlib.md5(_path.encode()).hexdigest()[:12]
+        return os.path.join(self.cache_dir,
+                            '_'.join([os.path.basename(csv_file), key]))
+
+    def read(self, csv_file):
+        '''  return the typed columns of csv_file, from the cache if the entry
+             is valid otherwise the file is parsed and stored
+
+             Parameters:
+             :csv_file: PSS csv file
+             Returns:
+             :pss_columns: PssColumns(header, columns, kinds)
+             Raises FileNotFoundError if csv_file does not exist
+        '''
+        stat = os.stat(csv_file)
+        entry = self.entry_dir(csv_file)
+        meta = self.read_meta(entry)
+        if meta and meta['size'] == stat.st_size and meta['mtime'] == stat.st_mtime_ns:
+            try:
+                pss_columns = self.load_entry(entry, meta)
+                os.utime(os.path.join(entry, META_FILE))
+                logger.debug(f'cache hit: {csv_file}')
+                return pss_columns
+
+            except (OSError, ValueError) as e:
+                logger.info(f'cache entry {entry} is unreadable: {e}')
+
+        pss_columns = parse_pss_csv(csv_file)
+        try:
+            self.store_entry(entry, pss_columns, stat)
+            self.evict(keep=entry)
+
+        except OSError as e:
+            logger.info(f'unable to store cache entry {entry}: {e}')
+
+        logger.debug(f'cache miss: {csv_file}')
+        return pss_columns
+
+    @staticmethod
+    def read_meta(entry):
+        try:
+            with open(os.path.join(entry, META_FILE), 'rt') as meta_file:
+                return json.load(meta_file)
+
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def load_entry(entry, meta):
+        mmap_mode = 'r' if meta['rows'] > 0 else None
+        columns = [np.load(os.path.join(entry, f'c{j:03}.npy'), mmap_mode=mmap_mode)
+                   for j in range(len(meta['header']))]
+        return PssColumns(meta['header'], columns, meta['kinds'])
+
+    def store_entry(self, entry, pss_columns, stat):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_entry = f'{entry}{TMP_MARKER}{os.getpid()}'
+        shutil.rmtree(tmp_entry, ignore_errors=True)
+        os.makedirs(tmp_entry)
+
+        for j, column in enumerate(pss_columns.columns):
+            np.save(os.path.join(tmp_entry, f'c{j:03}.npy'), column)
+
+        rows = len(pss_columns.columns[0]) if pss_columns.columns else 0
+        meta = {'size': stat.st_size,
+                'mtime': stat.st_mtime_ns,
+                'rows': rows,
+                'header': pss_columns.header,
+                'kinds': pss_columns.kinds}
+        with open(os.path.join(tmp_entry, META_FILE), 'wt') as meta_file:
+            json.dump(meta, meta_file)
+
+        shutil.rmtree(entry, ignore_errors=True)
+        os.replace(tmp_entry, entry)
+
+    def entries(self):
+        '''  list of (last_used, bytes, entry) for all entries in the cache '''
+        try:
+            names = os.listdir(self.cache_dir)
+        except FileNotFoundError:
+            return []
+
+        _entries = []
+        for name in names:
+            entry = os.path.join(self.cache_dir, name)
+            if TMP_MARKER in name or not os.path.isdir(entry):
+                continue
+
+            try:
+                last_used = os.path.getmtime(os.path.join(entry, META_FILE))
+                size = sum(f.stat().st_size for f in os.scandir(entry))
+            except OSError:
+                continue
+
+            _entries.append((last_used, size, entry))
+
+        return _entries
+
+    def evict(self, keep=None):
+        '''  remove least recently used entries until the cache is within
+             max_bytes, the entry keep is never removed
+        '''
+        _entries = sorted(self.entries())
+        total = sum(size for _, size, _ in _entries)
+        for _, size, entry in _entries:
+            if total <= self.max_bytes:
+                break
+
+            if entry == keep:
+                continue
+
+            try:
+                shutil.rmtree(entry)
+                total -= size
+                logger.info(f'evicted cache entry: {entry}')
+
+            except OSError as e:
+                # on windows a memory mapped entry cannot be removed
+                logger.info(f'unable to evict {entry}: {e}')
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+
+def prewarm(start_date, end_date, cache=None):
+    '''  parse and store the PSS files for a date range in the cache '''
+    from pss_io import pss_file_for_date
+
+    cache = PssCache() if cache is None else cache
+    for day in daterange(start_date, end_date):
+        pss_file = pss_file_for_date(day)
+        if pss_file[-4:] != '.csv':
+            continue
+
+        start = time.time()
+        cache.read(pss_file)
+        print(f'{day.strftime("%d-%b-%y")}: {pss_file} '
+              f'in {time.time() - start:.2f}s')
+
+    print(f'cache size: {cache.size() / 1024**2:.1f} MB')
+
+
+if __name__ == '__main__':
+    '''  prewarm the cache for a date range '''
+    logformat = '%(asctime)s - %(levelname)s - %(message)s'
+    Logger.set_logger('autoseis.log', logformat, 'INFO')
+
+    start_date = -1
+    while start_date == -1:
+        start_date, end_date = get_date_range()
+
+    prewarm(start_date, end_date)
@@ -1,7 +1,8 @@
 import set_gdal_pyproj_env_vars_and_logger
 import glob
 import numpy as np
-from pss_io import pss_read_file 
+from pss_io import pss_read_table, clean_pss_data, determine_fleets
+from pss_table import PssTable, INT_NULL
 import matplotlib.pyplot as plt
 from scipy import stats
 from geo_io import get_date
@@ -45,141 +46,87 @@ def input_fleet(fleets):
 
 
 class PssData:
-    '''  method for handling PSS data '''
+    '''  method for handling PSS data, pss_input_data is a PssTable or a list
+         of lists with the header as first row
+    '''
     def __init__(self, pss_input_data):
-        self.pss_data = pss_input_data
+        if isinstance(pss_input_data, PssTable):
+            pss_table = pss_input_data
+        else:
+            pss_table = PssTable.from_rows(pss_input_data)
+
         self.attr = {}
-        self.attr['unit_id'] = int(pss_input_data[0].index('Unit ID'))
-        self.attr['record_index'] = int(pss_input_data[0].index('File Num'))
-        self.attr['phase_max'] = int(pss_input_data[0].index('Phase Max'))
-        self.attr['phase_avg'] = int(pss_input_data[0].index('Phase Avg'))
-        self.attr['thd_max'] = int(pss_input_data[0].index('THD Max'))
-        self.attr['thd_avg'] = int(pss_input_data[0].index('THD Avg'))
-        self.attr['force_max'] = int(pss_input_data[0].index('Force Max'))
-        self.attr['force_avg'] = int(pss_input_data[0].index('Force Avg'))
-        self.attr['void'] = int(pss_input_data[0].index('Void'))
-        self.attr['comment'] = int(pss_input_data[0].index('Comment'))
-
-        del self.pss_data[0]
+        self.attr['unit_id'] = 'Unit ID'
+        self.attr['record_index'] = 'File Num'
+        self.attr['phase_max'] = 'Phase Max'
+        self.attr['phase_avg'] = 'Phase Avg'
+        self.attr['thd_max'] = 'THD Max'
+        self.attr['thd_avg'] = 'THD Avg'
+        self.attr['force_max'] = 'Force Max'
+        self.attr['force_avg'] = 'Force Avg'
+        self.attr['void'] = 'Void'
+        self.attr['comment'] = 'Comment'
 
         # clean PSS data
-        delete_list = []
-        for i, pss in enumerate(self.pss_data):
-            if pss[self.attr['void']] == 'Void':
-                delete_list.append(i)
-            elif not pss[self.attr['record_index']]:
-                delete_list.append(i)
-            elif int(pss[self.attr['force_max']]) == 0:
-                delete_list.append(i)
-            try:
-                if pss[self.attr['comment']][-10:] == 'been shot!': 
-                    delete_list.append(i)
-            except:
-                pass
-                
-        for i in range(len(delete_list)-1, -1, -1):
-            del self.pss_data[delete_list[i]]
-            
-        # determine fleets
-        fleets = set()
-        record = 0
-        _fleet = set()
-        for pss in self.pss_data:
-            if int(pss[self.attr['record_index']]) == record:
-                _fleet.add(int(pss[self.attr['unit_id']]))
-            else:
-                record = int(pss[self.attr['record_index']])
-                if _fleet:
-                    fleets.add(frozenset(_fleet))
-                _fleet = set()
-                _fleet.add(int(pss[self.attr['unit_id']]))
-    
-        fleets = list(fleets)
-        fleets_copy = fleets[:]
-
-        for i in range(len(fleets)):
-            for j in range(0, len(fleets)):
-                if fleets[j] > fleets[i]:
-                    fleets_copy.remove(fleets[i])
-                    break
+        order, _ = clean_pss_data(
+            pss_table[self.attr['void']],
+            pss_table.as_float(self.attr['record_index']),
+            np.trunc(pss_table.as_float(self.attr['force_max'])),
+            pss_table[self.attr['comment']])
+        self.pss_table = pss_table.take(order)
 
-        self.fleets = fleets_copy 
+        self.fleets = determine_fleets(self.pss_table[self.attr['record_index']],
+                                       self.pss_table[self.attr['unit_id']])
 
     def obtain_vib_data(self, attr_key, mask_value):
         '''  method to get the data for attr_key for the fleet. If there is no value the mask_value will 
              be assigned to mask the record from plotting
         '''
         logger = Logger.getlogger()
-        # determine list of field records for all vibes in the fleet
-        vib_axis = set()
-        for pss in self.pss_data:
-            try:
-                if int(pss[self.attr['unit_id']]) in self.fleet:
-                    vib_axis.add(int(pss[self.attr['record_index']]))
-            except ValueError:
-                pass
-
-        vib_axis = list(vib_axis)
-        vib_axis.sort()
+        unit_ids = self.pss_table[self.attr['unit_id']]
+        records = self.pss_table[self.attr['record_index']]
+        values = self.pss_table.as_float(self.attr[attr_key])
 
-        # create a vib_data_pairs list for each vib in the fleet
-        vib_data_pairs = [[] for _ in self.fleet]
-        unique_ids = []
-        # loop reverse as we want to keep the last entry and not the first 
-        for pss in reversed(self.pss_data):
-            try:
-                vib_id = int(pss[self.attr['unit_id']])
-                record = int(pss[self.attr['record_index']])
-                fleet_id = self.fleet.index(vib_id)
-                # check if vibs have not been called again and tuple (record, vibe) is unique
-                unique_id = (record, vib_id) 
-                if unique_id not in unique_ids:
-                    unique_ids.append(unique_id)
-                    data_point = (record, int(pss[self.attr[attr_key]]))
-                    vib_data_pairs[fleet_id].append(data_point)
-                else:
-                    logger.info(f'this record is not unique: {unique_id}')
-            except ValueError:
-                pass
+        # determine list of field records for all vibes in the fleet
+        in_fleet = np.isin(unit_ids, self.fleet) & (records != INT_NULL)
+        vib_axis = np.unique(records[in_fleet])
 
-        # check if there are records where there is no value for the vibe unit
-        # - if not assign the mask value
-        vib_data = [[] for _ in self.fleet]
-        for i, _ in enumerate(self.fleet):
-            _vib_axis, _ = zip(*vib_data_pairs[i])
-            for x in vib_axis:
-                if x not in _vib_axis:
-                    vib_data_pairs[i].append((x, mask_value))
+        # create the vib_data for each vib in the fleet, records without a value
+        # for the vib get the mask value
+        vib_data = []
+        for vib in self.fleet:
+            rows = np.flatnonzero(in_fleet & (unit_ids == vib))
 
-            vib_data_pairs[i].sort()
-            _ , vib_data[i] = zip((*vib_data_pairs[i]))
-            vib_data[i] = list(vib_data[i])
+            # reverse as we want to keep the last entry and not the first
+            vib_records, first, counts = np.unique(
+                records[rows][::-1], return_index=True, return_counts=True)
+            for record in vib_records[counts > 1]:
+                logger.info(f'this record is not unique: {(record, vib)}')
 
-            assert len(vib_data[i]) == len(vib_axis), \
-                   f'len(vib_data) = {len(vib_data[i])}, len(vib_exis) = {len(vib_axis)}'
+            vib_values = values[rows][::-1][first]
+            data = np.full(vib_axis.size, mask_value, dtype=np.int64)
+            data[np.searchsorted(vib_axis, vib_records)] = np.where(
+                np.isnan(vib_values), mask_value, np.trunc(np.nan_to_num(vib_values)))
+            vib_data.append(data.tolist())
 
-        return vib_axis, vib_data
+        return vib_axis.tolist(), vib_data
 
     def print_pss_data(self, vibes):
         '''  method to print the pss data '''
         logger = Logger.getlogger()
         self.fleet = list(vibes)
+        unit_ids = self.pss_table[self.attr['unit_id']]
+        columns = {key: self.pss_table.as_float(self.attr[key])
+                   for key in ['record_index', 'phase_max', 'phase_avg', 'thd_max',
+                               'thd_avg', 'force_max', 'force_avg']}
         for vib in self.fleet:
-            for pss in self.pss_data:
-
-                if pss[self.attr['unit_id']] and int(pss[self.attr['unit_id']]) == vib:
-                    record = int(pss[self.attr['record_index']])
-                    phase_max = int(pss[self.attr['phase_max']])
-                    phase_avg = int(pss[self.attr['phase_avg']])
-                    thd_max = int(pss[self.attr['thd_max']])
-                    thd_avg = int(pss[self.attr['thd_avg']])
-                    force_max = int(pss[self.attr['force_max']])
-                    force_avg = int(pss[self.attr['force_avg']])
-                    logger.info(f'record: {record}: '
-                                 f'vibe: {vib} '
-                                 f'phase: {phase_avg} {phase_max}; '
-                                 f'distortion: {thd_avg} {thd_max}; '
-                                 f'force: {force_avg} {force_max}')
+            for i in np.flatnonzero(unit_ids == vib):
+                pss = {key: int(values[i]) for key, values in columns.items()}
+                logger.info(f'record: {pss["record_index"]}: '
+                             f'vibe: {vib} '
+                             f'phase: {pss["phase_avg"]} {pss["phase_max"]}; '
+                             f'distortion: {pss["thd_avg"]} {pss["thd_max"]}; '
+                             f'force: {pss["force_avg"]} {pss["force_max"]}')
 
     def plot_pss_data(self, vibes):
         '''  method to plot the pss data '''
@@ -357,12 +304,12 @@ if __name__ == "__main__":
     correct_file = False
     while True:
 
-        pss_data = pss_read_file(get_date())
+        pss_table = pss_read_table(get_date())
 
-        if pss_data == -1:
+        if pss_table is None:
             pass
         else:
-            pss = PssData(pss_data)
+            pss = PssData(pss_table)
             correct_file = True
 
         while correct_file:
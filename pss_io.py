@@ -1,13 +1,22 @@
-import glob
+import os
 import csv
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+import numpy as np
 import pandas as pd
-from geopandas import GeoDataFrame
-from shapely.geometry import Point
+from geopandas import GeoDataFrame, points_from_xy
+from openpyxl import load_workbook
 
-from geo_io import daterange, EPSG_31256_adapted, EPSG_WGS84
+from geo_io import daterange
+from crs_transform import transform, EPSG_31256_adapted
 from pss_attr import pss_attr
+from pss_cache import PssCache, unique_names
+from pss_table import PssTable, INT_NULL
 from Utils.plogger import Logger
-from Utils.utils import average_with_outlier_removed
+from Utils.utils import average_with_outlier_removed_segments
+from Utils.file_index import FileIndex
 
 
 PREFIX = r'RAW_PSS/PSS_'
@@ -15,167 +24,461 @@ LAT_MIN = 48
 LAT_MAX = 49
 LONG_MIN = 16
 LONG_MAX = 18
+PSS_WORKERS = 1
+PSS_CHUNK_ROWS = 100000
+PSS_STREAM_BYTES = 200 * 1024**2
+TEXT_COLUMNS = ('Void', 'Comment')
 
 logger = Logger.getlogger()
+column_cache = PssCache()
+pss_files = FileIndex(PREFIX, '%Y_%m_%d', '.csv')
 nl = '\n'
 
 
-class PssData:
-    '''  methods for handling PSS data '''
+def clean_pss_data(void, file_num, force, comment):
+    '''  mask based cleaning of PSS rows. A row is rejected if it is Void,
+         if File Num is empty, if the force is zero or if the comment ends
+         with 'been shot!'. Each row is counted for the first rule it fails.
+
+         Parameters:
+         :void: values of column Void
+         :file_num: File Num as float array, NaN if empty
+         :force: force as float array
+         :comment: values of column Comment
+         Returns:
+         :order: indices of the rows to keep, sorted on File Num
+         :rejected: dict with the number of rows rejected by each rule
+    '''
+    rules = (('void', np.asarray(void, dtype=object) == 'Void'),
+             ('no_file_num', np.isnan(file_num)),
+             ('zero_force', force == 0),
+             ('been_shot', (pd.Series(comment, dtype=object).str[-10:] ==
+                            'been shot!').to_numpy()),)
+
+    rejected = {}
+    reject = np.zeros(len(file_num), dtype=bool)
+    for rule, mask in rules:
+        rejected[rule] = int(np.count_nonzero(mask & ~reject))
+        reject |= mask
+
+    keep = np.flatnonzero(~reject)
+    order = keep[np.argsort(file_num[keep], kind='stable')]
+
+    return order, rejected
+
+
+def record_segments(file_num, vp_long, vp_lat):
+    '''  rows with coordinates inside the window LAT_MIN, LAT_MAX, LONG_MIN,
+         LONG_MAX sorted on File Num, and the boundaries of the records
+
+         Returns:
+         :order: indices of the rows sorted on File Num
+         :offsets: start of each record in order and len(order) at the end
+    '''
+    valid_coord = ((LAT_MIN < vp_lat) & (vp_lat < LAT_MAX) &
+                   (LONG_MIN < vp_long) & (vp_long < LONG_MAX))
+    if not valid_coord.all():
+        logger.debug(f'invalid coords: {np.count_nonzero(~valid_coord)} rows, '
+                     f'records: {np.unique(file_num[~valid_coord])}')
+
+    order = np.flatnonzero(valid_coord)
+    order = order[np.argsort(file_num[order], kind='stable')]
+    file_num = file_num[order]
+    starts = np.flatnonzero(np.r_[True, file_num[1:] != file_num[:-1]]) \
+        if file_num.size else np.array([], dtype=np.int64)
+
+    return order, np.r_[starts, file_num.size]
+
+
+def aggregate_vps(file_num, vp_long, vp_lat, vp_attribute, allowed_range):
+    '''  group-by aggregation of PSS rows to VPs. Rows with coordinates
+         outside the window LAT_MIN, LAT_MAX, LONG_MIN, LONG_MAX are ignored.
+         Records are found by a sort on File Num and boundary detection, the
+         coordinates of a record are averaged and the attribute is averaged
+         with one outlier removed, see average_with_outlier_removed_segments.
+         Records without a valid average are dropped.
+
+         Parameters:
+         :file_num: File Num of the rows (float array)
+         :vp_long, vp_lat: WGS84 coordinates of the rows (float arrays)
+         :vp_attribute: attribute values of the rows (float array)
+         :allowed_range: allowed range of the attribute
+         Returns:
+         :records: File Num of the VPs (int array)
+         :vp_longs, vp_lats: mean coordinates of the VPs (float arrays)
+         :vp_attributes: mean attribute of the VPs (float array)
+    '''
+    order, offsets = record_segments(file_num, vp_long, vp_lat)
+    file_num, vp_long, vp_lat, vp_attribute = (
+        file_num[order], vp_long[order], vp_lat[order], vp_attribute[order])
+    if file_num.size == 0:
+        empty = np.array([], dtype=np.float64)
+        return empty.astype(np.int64), empty, empty, empty
+
+    starts = offsets[:-1]
+    counts = np.diff(offsets)
+    vp_longs = np.add.reduceat(vp_long, starts) / counts
+    vp_lats = np.add.reduceat(vp_lat, starts) / counts
+    vp_attributes, valid = average_with_outlier_removed_segments(
+        vp_attribute, offsets, allowed_range)
+    if not valid.all():
+        logger.debug(f'records with invalid list: {file_num[starts[~valid]]}')
+
+    return (file_num[starts[valid]].astype(np.int64), vp_longs[valid], vp_lats[valid],
+            vp_attributes[valid])
+
+
+def group_forces(forces, medium_force, high_force):
+    '''  force levels 1HIGH, 2MEDIUM and 3LOW of an array of forces '''
+    return np.select([forces > high_force, forces > medium_force],
+                     ['1HIGH', '2MEDIUM'], '3LOW').astype(object)
+
+
+def make_vp_gpd_from_arrays(vp_longs, vp_lats):
+    '''  geopandas dataframe in local coordinates from WGS84 coordinate arrays,
+         the projection is done once on the arrays
+    '''
+    x, y = transform(vp_longs, vp_lats, 'wgs84', 'local')
+    return GeoDataFrame(crs=EPSG_31256_adapted, geometry=points_from_xy(x, y))
+
+
+def determine_fleets(file_num, unit_id):
+    '''  fleets are the sets of Unit IDs that shot a record, fleets that are a
+         subset of another fleet are removed. Rows of a record must be contiguous
+
+         Parameters:
+         :file_num: File Num of the rows (int array)
+         :unit_id: Unit ID of the rows (int array), INT_NULL if empty
+         Returns:
+         :fleets: list of frozensets of Unit IDs
+    '''
+    valid = unit_id != INT_NULL
+    file_num, unit_id = file_num[valid], unit_id[valid]
+    if file_num.size == 0:
+        return []
+
+    starts = np.flatnonzero(np.r_[True, file_num[1:] != file_num[:-1]])
+    return remove_sub_fleets(
+        {frozenset(units.tolist()) for units in np.split(unit_id, starts[1:])})
+
+
+def remove_sub_fleets(fleets):
+    '''  list of the fleets (set of frozensets) that are not a subset of another
+         fleet
+    '''
+    fleets = list(fleets)
+    fleets_copy = fleets[:]
+
+    for i in range(len(fleets)):  #pylint: disable=consider-using-enumerate
+        for j in range(0, len(fleets)):  #pylint: disable=consider-using-enumerate
+            if fleets[j] > fleets[i]:
+                fleets_copy.remove(fleets[i])
+                break
+
+    return fleets_copy
 
-    def __init__(self, pss_input_data):
-        self.pss_data = pss_input_data
-
-        # clean PSS data
-        delete_list = []
-        for i, pss in enumerate(self.pss_data):
-            if pss[pss_attr['Void']['col']] == 'Void':
-                delete_list.append(i)
-            elif not pss[pss_attr['File Num']['col']]:
-                delete_list.append(i)
-            elif int(pss[pss_attr['Force Avg']['col']]) == 0:
-                delete_list.append(i)
-            try:
-                if pss[pss_attr['Comment']['col']][-10:] == 'been shot!':
-                    delete_list.append(i)
-            except:  #pylint: disable=bare-except
-                pass
 
-        for i in range(len(delete_list)-1, -1, -1):
-            del self.pss_data[delete_list[i]]
+class PssData:
+    '''  methods for handling PSS data, pss_input_data is a PssTable or a list
+         of lists with the header as first row
+    '''
 
-        #sort pss data on File Num
-        self.pss_data = sorted(
-            self.pss_data, key=lambda x: int(x[pss_attr['File Num']['col']]))
+    def __init__(self, pss_input_data):
+        if isinstance(pss_input_data, PssTable):
+            pss_table = pss_input_data
+        else:
+            pss_table = PssTable.from_rows(pss_input_data)
+
+        # clean PSS data and sort on File Num
+        order, self.rejected = clean_pss_data(
+            pss_table['Void'], pss_table.as_float('File Num'),
+            np.trunc(pss_table.as_float('Force Avg')), pss_table['Comment'])
+        self.pss_table = pss_table.take(order)
+        logger.info(f'rejected rows: {self.rejected}')
 
     def determine_fleets(self):
-        # determine fleets
-        fleets = set()
-        record = 0
-        _fleet = set()
-        for pss in self.pss_data:
-            if int(pss[pss_attr['File Num']['col']]) == record:
-                _fleet.add(int(pss[pss_attr['Unit ID']['col']]))
-            else:
-                record = int(pss[pss_attr['File Num']['col']])
-                if _fleet:
-                    fleets.add(frozenset(_fleet))
-                _fleet = set()
-                _fleet.add(int(pss[pss_attr['Unit ID']['col']]))
-
-        fleets = list(fleets)
-        fleets_copy = fleets[:]
-
-        for i in range(len(fleets)):  #pylint: disable=consider-using-enumerate
-            for j in range(0, len(fleets)):  #pylint: disable=consider-using-enumerate
-                if fleets[j] > fleets[i]:
-                    fleets_copy.remove(fleets[i])
-                    break
-
-        self.fleets = fleets_copy
+        self.fleets = determine_fleets(self.pss_table['File Num'], self.pss_table['Unit ID'])
 
     def make_vp_gpd(self, attr_key):
         '''  method to make geopandas dataframe for records obtained
              from values from pss
         '''
-        vp_lats = []
-        vp_longs = []
-        vp_attributes = []
-        record = 0
-        _count = 0
-        _vp_lat = None
-        _vp_long = None
-        _vp_attribute = []
-        _count = 0
-
-        # loop over the records in pss_data and assert they are sequential
-        for _, pss in enumerate(self.pss_data):
-            vp_lat = float(pss[pss_attr['Lat']['col']])
-            vp_long = float(pss[pss_attr['Lon']['col']])
-            valid_coord = (LAT_MIN < vp_lat < LAT_MAX and
-                           LONG_MIN < vp_long < LONG_MAX)
-            if not valid_coord:
-                logger.debug(f'invalid coord: record: {record}: '
-                             f'{(LAT_MIN, LAT_MAX, LONG_MIN, LONG_MAX)},'
-                             f'{(vp_lat, vp_long)}')
-
-            vp_attr_value = float(pss[pss_attr[attr_key]['col']])
-            pss_record = int(pss[pss_attr['File Num']['col']])
-            if pss_record < record:
-                logger.info(f'pss is not sequential at {pss_record}')
-
-            if record == pss_record:
-                if valid_coord:
-                    _vp_lat += vp_lat
-                    _vp_long += vp_long
-                    _vp_attribute.append(vp_attr_value)
-                    _count += 1
-                else:
-                    continue
-
-            else:
-                if _count > 0:
-                    _average_attribute = average_with_outlier_removed(
-                        _vp_attribute, pss_attr[attr_key]['range'])
-                    if _average_attribute is not None:
-                        vp_lats.append(_vp_lat / _count)
-                        vp_longs.append(_vp_long / _count)
-                        vp_attributes.append(_average_attribute)
-                    else:
-                        logger.debug(f'record: {record}, invalid list: {_vp_attribute}')
-
-                record = pss_record
-                if valid_coord:
-                    _vp_lat = vp_lat
-                    _vp_long = vp_long
-                    _vp_attribute = [vp_attr_value]
-                    _count = 1
-                else:
-                    _count = 0
+        records, vp_longs, vp_lats, vp_attributes = aggregate_vps(
+            self.pss_table.as_float('File Num'),
+            self.pss_table.as_float('Lon'),
+            self.pss_table.as_float('Lat'),
+            self.pss_table.as_float(attr_key),
+            pss_attr[attr_key]['range'])
 
         # and make the dataframe
-        geometry = [Point(xy) for xy in zip(vp_longs, vp_lats)]
-        self.vp_gpd = GeoDataFrame(crs=f'epsg:{EPSG_WGS84}', geometry=geometry)
-        self.vp_gpd = self.vp_gpd.to_crs(EPSG_31256_adapted)
+        self.vp_gpd = make_vp_gpd_from_arrays(vp_longs, vp_lats)
         self.vp_gpd[attr_key] = vp_attributes
+        self.vp_gpd['File Num'] = records
 
         logger.debug(f'vp_gpd is:{nl}{self.vp_gpd.head(10)}')
 
         return self.vp_gpd
 
+    def make_vp_records(self, _date, attr_keys):
+        '''  method to aggregate the records to VPs for all attr_keys in one pass,
+             a VP is kept if its coordinates are valid and an attribute without
+             a valid average is NaN
+
+             Parameters:
+             :_date: date of the pss data, time of a VP if Date and Time are
+                     not valid
+             :attr_keys: list of pss_attr keys
+             Returns:
+             :vp_records: pandas dataframe with columns File Num, Time, x, y,
+                          Unit IDs and attr_keys, x, y in EPSG_31256_adapted
+        '''
+        file_num = self.pss_table.as_float('File Num')
+        order, offsets = record_segments(
+            file_num, self.pss_table.as_float('Lon'), self.pss_table.as_float('Lat'))
+        starts, counts = offsets[:-1], np.diff(offsets)
+        first_rows = order[starts]
+
+        vp_records = pd.DataFrame({'File Num': file_num[first_rows].astype(np.int64)})
+        if 'Date' in self.pss_table and 'Time' in self.pss_table:
+            times = pd.to_datetime(
+                pd.Series(self.pss_table['Date'][first_rows], dtype=str) + ' ' +
+                pd.Series(self.pss_table['Time'][first_rows], dtype=str), errors='coerce')
+        else:
+            times = pd.Series(pd.NaT, index=vp_records.index)
+        vp_records['Time'] = times.fillna(pd.Timestamp(_date)).dt.strftime('%Y-%m-%dT%H:%M:%S')
+
+        if starts.size:
+            vp_longs = np.add.reduceat(self.pss_table.as_float('Lon')[order], starts) / counts
+            vp_lats = np.add.reduceat(self.pss_table.as_float('Lat')[order], starts) / counts
+        else:
+            vp_longs, vp_lats = np.array([]), np.array([])
+        vp_records['x'], vp_records['y'] = transform(vp_longs, vp_lats, 'wgs84', 'local')
+
+        unit_ids = self.pss_table['Unit ID'][order]
+        vp_records['Unit IDs'] = [
+            ' '.join(str(unit_id) for unit_id in np.unique(units[units != INT_NULL]))
+            for units in np.split(unit_ids, starts[1:])] if starts.size else []
+
+        for attr_key in attr_keys:
+            if attr_key not in self.pss_table:
+                vp_records[attr_key] = np.nan
+                continue
+
+            vp_records[attr_key], _ = average_with_outlier_removed_segments(
+                self.pss_table.as_float(attr_key)[order], offsets,
+                pss_attr[attr_key]['range'])
+
+        return vp_records
+
     def add_force_level(self, medium_force, high_force):
-        def group_forces(forces):
-            ''' helper function to group forces in LOW, MEDIUM , HIGH '''
-            force_levels = []
-            for force in forces:
-                if force > high_force:
-                    force_levels.append('1HIGH')
+        self.vp_gpd['force_level'] = group_forces(
+            self.vp_gpd['Force Avg'].to_numpy(), medium_force, high_force)
 
-                elif force > medium_force:
-                    force_levels.append('2MEDIUM')
+        return self.vp_gpd
 
-                elif force <= medium_force:
-                    force_levels.append('3LOW')
 
-                else:
-                    assert False, "this is an invalid option, check the code"
-            return force_levels
+class PssDataStream(PssData):
+    '''  streaming variant of PssData for oversized PSS files. The file is read
+         in chunks of chunk_rows rows, each chunk is cleaned and aggregated to
+         VPs. The rows of the last File Num of a chunk are carried over to the
+         next chunk, so a record split over chunks is aggregated as a whole.
+         Peak memory depends on chunk_rows and not on the size of the file.
+         Records are assumed to be contiguous in the file as in the PSS exports.
+    '''
+    def __init__(self, pss_file, chunk_rows=PSS_CHUNK_ROWS):  #pylint: disable=super-init-not-called
+        self.pss_file = pss_file
+        self.chunk_rows = chunk_rows
+        self.pss_table = None
+        self.rejected = {}
 
-        self.vp_gpd['force_level'] = group_forces(self.vp_gpd['Force Avg'].to_list())
+    def determine_fleets(self):
+        '''  fleets as in PssData.determine_fleets, reading the pss file in
+             chunks. The rows of the last File Num of a chunk are carried over
+             to the next chunk like in make_vp_gpd
+        '''
+        columns = ['Void', 'File Num', 'Force Avg', 'Comment', 'Unit ID']
+        fleets = set()
+        carry = None
+        for chunk in read_pss_file_chunks(self.pss_file, columns, self.chunk_rows):
+            order, _ = clean_pss_data(
+                chunk['Void'], chunk['File Num'], np.trunc(chunk['Force Avg']),
+                chunk['Comment'])
+            order = np.sort(order)
+            unit_id = chunk['Unit ID'][order]
+            file_num = chunk['File Num'][order]
+            unit_id = np.where(np.isnan(unit_id), INT_NULL, unit_id).astype(np.int64)
+            if carry is not None:
+                file_num = np.concatenate([carry[0], file_num])
+                unit_id = np.concatenate([carry[1], unit_id])
+
+            if file_num.size == 0:
+                continue
+
+            open_record = file_num == file_num[-1]
+            carry = (file_num[open_record], unit_id[open_record])
+            fleets.update(determine_fleets(file_num[~open_record], unit_id[~open_record]))
+
+        if carry is not None:
+            fleets.update(determine_fleets(*carry))
+
+        self.fleets = remove_sub_fleets(fleets)
+
+    def make_vp_gpd(self, attr_key):
+        '''  method to make geopandas dataframe for records obtained
+             from values from pss, reading the pss file in chunks
+        '''
+        columns = list(dict.fromkeys(
+            ['Void', 'File Num', 'Force Avg', 'Comment', 'Lat', 'Lon', attr_key]))
+        self.rejected = {}
+        vp_arrays = []
+        carry = None
+        for chunk in read_pss_file_chunks(self.pss_file, columns, self.chunk_rows):
+            order, rejected = clean_pss_data(
+                chunk['Void'], chunk['File Num'], np.trunc(chunk['Force Avg']),
+                chunk['Comment'])
+            for rule, count in rejected.items():
+                self.rejected[rule] = self.rejected.get(rule, 0) + count
+
+            # keep the cleaned rows in file order after the carried rows
+            chunk = {column: values[np.sort(order)] for column, values in chunk.items()}
+            if carry is not None:
+                chunk = {column: np.concatenate([carry[column], chunk[column]])
+                         for column in columns}
+
+            if chunk['File Num'].size == 0:
+                continue
+
+            # rows of the last record may continue in the next chunk
+            open_record = chunk['File Num'] == chunk['File Num'][-1]
+            carry = {column: values[open_record] for column, values in chunk.items()}
+            vp_arrays.append(self.aggregate_chunk(
+                {column: values[~open_record] for column, values in chunk.items()},
+                attr_key))
+
+        if carry is not None:
+            vp_arrays.append(self.aggregate_chunk(carry, attr_key))
+
+        logger.info(f'rejected rows: {self.rejected}')
+
+        if vp_arrays:
+            records, vp_longs, vp_lats, vp_attributes = (
+                np.concatenate(arrays) for arrays in zip(*vp_arrays))
+        else:
+            records = np.array([], dtype=np.int64)
+            vp_longs, vp_lats, vp_attributes = np.array([]), np.array([]), np.array([])
+
+        order = np.argsort(records, kind='stable')
+        records, vp_longs, vp_lats, vp_attributes = (
+            records[order], vp_longs[order], vp_lats[order], vp_attributes[order])
+        if np.unique(records).size < records.size:
+            logger.info(f'{self.pss_file}: records are not contiguous, some records '
+                        f'have more than one VP')
+
+        # and make the dataframe
+        self.vp_gpd = make_vp_gpd_from_arrays(vp_longs, vp_lats)
+        self.vp_gpd[attr_key] = vp_attributes
+        self.vp_gpd['File Num'] = records
+
+        logger.debug(f'vp_gpd is:{nl}{self.vp_gpd.head(10)}')
 
         return self.vp_gpd
 
-def read_pss_file_csv(csv_file):
-    try:
-        pss_data = []
-        with open(csv_file) as csvobject:
-            content = csv.reader(csvobject, delimiter=',')
-            for row in content:
-                pss_data.append(row)
-    except FileNotFoundError:
-        pss_data = -1
+    @staticmethod
+    def aggregate_chunk(chunk, attr_key):
+        return aggregate_vps(chunk['File Num'], chunk['Lon'], chunk['Lat'],
+                             chunk[attr_key], pss_attr[attr_key]['range'])
 
-    return pss_data
+
+class PssTail:
+    '''  incremental reader of a growing PSS csv file. The byte offset of the
+         consumed part of the file is kept and each read parses only the rows
+         appended since the last read, a partial last line is left for the
+         next read. The rows are kept per File Num, only the records touched
+         by new rows are aggregated again. If the file shrinks it is read
+         again from the start and truncated is set.
+    '''
+    def __init__(self, pss_file, _date, medium_force, high_force, attr_keys=('Force Avg',)):
+        self.pss_file = pss_file
+        self.date = _date
+        self.medium_force = medium_force
+        self.high_force = high_force
+        self.attr_keys = list(dict.fromkeys(['Force Avg', *attr_keys]))
+        self.truncated = False
+        self.reset()
+
+    def reset(self):
+        self.offset = 0
+        self.header = None
+        self.columns = None
+        self.records = {}
+
+    def read_lines(self):
+        '''  complete lines appended to the file since the last read '''
+        try:
+            with open(self.pss_file, 'rb') as pss_object:
+                pss_object.seek(0, os.SEEK_END)
+                if pss_object.tell() < self.offset:
+                    logger.info(f'{self.pss_file} has been truncated, reading from start')
+                    self.reset()
+                    self.truncated = True
+
+                pss_object.seek(self.offset)
+                data = pss_object.read()
+
+        except OSError:
+            return []
+
+        data = data[:data.rfind(b'\n') + 1]
+        self.offset += len(data)
+        return data.decode(errors='replace').splitlines()
+
+    def read(self):
+        '''  parse appended rows and aggregate the records they touch
+
+             Returns:
+             :vp_records: VPs of the touched records as get_vp_records_for_day,
+                          None if there are no new rows
+             :removed: File Nums of touched records that no longer have a VP
+        '''
+        lines = self.read_lines()
+        rows = csv.reader(lines)
+        if self.header is None:
+            header = next(rows, None)
+            if header is None:
+                return None, set()
+
+            self.header = unique_names(header)
+            self.columns = [name for name in self.header if name in (
+                'Void', 'File Num', 'Comment', 'Lat', 'Lon', 'Unit ID', 'Date', 'Time',
+                *self.attr_keys)]
+        index = [self.header.index(name) for name in self.columns]
+        file_num_index = self.columns.index('File Num')
+
+        touched = set()
+        for row in rows:
+            row = [row[i] if i < len(row) else '' for i in index]
+            try:
+                file_num = int(float(row[file_num_index]))
+            except ValueError:
+                continue
+
+            self.records.setdefault(file_num, []).append(row)
+            touched.add(file_num)
+
+        if not touched:
+            return None, set()
+
+        pss_rows = [self.columns] + [row for file_num in touched
+                                     for row in self.records[file_num]]
+        vp_records = PssData(PssTable.from_rows(pss_rows)).make_vp_records(
+            self.date, self.attr_keys)
+        vp_records = vp_records[vp_records['Force Avg'].notna()].reset_index(drop=True)
+        vp_records['force_level'] = group_forces(
+            vp_records['Force Avg'].to_numpy(), self.medium_force, self.high_force)
+        removed = touched - set(vp_records['File Num'].tolist())
+        logger.debug(f'{self.pss_file}: {len(lines)} lines, {len(touched)} records touched')
+
+        return vp_records, removed
 
 
 def read_pss_file_xls(xls_file):
@@ -190,36 +493,202 @@ def read_pss_file_xls(xls_file):
     return pss_data
 
 
-def pss_read_file(_date):
+def read_pss_table(pss_file):
+    '''  PssTable of a csv or xlsx PSS file, None if there is no valid file '''
+    try:
+        if pss_file[-4:] == '.csv':
+            return PssTable.from_columns(column_cache.read(pss_file))
 
-    _pss_file = PREFIX + ''.join([f'{int(_date.strftime("%Y")):04}', '_'
-                                  f'{int(_date.strftime("%m")):02}', '_'
-                                  f'{int(_date.strftime("%d")):02}', '*.csv'])
-    # pss_file = PREFIX + _date + '.xlsx'
+        if pss_file[-5:] == '.xlsx':
+            return PssTable.from_rows(read_pss_file_xls(pss_file))
 
-    logger.debug(f'filename: {_pss_file}')
-    _pss_file = glob.glob(_pss_file)
-    logger.info(f'filename: {_pss_file}')
+    except FileNotFoundError:
+        pass
+
+    logger.debug(f'no valid file: {pss_file}')
+    return None
 
-    if len(_pss_file) != 1:
-        pss_file = 'no_file_found'
-    else:
-        pss_file = _pss_file[0]
 
-    if pss_file[-4:] == '.csv':
-        pss_data = read_pss_file_csv(pss_file)
-    elif pss_file[-5:] == '.xlsx':
-        pss_data = read_pss_file_xls(pss_file)
+def typed_chunk(df, columns):
+    '''  dict of numpy arrays for columns of dataframe df, Void and Comment
+         are object arrays the other columns are float arrays with NaN for
+         empty or invalid values
+    '''
+    return {column: (df[column].to_numpy(dtype=object) if column in TEXT_COLUMNS else
+                     pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=np.float64))
+            for column in columns}
+
+
+def read_pss_file_chunks(pss_file, columns, chunk_rows=PSS_CHUNK_ROWS):
+    '''  generator of typed chunks of a PSS file (csv or xlsx), only the
+         given columns are read
+
+         Parameters:
+         :pss_file: csv or xlsx PSS file
+         :columns: list of column names as in the header of the file
+         :chunk_rows: number of rows in a chunk, the last chunk may be smaller
+         Yields:
+         :chunk: dict column name -> numpy array, see typed_chunk
+    '''
+    if pss_file[-5:] == '.xlsx':
+        workbook = load_workbook(pss_file, read_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = list(next(rows))
+            index = [header.index(column) for column in columns]
+            while chunk := list(islice(rows, chunk_rows)):
+                yield typed_chunk(pd.DataFrame(
+                    [[row[i] for i in index] for row in chunk], columns=columns), columns)
+        finally:
+            workbook.close()
+
     else:
-        pss_data = -1
+        dtype = {column: object for column in TEXT_COLUMNS if column in columns}
+        for df in pd.read_csv(pss_file, usecols=columns, dtype=dtype,
+                              float_precision='round_trip', chunksize=chunk_rows):
+            yield typed_chunk(df, columns)
 
-    if pss_data == -1:
-        logger.debug(f'incorrect file name')
 
-    return pss_data
+def pss_file_for_date(_date):
+    pss_file = pss_files.file_for_date(_date)
+    logger.info(f'filename: {pss_file}')
+
+    if pss_file is None:
+        pss_file = 'no_file_found'
+
+    return pss_file
+
+
+def pss_read_table(_date):
+    return read_pss_table(pss_file_for_date(_date))
+
+
+def read_pss_file(pss_file):
+    '''  deprecated, use read_pss_table. Returns the PssTable of pss_file, the
+         list of rows is no longer built
+    '''
+    warnings.warn('read_pss_file is deprecated, use read_pss_table',
+                  DeprecationWarning, stacklevel=2)
+    return read_pss_table(pss_file)
+
+
+def pss_read_file(_date):
+    '''  deprecated, use pss_read_table. Returns the PssTable of the pss file
+         of _date, the list of rows is no longer built
+    '''
+    warnings.warn('pss_read_file is deprecated, use pss_read_table',
+                  DeprecationWarning, stacklevel=2)
+    return pss_read_table(_date)
+
+
+def pss_data_for_date(_date):
+    '''  PssData for the pss file of _date, a PssDataStream if the file is
+         larger than PSS_STREAM_BYTES and None if there is no file
+    '''
+    pss_file = pss_file_for_date(_date)
+    try:
+        if os.path.getsize(pss_file) > PSS_STREAM_BYTES:
+            logger.info(f'streaming: {pss_file}')
+            return PssDataStream(pss_file)
+
+    except OSError:
+        return None
+
+    pss_table = read_pss_table(pss_file)
+    if pss_table is None:
+        return None
+
+    return PssData(pss_table)
+
+
+def map_days(func, days, workers=PSS_WORKERS):
+    '''  apply func to each day, in a process pool if workers > 1. The
+         results are returned in the order of days
+
+         Parameters:
+         :func: function of a day, must be picklable for the process pool
+         :days: list of dates
+         :workers: number of worker processes, 1 is serial
+         Returns:
+         :results: list of func(day) for the days
+    '''
+    if workers > 1 and len(days) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(func, days))
+
+    return [func(day) for day in days]
 
 
-def get_vps_force_for_date_range(start_date, end_date, medium_force, high_force):
+def concat_vps(vp_day_gpds):
+    '''  concatenate the daily vp dataframes once, days without data are None '''
+    vp_day_gpds = [vp_day_gpd for vp_day_gpd in vp_day_gpds if vp_day_gpd is not None]
+    if not vp_day_gpds:
+        return GeoDataFrame()
+
+    return pd.concat(vp_day_gpds, ignore_index=True)
+
+
+def get_vps_force_for_day(day, medium_force, high_force):
+    '''  reads pss data for a day and extracts vps and force, None if there is
+         no pss file for the day
+    '''
+    vps = pss_data_for_date(day)
+    if vps is None:
+        return None
+
+    vps.make_vp_gpd('Force Avg')
+    vp_day_gpd = vps.add_force_level(medium_force, high_force)
+    logger.debug(f'length: {len(vp_day_gpd)}')
+
+    return vp_day_gpd
+
+
+def get_vps_attribute_for_day(attribute, day):
+    '''  reads pss data for a day and extracts vps and attribute, None if there
+         is no pss file for the day
+    '''
+    vps = pss_data_for_date(day)
+    if vps is None:
+        return None
+
+    vp_day_gpd = vps.make_vp_gpd(attribute)
+    logger.debug(f'length: {len(vp_day_gpd)}')
+
+    return vp_day_gpd
+
+
+def get_vp_records_for_day(day, medium_force, high_force, attr_keys=('Force Avg',)):
+    '''  reads pss data for a day and aggregates the VPs with their Unit IDs
+         and attr_keys, see PssData.make_vp_records. VPs without a valid
+         Force Avg are dropped and the force level is added. None if there is
+         no pss file for the day
+    '''
+    pss_table = pss_read_table(day)
+    if pss_table is None:
+        return None
+
+    vp_records = PssData(pss_table).make_vp_records(
+        day, list(dict.fromkeys(['Force Avg', *attr_keys])))
+    vp_records = vp_records[vp_records['Force Avg'].notna()].reset_index(drop=True)
+    vp_records['force_level'] = group_forces(
+        vp_records['Force Avg'].to_numpy(), medium_force, high_force)
+    logger.debug(f'length: {len(vp_records)}')
+
+    return vp_records
+
+
+def get_vps_force_for_days(days, medium_force, high_force, workers=PSS_WORKERS):
+    '''  reads pss data for each day and extracts vps and force
+
+         return:
+         :vp_day_gpds: list of geopandas dataframes, None for days without data
+    '''
+    return map_days(partial(get_vps_force_for_day, medium_force=medium_force,
+                            high_force=high_force), days, workers=workers)
+
+
+def get_vps_force_for_date_range(start_date, end_date, medium_force, high_force,
+                                 workers=PSS_WORKERS):
     '''  reads pss data for a date range and extracts vps and force
 
          parameters:
@@ -227,51 +696,33 @@ def get_vps_force_for_date_range(start_date, end_date, medium_force, high_force)
          :end_date: end date (datetime date type)
          :medium_force: force level below is low force
          :high_force: force level above is high force
+         :workers: number of worker processes to read the days, 1 is serial
 
          return:
          :vp_gpd: geopandas dataframe with vp attribute data in local coordinates
     '''
-    vp_gpd = GeoDataFrame()
-
-    for day in daterange(start_date, end_date):
-        pss_data = pss_read_file(day)
-        if pss_data == -1:
-            continue
-        vps = PssData(pss_data)
-        vps.make_vp_gpd('Force Avg')
-        vp_day_gpd = vps.add_force_level(medium_force, high_force)
-
-        vp_gpd = pd.concat([vp_gpd, vp_day_gpd], ignore_index=True)
-
-        logger.debug(f'length: {len(vp_day_gpd)}')
-
+    vp_gpd = concat_vps(get_vps_force_for_days(
+        list(daterange(start_date, end_date)), medium_force, high_force,
+        workers=workers))
     logger.info(f'total length: {len(vp_gpd)}')
 
     return vp_gpd
 
-def get_vps_attribute_for_date_range(attribute, start_date, end_date):
+def get_vps_attribute_for_date_range(attribute, start_date, end_date,
+                                     workers=PSS_WORKERS):
     '''  reads pss data for a date range and extracts vps and viscosity
 
          parameters:
          :start_date: start date (datetime date type)
          :end_date: end date (datetime date type)
+         :workers: number of worker processes to read the days, 1 is serial
 
          return:
          :vp_gpd: geopandas dataframe with vp attribute data in local coordinates
     '''
-    vp_gpd = GeoDataFrame()
-
-    for day in daterange(start_date, end_date):
-        pss_data = pss_read_file(day)
-        if pss_data == -1:
-            continue
-        vps = PssData(pss_data)
-        vp_day_gpd = vps.make_vp_gpd(attribute)
-
-        vp_gpd = pd.concat([vp_gpd, vp_day_gpd], ignore_index=True)
-
-        logger.debug(f'length: {len(vp_day_gpd)}')
-
+    vp_gpd = concat_vps(map_days(
+        partial(get_vps_attribute_for_day, attribute),
+        list(daterange(start_date, end_date)), workers=workers))
     logger.info(f'total length: {len(vp_gpd)}')
 
     return vp_gpd
@@ -1,24 +1,18 @@
-import csv
-import glob
+from functools import partial
 import pandas as pd
 import numpy as np
-from geopandas import GeoDataFrame
-from shapely.geometry import Point
-from datetime import timedelta
 
-from geo_io import daterange, EPSG_31256_adapted, EPSG_WGS84
+from geo_io import daterange
+from pss_cache import PssCache, dataframe_from_columns
+from pss_io import (clean_pss_data, aggregate_vps, make_vp_gpd_from_arrays,
+                    map_days, concat_vps, pss_file_for_date, PSS_WORKERS)
 from Utils.plogger import Logger
-from Utils.utils import average_with_outlier_removed
 
 
-PREFIX = r'RAW_PSS\PSS_'
-LAT_MIN = 48
-LAT_MAX = 49
-LONG_MIN = 16
-LONG_MAX = 18
 ALLOWED_FORCE_RANGE = 10
 
 logger = Logger.getlogger()
+column_cache = PssCache()
 nl = '\n'
 
 
@@ -29,30 +23,18 @@ class PssData:
         self.medium_force = medium_force
         self.high_force = high_force
 
-        # self.pss_df['Comment'] = self.pss_df['Comment'].astype('str')
-        # self.pss_df['Void'] = self.pss_df['Void'].astype('str')
-
         # clean PSS data
-        delete_list = []
-        for index, pss_row in self.pss_df.iterrows():
-            if pss_row['Void'] == 'Void':
-                delete_list.append(index)
-            elif pd.isnull(pss_row['File Num']):
-                delete_list.append(index)
-            elif pss_row['Force Avg'] == 0:
-                delete_list.append(index)
-            try:
-                if pss_row['Comment'][-10:] == 'been shot!':
-                    print('hello comment') 
-                    delete_list.append(index)
-            except:
-                pass
-
-        self.pss_df = self.pss_df.drop(delete_list).reset_index()
-
-        # set the proper types and sort
+        order, self.rejected = clean_pss_data(
+            self.pss_df['Void'].to_numpy(),
+            self.pss_df['File Num'].to_numpy(dtype=np.float64),
+            self.pss_df['Force Avg'].to_numpy(dtype=np.float64),
+            self.pss_df['Comment'].to_numpy(),)
+        logger.info(f'rejected rows: {self.rejected}')
+        # order is sorted on File Num, so no sort is needed after the cleaning
+        self.pss_df = self.pss_df.iloc[order].reset_index()
+
+        # set the proper types
         self.pss_df['File Num'] = self.pss_df['File Num'].astype('int64')
-        self.pss_df = self.pss_df.sort_values(by='File Num')
 
     def get_pss_df(self):
         return self.pss_df
@@ -87,48 +69,17 @@ class PssData:
         '''  method to make geopandas dataframe for records obtained 
              from values from pss
         '''
-        vp_lats = []
-        vp_longs = []
-        vp_forces = []
-        record = None
-        _count = 0
-        
-        for index, pss_row in self.pss_df.iterrows():
-            vp_lat = pss_row['Lat']
-            vp_long = pss_row['Lon']
-            valid_coord = LAT_MIN < vp_lat and vp_lat < LAT_MAX and \
-                          LONG_MIN < vp_long and vp_long < LONG_MAX
-            if not valid_coord:
-                continue
-
-            if pss_row['File Num'] == record:
-                _vp_lat += vp_lat
-                _vp_long += vp_long
-                _forces.append(pss_row['Force Avg'])
-                _count += 1                             
-
-            else:
-                if _count > 0:
-                    _average_force = average_with_outlier_removed(_forces, 
-                        ALLOWED_FORCE_RANGE)
-                    if _average_force:
-                        vp_lats.append(_vp_lat / _count)
-                        vp_longs.append(_vp_long / _count)
-                        vp_forces.append(_average_force)
-                    else:
-                        logger.info(f'record: {record}, invalid list of forces: {_forces}')
-
-                record = pss_row['File Num']
-                _vp_lat = vp_lat
-                _vp_long = vp_long
-                _forces = [pss_row['Force Avg']]
-                _count = 1
+        records, vp_longs, vp_lats, vp_forces = aggregate_vps(
+            self.pss_df['File Num'].to_numpy(dtype=np.float64),
+            self.pss_df['Lon'].to_numpy(dtype=np.float64),
+            self.pss_df['Lat'].to_numpy(dtype=np.float64),
+            self.pss_df['Force Avg'].to_numpy(dtype=np.float64),
+            ALLOWED_FORCE_RANGE)
 
         # and make the dataframe
-        geometry = [Point(xy) for xy in zip(vp_longs, vp_lats)]
-        self.vp_gpd = GeoDataFrame(crs={'init': f'epsg:{EPSG_WGS84}'}, geometry=geometry)
-        self.vp_gpd = self.vp_gpd.to_crs(EPSG_31256_adapted)
+        self.vp_gpd = make_vp_gpd_from_arrays(vp_longs, vp_lats)
         self.vp_gpd['forces'] = vp_forces
+        self.vp_gpd['File Num'] = records
         self.add_force_level()
 
         logger.debug(f'vp_gpd is:{nl}{self.vp_gpd.head(10)}')
@@ -158,7 +109,7 @@ class PssData:
 
 def read_pss_file_csv(csv_file):
     try:
-        pss_df = pd.read_csv(csv_file)
+        pss_df = dataframe_from_columns(column_cache.read(csv_file))
     except FileNotFoundError:
         pss_df = pd.DataFrame()
 
@@ -175,20 +126,7 @@ def read_pss_file_xls(xls_file):
 
 
 def pss_read_file(_date):
-
-    _pss_file = PREFIX + ''.join([f'{int(_date.strftime("%Y")):04}', '_'
-                                  f'{int(_date.strftime("%m")):02}', '_' 
-                                  f'{int(_date.strftime("%d")):02}', '*.csv'])
-    # pss_file = PREFIX + _date + '.xlsx'
-
-    logger.debug(f'filename: {_pss_file}')
-    _pss_file = glob.glob(_pss_file)
-    logger.info(f'filename: {_pss_file}')
-    
-    if len(_pss_file) != 1:
-        pss_file = ''
-    else:
-        pss_file = _pss_file[0]
+    pss_file = pss_file_for_date(_date)
 
     if pss_file[-4:] == '.csv':
         pss_df = read_pss_file_csv(pss_file)
@@ -203,7 +141,20 @@ def pss_read_file(_date):
     return pss_df
 
 
-def obtain_vps_for_date_range(start_date, end_date, medium_force, high_force):
+def obtain_vps_for_day(day, medium_force, high_force):
+    '''  reads pss data for a day and extracts vps, None if there is no data '''
+    pss_df = pss_read_file(day)
+    if pss_df.empty:
+        return None
+
+    vp_day_gpd = PssData(pss_df, medium_force, high_force).make_vp_gpd()
+    logger.debug(f'length: {len(vp_day_gpd)}')
+
+    return vp_day_gpd
+
+
+def obtain_vps_for_date_range(start_date, end_date, medium_force, high_force,
+                              workers=PSS_WORKERS):
     '''  reads pss data for a date range and extracts vps
          
          parameters:
@@ -211,21 +162,14 @@ def obtain_vps_for_date_range(start_date, end_date, medium_force, high_force):
          :end_date: end date (datetime date type)
          :medium_force: force level below is low force
          :high_force: force level above is high force
+         :workers: number of worker processes to read the days, 1 is serial
 
          return:
          :vp_gpd: geopandas dataframe with vp attribute data in local coordinates
     '''
-    vp_gpd = GeoDataFrame()
-
-    for day in daterange(start_date, end_date):
-        pss_df = pss_read_file(day)
-        if pss_df.empty:
-            continue
-        vp_day_gpd = PssData(pss_df, medium_force, high_force).make_vp_gpd()
-        vp_gpd = pd.concat([vp_gpd, vp_day_gpd], ignore_index=True)
-
-        logger.debug(f'length: {len(vp_day_gpd)}')
-
+    vp_gpd = concat_vps(map_days(
+        partial(obtain_vps_for_day, medium_force=medium_force, high_force=high_force),
+        list(daterange(start_date, end_date)), workers=workers))
     logger.info(f'total length: {len(vp_gpd)}')
 
     return vp_gpd
@@ -2,15 +2,15 @@ import sys
 import matplotlib.pyplot as plt
 
 import set_gdal_pyproj_env_vars_and_logger  #pylint: disable=W0611
-from pyproj import Proj, transform  #pylint: disable=C0411
 from geopandas import GeoSeries  #pylint: disable=C0411
 from shapely.geometry import Polygon  #pylint: disable=C0411
 
 from pss_attr import pss_attr
-from pss_io import get_vps_attribute_for_date_range
-from geo_io import (GeoData, get_date_range, offset_transformation,
-                    add_basemap_local, add_basemap_osm,
-                    EPSG_31256_adapted, EPSG_OSM)
+from pss_io import get_vps_attribute_for_date_range, PSS_WORKERS
+import pss_store
+from geo_io import (GeoData, get_date_range, grid_geometry,
+                    add_basemap_local, add_basemap_osm)
+from crs_transform import transform, gdf_to_crs, CRS
 from Utils.plogger import Logger, timed
 
 
@@ -19,10 +19,8 @@ EDGECOLOR = 'black'
 maptypes = ['local', 'osm']
 cmap = 'coolwarm'
 
-proj_map = Proj(init=f'epsg:{EPSG_OSM}')
-proj_local = Proj(EPSG_31256_adapted)
-
 ZOOM = 13
+USE_PSS_STORE = False  # read the VPs from the pss_store instead of the pss files
 OFFSET_INLINE = 6000.0
 OFFSET_CROSSLINE = 6000.0
 maptitle = ('VPs 3D Schonkirchen', 18)
@@ -51,8 +49,8 @@ class PlotMap:
         _, _, _, swaths_bnd_gpd = GeoData().filter_geo_data_by_swaths(
             swaths_selected=self.swaths_selected,
             swaths_only=True,
-            source_boundary=True,)
-        swaths_bnd_gpd = self.convert_to_map(swaths_bnd_gpd)
+            source_boundary=True,
+            crs=self.maptype)
         swaths_bnd_gpd.plot(ax=ax, facecolor='none', edgecolor=EDGECOLOR)
 
         # obtain the extent of the data based on swaths_bnd_gdf
@@ -77,8 +75,12 @@ class PlotMap:
     def plot_attribute_data(self, attribute, start_date, end_date):
         '''  plot vp attribute data '''
 
-        vib_attribute_gpd = get_vps_attribute_for_date_range(
-            attribute, start_date, end_date)
+        if USE_PSS_STORE:
+            vib_attribute_gpd = pss_store.get_vps_attribute_for_date_range(
+                attribute, start_date, end_date, workers=PSS_WORKERS)
+        else:
+            vib_attribute_gpd = get_vps_attribute_for_date_range(
+                attribute, start_date, end_date, workers=PSS_WORKERS)
         vib_attribute_gpd = self.convert_to_map(vib_attribute_gpd)
 
         if vib_attribute_gpd.empty:
@@ -132,23 +134,16 @@ class PlotMap:
     def add_patch(self, x_map, y_map):
         # convert map point to local coordinate
         if self.maptype == maptypes[1]:
-            x, y = transform(proj_map, proj_local, x_map, y_map)
+            x, y = transform(x_map, y_map, 'osm', 'local')
         else:
             x, y = x_map, y_map
 
-        c1 = tuple([x + offset_transformation(OFFSET_INLINE, OFFSET_CROSSLINE)[0],
-                    y + offset_transformation(OFFSET_INLINE, OFFSET_CROSSLINE)[1]])
-        c2 = tuple([x + offset_transformation(OFFSET_INLINE, -OFFSET_CROSSLINE)[0],
-                    y + offset_transformation(OFFSET_INLINE, -OFFSET_CROSSLINE)[1]])
-        c3 = tuple([x + offset_transformation(-OFFSET_INLINE, -OFFSET_CROSSLINE)[0],
-                    y + offset_transformation(-OFFSET_INLINE, -OFFSET_CROSSLINE)[1]])
-        c4 = tuple([x + offset_transformation(-OFFSET_INLINE, OFFSET_CROSSLINE)[0],
-                    y + offset_transformation(-OFFSET_INLINE, OFFSET_CROSSLINE)[1]])
+        c1, c2, c3, c4 = map(tuple, grid_geometry.patch_corners(
+            x, y, OFFSET_INLINE, OFFSET_CROSSLINE).tolist())
 
         # set corner points of patch and convert back to map coordinates
         patch_polygon = Polygon([c1, c2, c3, c4, c1])
-        patch_gpd = GeoSeries(patch_polygon)
-        patch_gpd.crs = EPSG_31256_adapted
+        patch_gpd = GeoSeries(patch_polygon, crs=CRS['local'])
         patch_gpd = self.convert_to_map(patch_gpd)
         patch_gpd.plot(ax=self.ax, facecolor='None', edgecolor='red', gid='patch')
 
@@ -158,8 +153,8 @@ class PlotMap:
                 plot_object.remove()
 
     def convert_to_map(self, df):
-        if self.maptype == maptypes[1] and not df.empty:
-            df = df.to_crs(f'epsg:{EPSG_OSM}')
+        if self.maptype == maptypes[1]:
+            df = gdf_to_crs(df, 'local', 'osm')
         else:
             pass
         return df
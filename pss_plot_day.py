@@ -1,13 +1,15 @@
 import sys
-from datetime import timedelta
+import time
+from datetime import date, timedelta
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.patches import Polygon, Circle
-import pyproj
-from pss_io import get_vps_force_for_date_range
+from matplotlib.path import Path
+from rtree import index
+from pss_io import get_vp_records_for_day, pss_file_for_date, PssTail
 from geo_io import (
-    GeoData, get_date, offset_transformation, add_basemap_local, add_basemap_osm,
-    EPSG_31256_adapted, EPSG_OSM)
+    GeoData, get_date, grid_geometry, add_basemap_local, add_basemap_osm)
+from crs_transform import transform, transform_points
 from Utils.plogger import Logger
 
 #pylint: disable=no-value-for-parameter
@@ -16,12 +18,6 @@ MARKERSIZE = 0.04
 EDGECOLOR = 'black'
 maptypes = ['local', 'osm']
 
-# transformations from map to local and vice versa
-proj_map = pyproj.Proj(f'epsg:{EPSG_OSM}')
-proj_local = pyproj.Proj(EPSG_31256_adapted)
-t_map_local = pyproj.Transformer.from_proj(proj_map, proj_local)
-t_local_map = pyproj.Transformer.from_proj(proj_local, proj_map)
-
 FIGSIZE = (8, 8)
 MEDIUM_FORCE = 35
 HIGH_FORCE = 60
@@ -33,20 +29,131 @@ maptitle = ('VPs 3D Schonkirchen', 18)
 force_attrs = {'1HIGH': ['red', f'high > {HIGH_FORCE}'],
                '2MEDIUM': ['cyan', f'medium > {MEDIUM_FORCE}'],
                '3LOW': ['yellow', f'low <= {MEDIUM_FORCE}'],}
+FORCE_ATTRIBUTES = ['Force Avg', 'Force Max', 'Force Out', 'Target Force']
+LIVE_INTERVAL = 10000  # ms between reads of today's pss file in live mode
 
 logger = Logger.getlogger()
 nl = '\n'
 
+class DayVps:
+    '''  VPs of a day as arrays with an Rtree index on the local coordinates,
+         the index of a day is built once when the day is loaded
+    '''
+    def __init__(self, vp_records, maptype=None):
+        self.maptype = maptype
+        if vp_records is None:
+            vp_records = {key: np.array([]) for key in
+                          ['x', 'y', 'force_level', 'File Num', 'Unit IDs'] + FORCE_ATTRIBUTES}
+
+        self.x = np.asarray(vp_records['x'], dtype=np.float64)
+        self.y = np.asarray(vp_records['y'], dtype=np.float64)
+        self.x_map, self.y_map = self.to_map(self.x, self.y)
+        self.force_level = np.asarray(vp_records['force_level'], dtype=object)
+        self.file_num = np.asarray(vp_records['File Num'], dtype=np.int64)
+        self.unit_ids = np.asarray(vp_records['Unit IDs'], dtype=object)
+        self.forces = {attr: np.asarray(vp_records[attr], dtype=np.float64)
+                       for attr in FORCE_ATTRIBUTES}
+        self.positions = {file_num: i for i, file_num in enumerate(self.file_num.tolist())}
+
+        if self.x.size > 0:
+            self.index = index.Index(
+                (i, (x, y, x, y), None) for i, (x, y) in enumerate(zip(self.x, self.y)))
+        else:
+            self.index = index.Index()
+
+    def to_map(self, x, y):
+        if self.maptype == maptypes[1]:
+            return transform(x, y, 'local', 'osm')
+
+        return x, y
+
+    def update(self, vp_records, removed):
+        '''  replace or add the VPs of vp_records and remove the VPs with File Num
+             in removed, only the index entries of these VPs are changed. A
+             removed VP keeps its position with an empty force level
+        '''
+        for file_num in removed:
+            i = self.positions.get(file_num)
+            if i is not None and self.force_level[i] != '':
+                self.index.delete(i, (self.x[i], self.y[i], self.x[i], self.y[i]))
+                self.force_level[i] = ''
+
+        if vp_records is None or vp_records.empty:
+            return
+
+        file_nums = vp_records['File Num'].tolist()
+        new = [file_num for file_num in file_nums if file_num not in self.positions]
+        if new:
+            size = self.x.size
+            self.positions.update({file_num: size + i for i, file_num in enumerate(new)})
+            self.x, self.y, self.x_map, self.y_map = (
+                np.concatenate([values, np.full(len(new), np.nan)])
+                for values in (self.x, self.y, self.x_map, self.y_map))
+            self.force_level = np.concatenate([self.force_level, np.full(len(new), '', dtype=object)])
+            self.file_num = np.concatenate([self.file_num, new])
+            self.unit_ids = np.concatenate([self.unit_ids, np.full(len(new), '', dtype=object)])
+            self.forces = {attr: np.concatenate([values, np.full(len(new), np.nan)])
+                           for attr, values in self.forces.items()}
+
+        positions = np.array([self.positions[file_num] for file_num in file_nums], dtype=np.int64)
+        for i in positions[self.force_level[positions] != '']:
+            self.index.delete(i, (self.x[i], self.y[i], self.x[i], self.y[i]))
+
+        self.x[positions] = vp_records['x'].to_numpy()
+        self.y[positions] = vp_records['y'].to_numpy()
+        self.x_map[positions], self.y_map[positions] = self.to_map(
+            self.x[positions], self.y[positions])
+        self.force_level[positions] = vp_records['force_level'].to_numpy()
+        self.unit_ids[positions] = vp_records['Unit IDs'].to_numpy()
+        for attr in FORCE_ATTRIBUTES:
+            self.forces[attr][positions] = vp_records[attr].to_numpy()
+
+        for i in positions:
+            self.index.insert(i, (self.x[i], self.y[i], self.x[i], self.y[i]))
+
+    def __len__(self):
+        return self.x.size
+
+    def offsets(self, force_level):
+        '''  map coordinates of the VPs with force_level '''
+        mask = self.force_level == force_level
+        if not mask.any():
+            return [[0, 0]]
+
+        return np.column_stack([self.x_map[mask], self.y_map[mask]])
+
+    def count_in_patch(self, corners):
+        '''  number of VPs per force level inside the polygon corners given
+             in local coordinates
+        '''
+        corners = np.asarray(corners)
+        bbox = (*corners.min(axis=0), *corners.max(axis=0))
+        ids = np.fromiter(self.index.intersection(bbox), dtype=np.int64)
+        inside = ids[Path(corners).contains_points(
+            np.column_stack([self.x[ids], self.y[ids]]))] if ids.size else ids
+
+        levels, counts = np.unique(self.force_level[inside], return_counts=True)
+        counts = dict(zip(levels, counts))
+        return {force_level: int(counts.get(force_level, 0)) for force_level in force_attrs}
+
+    def nearest(self, x, y):
+        '''  index of the VP nearest to local coordinate x, y, None if no VPs '''
+        return next(self.index.nearest((x, y, x, y), 1), None)
+
+
 class PlotMap:
     '''  class contains method to plot the pss data, swath boundary, map and
          active receivers
     '''
-    def __init__(self, start_date, maptype=None, swaths_selected=None):
+    def __init__(self, start_date, maptype=None, swaths_selected=None, live=False):
         self.date = start_date
         self.maptype = maptype
         self.swaths_selected = swaths_selected
-        self.pss_dataframes = [None, None, None]
-        self.init_pss_dataframes()
+        self.live = live
+        self.pss_tail = None
+        self.pss_days = [None, None, None]
+        self.patch_corners = None
+        self.init_pss_days()
 
         self.fig, self.ax = self.setup_map(figsize=FIGSIZE)
 
@@ -58,12 +165,17 @@ class PlotMap:
         self.resize_timer = self.fig.canvas.new_timer(interval=250)
         self.resize_timer.add_callback(self.blit)
 
+        self.live_timer = self.fig.canvas.new_timer(interval=LIVE_INTERVAL)
+        self.live_timer.add_callback(self.on_live_timer)
+
         # start event loop
         self.artists_on_stage = False
         self.background = None
         self.show(block=False)
         plt.pause(0.1)
         self.blit()
+        if self.live:
+            self.live_timer.start()
 
     def setup_map(self, figsize):
         ''' setup the map and background '''
@@ -73,8 +185,8 @@ class PlotMap:
         _, _, _, swaths_bnd_gpd = GeoData().filter_geo_data_by_swaths(
             swaths_selected=self.swaths_selected,
             swaths_only=True,
-            source_boundary=True,)
-        swaths_bnd_gpd = self.convert_to_map(swaths_bnd_gpd)
+            source_boundary=True,
+            crs=self.maptype)
         swaths_bnd_gpd.plot(ax=ax, facecolor='none', edgecolor=EDGECOLOR)
         # obtain the extent of the data based on swaths_bnd_gdf
         extent_map = ax.axis()
@@ -108,6 +220,9 @@ class PlotMap:
         self.ax.add_patch(self.actrecv_artist)
         self.cp_artist = Circle((0, 0), radius=SOURCE_CENTER, fc=SOURCE_COLOR)
         self.ax.add_patch(self.cp_artist)
+        self.info_artist = self.ax.text(
+            0.02, 0.02, '', transform=self.ax.transAxes, fontsize=8,
+            bbox={'facecolor': 'white', 'alpha': 0.7})
         self.artists_on_stage = True
 
     def remove_artists(self):
@@ -117,52 +232,89 @@ class PlotMap:
             self.date_artist.remove()
             self.actrecv_artist.remove()
             self.cp_artist.remove()
+            self.info_artist.remove()
             self.artists_on_stage = False
 
         else:
             pass
 
-    def init_pss_dataframes(self):
+    def load_pss_day(self, _date):
+        '''  VPs of _date, in live mode today is read through a PssTail so
+             appended rows can be read later
+        '''
+        if self.live and _date == date.today():
+            self.pss_tail = PssTail(pss_file_for_date(_date), _date, MEDIUM_FORCE,
+                                    HIGH_FORCE, FORCE_ATTRIBUTES)
+            vp_records, _ = self.pss_tail.read()
+            return DayVps(vp_records, self.maptype)
+
+        return DayVps(get_vp_records_for_day(
+            _date, MEDIUM_FORCE, HIGH_FORCE, FORCE_ATTRIBUTES), self.maptype)
+
+    def init_pss_days(self):
         dates = [self.date - timedelta(1), self.date, self.date + timedelta(1)]
         for i, _date in enumerate(dates):
-            _pss_gpd = get_vps_force_for_date_range(
-                _date, _date, MEDIUM_FORCE, HIGH_FORCE)
-            _pss_gpd = self.convert_to_map(_pss_gpd)
-            self.pss_dataframes[i] = _pss_gpd
-
-    def update_right_pss_dataframes(self):
-        self.pss_dataframes[0] = self.pss_dataframes[1]
-        self.pss_dataframes[1] = self.pss_dataframes[2]
-        _date = self.date+timedelta(1)
-        _pss_gpd = get_vps_force_for_date_range(_date, _date, MEDIUM_FORCE, HIGH_FORCE)
-        _pss_gpd = self.convert_to_map(_pss_gpd)
-        self.pss_dataframes[2] = _pss_gpd
-
-    def update_left_pss_dataframes(self):
-        self.pss_dataframes[2] = self.pss_dataframes[1]
-        self.pss_dataframes[1] = self.pss_dataframes[0]
-        _date = self.date-timedelta(1)
-        _pss_gpd = get_vps_force_for_date_range(_date, _date, MEDIUM_FORCE, HIGH_FORCE)
-        _pss_gpd = self.convert_to_map(_pss_gpd)
-        self.pss_dataframes[0] = _pss_gpd
+            self.pss_days[i] = self.load_pss_day(_date)
+
+    def update_right_pss_days(self):
+        self.pss_days[0] = self.pss_days[1]
+        self.pss_days[1] = self.pss_days[2]
+        self.pss_days[2] = self.load_pss_day(self.date + timedelta(1))
+
+    def update_left_pss_days(self):
+        self.pss_days[2] = self.pss_days[1]
+        self.pss_days[1] = self.pss_days[0]
+        self.pss_days[0] = self.load_pss_day(self.date - timedelta(1))
 
     def plot_pss_data(self, index):
         '''  plot pss force data in three ranges LOW, MEDIUM, HIGH '''
-        vib_pss_gpd = self.pss_dataframes[index]
+        day_vps = self.pss_days[index]
         self.date_artist.set_text(self.date.strftime("%d %m %y"))
 
         # plot the VP grouped by force_level
-        if not vib_pss_gpd.empty:
-            for force_level, vib_pss in vib_pss_gpd.groupby('force_level'):
-                if pts:=[(xy.x, xy.y) for xy in vib_pss['geometry'].to_list()]:
-                    self.vib_artists[force_level].set_offsets(pts)
+        for force_level in force_attrs:
+            self.vib_artists[force_level].set_offsets(day_vps.offsets(force_level))
+
+        self.patch_statistics(day_vps)
+
+    def patch_statistics(self, day_vps):
+        '''  show the number of VPs per force level inside the active receivers '''
+        if self.patch_corners is None:
+            return
 
-                else:
-                    self.vib_artists[force_level].set_offsets([[0, 0]])
+        start = time.perf_counter()
+        counts = day_vps.count_in_patch(self.patch_corners)
+        logger.info(f'patch counts: {counts} in '
+                    f'{(time.perf_counter() - start) * 1000:.1f} ms')
+        self.info_artist.set_text(
+            f'VPs in patch: {sum(counts.values())}{nl}' +
+            nl.join(f'{force_attrs[force_level][1]}: {count}'
+                    for force_level, count in counts.items()))
+
+    def pick_vp(self, x_map, y_map):
+        '''  show File Num, Unit IDs and forces of the VP nearest to the point '''
+        if x_map is None or y_map is None:
+            return
 
+        if self.maptype == maptypes[1]:
+            x, y = transform(x_map, y_map, 'osm', 'local')
         else:
-            for force_level in force_attrs:
-                self.vib_artists[force_level].set_offsets([[0, 0]])
+            x, y = x_map, y_map
+
+        start = time.perf_counter()
+        day_vps = self.pss_days[1]
+        i = day_vps.nearest(x, y)
+        logger.info(f'pick in {(time.perf_counter() - start) * 1000:.1f} ms')
+        if i is None:
+            self.info_artist.set_text('no VPs')
+            return
+
+        forces = ', '.join(f'{attr}: {day_vps.forces[attr][i]:.1f}'
+                           for attr in FORCE_ATTRIBUTES)
+        distance = np.hypot(day_vps.x[i] - x, day_vps.y[i] - y)
+        self.info_artist.set_text(
+            f'File Num: {day_vps.file_num[i]}, Unit IDs: {day_vps.unit_ids[i]}{nl}'
+            f'{forces}{nl}distance: {distance:.0f} m')
 
     def add_remove_actrecv(self, x_map, y_map, add=True):
         if x_map is None or y_map is None:
@@ -170,27 +322,26 @@ class PlotMap:
 
         # convert map point to local coordinate
         if self.maptype == maptypes[1]:
-            x, y = t_map_local.transform(x_map, y_map)
+            x, y = transform(x_map, y_map, 'osm', 'local')
         else:
             x, y = x_map, y_map
 
         cp = tuple([x, y])
-        c1 = tuple([x + offset_transformation(OFFSET_INLINE, OFFSET_CROSSLINE)[0],
-                    y + offset_transformation(OFFSET_INLINE, OFFSET_CROSSLINE)[1]])
-        c2 = tuple([x + offset_transformation(OFFSET_INLINE, -OFFSET_CROSSLINE)[0],
-                    y + offset_transformation(OFFSET_INLINE, -OFFSET_CROSSLINE)[1]])
-        c3 = tuple([x + offset_transformation(-OFFSET_INLINE, -OFFSET_CROSSLINE)[0],
-                    y + offset_transformation(-OFFSET_INLINE, -OFFSET_CROSSLINE)[1]])
-        c4 = tuple([x + offset_transformation(-OFFSET_INLINE, OFFSET_CROSSLINE)[0],
-                    y + offset_transformation(-OFFSET_INLINE, OFFSET_CROSSLINE)[1]])
+        c1, c2, c3, c4 = map(tuple, grid_geometry.patch_corners(
+            x, y, OFFSET_INLINE, OFFSET_CROSSLINE).tolist())
+
+        # VP statistics of the active receivers in local coordinates
+        if add:
+            self.patch_corners = [c1, c2, c3, c4]
+            self.patch_statistics(self.pss_days[1])
+
+        else:
+            self.patch_corners = None
+            self.info_artist.set_text('')
 
         # set corner points of active receivers and convert back to map coordinates
         if self.maptype == maptypes[1]:
-            cp = t_local_map.transform(cp[0], cp[1])
-            c1 = t_local_map.transform(c1[0], c1[1])
-            c2 = t_local_map.transform(c2[0], c2[1])
-            c3 = t_local_map.transform(c3[0], c3[1])
-            c4 = t_local_map.transform(c4[0], c4[1])
+            cp, c1, c2, c3, c4 = transform_points([cp, c1, c2, c3, c4], 'local', 'osm')
 
         if add:
             self.actrecv_artist.set_xy(np.array([c1, c2, c3, c4]))
@@ -200,13 +351,6 @@ class PlotMap:
             self.actrecv_artist.set_xy(np.array([c1]))
             self.cp_artist.center = (0, 0)
 
-    def convert_to_map(self, df):
-        if self.maptype == maptypes[1] and not df.empty:
-            df = df.to_crs(f'epsg:{EPSG_OSM}')
-        else:
-            pass
-        return df
-
     def on_click(self, event):
         # If we're using a tool on the toolbar, don't add/draw a point...
         if self.fig.canvas.toolbar.mode != '':
@@ -223,6 +367,11 @@ class PlotMap:
         self.blit()
 
     def on_key(self, event):
+        if event.key == 'i':
+            self.pick_vp(event.xdata, event.ydata)
+            self.blit()
+            return
+
         if event.key not in ['right', 'left', ' ']:
             return
 
@@ -230,18 +379,48 @@ class PlotMap:
         if event.key == 'right':
             self.date += timedelta(1)
             self.plot_pss_data(2)
-            self.update_right_pss_dataframes()
+            self.update_right_pss_days()
 
         elif event.key == 'left':
             self.date -= timedelta(1)
             self.plot_pss_data(0)
-            self.update_left_pss_dataframes()
+            self.update_left_pss_days()
 
         elif event.key == ' ':
             self.plot_pss_data(1)
 
         self.blit()
 
+    def on_live_timer(self):
+        '''  read the rows appended to today's pss file and update the VPs
+             of today, the map is redrawn if today is shown
+        '''
+        today = date.today()
+        slots = {self.date + timedelta(i - 1): i for i in range(3)}
+        if today not in slots or self.pss_tail is None or self.pss_tail.date != today:
+            return
+
+        # the file of today may not have existed when the tail was started
+        if self.pss_tail.offset == 0:
+            self.pss_tail.pss_file = pss_file_for_date(today)
+
+        start = time.perf_counter()
+        vp_records, removed = self.pss_tail.read()
+        if vp_records is None and not removed:
+            return
+
+        if self.pss_tail.truncated:
+            self.pss_tail.truncated = False
+            self.pss_days[slots[today]] = DayVps(vp_records, self.maptype)
+        else:
+            self.pss_days[slots[today]].update(vp_records, removed)
+        logger.info(f'live update: {len(vp_records)} vps, {len(removed)} removed in '
+                    f'{(time.perf_counter() - start) * 1000:.1f} ms')
+
+        if slots[today] == 1 and self.artists_on_stage:
+            self.plot_pss_data(1)
+            self.blit()
+
     def on_timer(self):
         print('on timer ...')
         self.timer.stop()
@@ -261,7 +440,7 @@ class PlotMap:
             self.fig.canvas.draw()
             print(
                 'go ahead use arrow keys to toggle date, '
-                'click canvas for active receivers')
+                'click canvas for active receivers, i to inspect the nearest VP')
             self.resize_timer.stop()
 
         else:
@@ -271,6 +450,7 @@ class PlotMap:
                 self.fig.draw_artist(self.vib_artists[force_level])
             self.fig.draw_artist(self.actrecv_artist)
             self.fig.draw_artist(self.cp_artist)
+            self.fig.draw_artist(self.info_artist)
             self.fig.canvas.blit(self.fig.bbox)
             self.fig.canvas.flush_events()
 
@@ -278,18 +458,24 @@ class PlotMap:
         plt.show(block=block)
 
 
-def main(maptype):
-    start_date = get_date()
-    PlotMap(start_date, maptype=maptype).show()
+def main(maptype, live):
+    start_date = date.today() if live else get_date()
+    PlotMap(start_date, maptype=maptype, live=live).show()
 
 if __name__ == "__main__":
     '''  Interactive display of production. Background maps can be
          selected by giving an argument.
          :arguments:
-            local: local map (jpg)
-            OSM: OpenStreetMap
-            No arguments or anything else: no background map
+            first argument:
+                local: local map (jpg)
+                OSM: OpenStreetMap
+                No arguments or anything else: no background map
+            second argument:
+                live: show today and read rows added to the pss file
+                every LIVE_INTERVAL ms
     '''
+    logformat = '%(asctime)s - %(levelname)s - %(message)s'
+    Logger.set_logger('autoseis.log', logformat, 'INFO')
 
     logger.info(f'{nl}==============================================='\
                 f'{nl}===>   Running: pss_plot_day (optimized)   <==='\
@@ -302,5 +488,10 @@ if __name__ == "__main__":
     except IndexError:
         maptype = None
 
-    logger.info(f'maptype: {maptype}')
-    main(maptype)
+    try:
+        live = sys.argv[2].lower() == 'live'
+    except IndexError:
+        live = False
+
+    logger.info(f'maptype: {maptype}, live: {live}')
+    main(maptype, live)
@@ -1,9 +1,11 @@
 from datetime import timedelta
 import matplotlib.pyplot as plt
 from matplotlib.lines import Line2D
+from geopandas import GeoDataFrame
 
 import set_gdal_pyproj_env_vars_and_logger  #pylint: disable=W0611
-from pss_io import get_vps_force_for_date_range
+from pss_io import get_vps_force_for_date_range, get_vps_force_for_days, PSS_WORKERS
+import pss_store
 from geo_io import (GeoData, get_date, get_date_range, daterange,
                     add_basemap_local)
 from Utils.plogger import Logger, timed
@@ -17,6 +19,7 @@ MARKERSCALE = 5.0
 FIGSIZE = 8
 HIGH_FORCE = 60
 MEDIUM_FORCE = 35
+USE_PSS_STORE = False  # read the VPs from the pss_store instead of the pss files
 maptitle = ('VPs 3D Schonkirchen', 12)
 logger = Logger.getlogger()
 nl = '\n'
@@ -61,12 +64,18 @@ class PlotMap:
         return fig, ax
 
     @timed(logger)  #pylint: disable=no-value-for-parameter
-    def plot_pss_data(self, from_date, to_date):
-        '''  plot pss force data in three ranges LOW, MEDIUM, HIGH '''
+    def plot_pss_data(self, from_date, to_date, vib_pss_gpd=None):
+        '''  plot pss force data in three ranges LOW, MEDIUM, HIGH, the data
+             is read for the date range unless vib_pss_gpd is given
+        '''
         logger.info(f'---------{to_date.strftime("%d-%B-%y")}---------------------------')
 
-        vib_pss_gpd = get_vps_force_for_date_range(
-            from_date, to_date, MEDIUM_FORCE, HIGH_FORCE)
+        if vib_pss_gpd is None and USE_PSS_STORE:
+            vib_pss_gpd = pss_store.get_vps_force_for_date_range(
+                from_date, to_date, MEDIUM_FORCE, HIGH_FORCE, workers=PSS_WORKERS)
+        elif vib_pss_gpd is None:
+            vib_pss_gpd = get_vps_force_for_date_range(
+                from_date, to_date, MEDIUM_FORCE, HIGH_FORCE, workers=PSS_WORKERS)
 
         # plot the VP grouped by force_level
         # for force_level, vib_pss in vib_pss_gpd.groupby('force_level'):
@@ -150,8 +159,18 @@ def main():
         start_date += timedelta(1)
 
     if start_date <= end_date:
-        for day in daterange(start_date, end_date):
-            plt_map.plot_pss_data(day, day)
+        # read the days in parallel before plotting them one by one
+        days = list(daterange(start_date, end_date))
+        if USE_PSS_STORE:
+            vib_pss_gpds = pss_store.get_vps_force_for_days(
+                days, MEDIUM_FORCE, HIGH_FORCE, workers=PSS_WORKERS)
+        else:
+            vib_pss_gpds = get_vps_force_for_days(
+                days, MEDIUM_FORCE, HIGH_FORCE, workers=PSS_WORKERS)
+        for day, vib_pss_gpd in zip(days, vib_pss_gpds):
+            if vib_pss_gpd is None:
+                vib_pss_gpd = GeoDataFrame()
+            plt_map.plot_pss_data(day, day, vib_pss_gpd=vib_pss_gpd)
             print(f'plotted map for {day.strftime("%d-%B-%y")}')
 
 
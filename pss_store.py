@@ -0,0 +1,304 @@
+'''  persistent store of aggregated VPs in a sqlite database
+
+     table vps has one row per VP of a day: File Num, Time, local x, y in
+     EPSG_31256_adapted, Unit IDs and the averaged value of each attribute in
+     STORE_ATTRIBUTES (NULL if there is no valid average). An R*Tree virtual
+     table vps_rtree on x, y gives the spatial index and table days holds the
+     size and mtime of the pss file a day was loaded from. A day is replaced
+     as a whole (upsert per day) when its pss file has changed.
+
+     Time is text 'YYYY-MM-DDTHH:MM:SS' from the Date and Time columns of the
+     first row of a record. Day is the date of the pss file.
+'''
+
+import os
+import sqlite3
+import numpy as np
+import pandas as pd
+from geopandas import GeoDataFrame, points_from_xy
+
+from geo_io import get_date_range, daterange, EPSG_31256_adapted
+from pss_attr import pss_attr
+from pss_io import (pss_file_for_date, read_pss_table, PssData, map_days,
+                    group_forces, PSS_WORKERS)
+from Utils.plogger import Logger
+
+PSS_STORE_FILE = r'pss_store.sqlite'
+STORE_ATTRIBUTES = [key for key, attr in pss_attr.items() if attr['range'] is not None]
+TIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
+DAY_FORMAT = '%Y-%m-%d'
+
+logger = Logger.getlogger()
+nl = '\n'
+
+
+def quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def vp_records_for_day(day):
+    '''  aggregated VPs of the pss file of day for the store
+
+         Returns:
+         :(pss_file, stat, vp_records): stat of pss_file before reading and the
+                                        dataframe of PssData.make_vp_records,
+                                        None if there is no valid file
+    '''
+    pss_file = pss_file_for_date(day)
+    try:
+        stat = os.stat(pss_file)
+    except OSError:
+        return None
+
+    pss_table = read_pss_table(pss_file)
+    if pss_table is None:
+        return None
+
+    vp_records = PssData(pss_table).make_vp_records(day, STORE_ATTRIBUTES)
+    return pss_file, stat, vp_records
+
+
+class PssStore:
+    '''  methods for the sqlite VP store, see module docstring '''
+    def __init__(self, db_file=PSS_STORE_FILE):
+        self.db_file = db_file
+        self.connection = sqlite3.connect(db_file)
+        self.create_tables()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def create_tables(self):
+        attributes = ''.join(f', {quote(attr)} REAL' for attr in STORE_ATTRIBUTES)
+        with self.connection:
+            self.connection.execute(
+                f'CREATE TABLE IF NOT EXISTS vps (id INTEGER PRIMARY KEY, day TEXT, '
+                f'file_num INTEGER, time TEXT, x REAL, y REAL, unit_ids TEXT'
+                f'{attributes}, UNIQUE(day, file_num))')
+            self.connection.execute(
+                'CREATE VIRTUAL TABLE IF NOT EXISTS vps_rtree '
+                'USING rtree(id, min_x, max_x, min_y, max_y)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS vps_time ON vps(time)')
+            self.connection.execute(
+                'CREATE TABLE IF NOT EXISTS days (day TEXT PRIMARY KEY, pss_file TEXT, '
+                'size INTEGER, mtime INTEGER, vps INTEGER)')
+
+            # attributes added to pss_attr after the store was created
+            columns = [row[1] for row in self.connection.execute('PRAGMA table_info(vps)')]
+            for attr in STORE_ATTRIBUTES:
+                if attr not in columns:
+                    self.connection.execute(f'ALTER TABLE vps ADD COLUMN {quote(attr)} REAL')
+
+    def stored_days(self):
+        '''  dict of day: (pss_file, size, mtime) of the days in the store '''
+        return {day: (pss_file, size, mtime) for day, pss_file, size, mtime in
+                self.connection.execute('SELECT day, pss_file, size, mtime FROM days')}
+
+    def upsert_day(self, day, pss_file, stat, vp_records):
+        '''  replace the VPs of day by vp_records in a single transaction '''
+        _day = day.strftime(DAY_FORMAT)
+        columns = ['day', 'file_num', 'time', 'x', 'y', 'unit_ids'] + STORE_ATTRIBUTES
+        values = pd.DataFrame({'day': _day,
+                               'file_num': vp_records['File Num'],
+                               'time': vp_records['Time'],
+                               'x': vp_records['x'],
+                               'y': vp_records['y'],
+                               'unit_ids': vp_records['Unit IDs']})
+        for attr in STORE_ATTRIBUTES:
+            values[attr] = vp_records[attr]
+        values = values.astype(object).where(values.notna(), None)
+
+        with self.connection:
+            self.connection.execute(
+                'DELETE FROM vps_rtree WHERE id IN (SELECT id FROM vps WHERE day = ?)',
+                (_day,))
+            self.connection.execute('DELETE FROM vps WHERE day = ?', (_day,))
+            self.connection.executemany(
+                f'INSERT INTO vps ({", ".join(quote(column) for column in columns)}) '
+                f'VALUES ({", ".join("?" * len(columns))})',
+                values.itertuples(index=False, name=None))
+            self.connection.execute(
+                'INSERT INTO vps_rtree SELECT id, x, x, y, y FROM vps WHERE day = ?',
+                (_day,))
+            self.connection.execute(
+                'INSERT OR REPLACE INTO days (day, pss_file, size, mtime, vps) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (_day, pss_file, stat.st_size, stat.st_mtime_ns, len(values)))
+
+        logger.info(f'stored {len(values)} vps for {_day}')
+
+    def update(self, days, workers=PSS_WORKERS):
+        '''  load the days of which the pss file is new or has changed, the
+             days are aggregated in parallel and written one by one
+
+             Returns:
+             :updated: list of days that were loaded
+        '''
+        stored_days = self.stored_days()
+        stale_days = []
+        for day in days:
+            pss_file = pss_file_for_date(day)
+            try:
+                stat = os.stat(pss_file)
+            except OSError:
+                continue
+
+            stored = stored_days.get(day.strftime(DAY_FORMAT))
+            if stored != (pss_file, stat.st_size, stat.st_mtime_ns):
+                stale_days.append(day)
+
+        updated = []
+        for day, day_records in zip(stale_days,
+                                    map_days(vp_records_for_day, stale_days, workers)):
+            if day_records is None:
+                continue
+
+            self.upsert_day(day, *day_records)
+            updated.append(day)
+
+        return updated
+
+    def query(self, bbox=None, polygon=None, time_window=None, date_range=None,
+              attribute=None):
+        '''  VPs in the store, the conditions are combined
+
+             Parameters:
+             :bbox: (min_x, min_y, max_x, max_y) in EPSG_31256_adapted
+             :polygon: shapely polygon in EPSG_31256_adapted
+             :time_window: (start_time, end_time), start_time <= Time < end_time
+             :date_range: (start_date, end_date), days of the pss files inclusive
+             :attribute: only VPs with a valid value for attribute
+             Returns:
+             :vp_gpd: geopandas dataframe in EPSG_31256_adapted with columns Day,
+                      File Num, Time, Unit IDs and STORE_ATTRIBUTES, sorted on
+                      Day and File Num
+        '''
+        if polygon is not None:
+            bbox = polygon.bounds if bbox is None else (
+                max(bbox[0], polygon.bounds[0]), max(bbox[1], polygon.bounds[1]),
+                min(bbox[2], polygon.bounds[2]), min(bbox[3], polygon.bounds[3]))
+
+        conditions, parameters = [], []
+        if bbox is not None:
+            conditions.append('v.id IN (SELECT id FROM vps_rtree WHERE min_x <= ? AND '
+                              'max_x >= ? AND min_y <= ? AND max_y >= ?) AND '
+                              'v.x BETWEEN ? AND ? AND v.y BETWEEN ? AND ?')
+            parameters += [bbox[2], bbox[0], bbox[3], bbox[1],
+                           bbox[0], bbox[2], bbox[1], bbox[3]]
+
+        if time_window is not None:
+            conditions.append('v.time >= ? AND v.time < ?')
+            parameters += [pd.Timestamp(_time).strftime(TIME_FORMAT) for _time in time_window]
+
+        if date_range is not None:
+            conditions.append('v.day BETWEEN ? AND ?')
+            parameters += [_date.strftime(DAY_FORMAT) for _date in date_range]
+
+        if attribute is not None:
+            assert attribute in STORE_ATTRIBUTES, f'{attribute} is not in the store'
+            conditions.append(f'v.{quote(attribute)} IS NOT NULL')
+
+        columns = ', '.join(f'v.{quote(attr)}' for attr in STORE_ATTRIBUTES)
+        where = f'WHERE {" AND ".join(conditions)} ' if conditions else ''
+        vps = pd.read_sql_query(
+            f'SELECT v.day, v.file_num, v.time, v.x, v.y, v.unit_ids, {columns} '
+            f'FROM vps v {where}ORDER BY v.day, v.file_num',
+            self.connection, params=parameters)
+
+        vp_gpd = GeoDataFrame(
+            vps.drop(columns=['x', 'y']).rename(columns={
+                'day': 'Day', 'file_num': 'File Num', 'time': 'Time',
+                'unit_ids': 'Unit IDs'}),
+            crs=EPSG_31256_adapted,
+            geometry=points_from_xy(vps['x'].to_numpy(dtype=np.float64),
+                                    vps['y'].to_numpy(dtype=np.float64)))
+        for attr in STORE_ATTRIBUTES:
+            vp_gpd[attr] = vp_gpd[attr].astype(np.float64)
+
+        if polygon is not None:
+            vp_gpd = vp_gpd[vp_gpd.within(polygon)].reset_index(drop=True)
+
+        logger.debug(f'vp_gpd is:{nl}{vp_gpd.head(10)}')
+
+        return vp_gpd
+
+    def vps_in_bbox(self, bbox, **kwargs):
+        return self.query(bbox=bbox, **kwargs)
+
+    def vps_in_polygon(self, polygon, **kwargs):
+        return self.query(polygon=polygon, **kwargs)
+
+    def vps_in_time_window(self, start_time, end_time, **kwargs):
+        return self.query(time_window=(start_time, end_time), **kwargs)
+
+
+def get_vps_attribute_for_date_range(attribute, start_date, end_date,
+                                     workers=PSS_WORKERS, db_file=PSS_STORE_FILE):
+    '''  as pss_io.get_vps_attribute_for_date_range, reading the VPs from the
+         store after days with new or changed pss files have been loaded
+    '''
+    with PssStore(db_file) as store:
+        store.update(list(daterange(start_date, end_date)), workers=workers)
+        vp_gpd = store.query(date_range=(start_date, end_date), attribute=attribute)
+
+    logger.info(f'total length: {len(vp_gpd)}')
+    return vp_gpd
+
+
+def get_vps_force_for_days(days, medium_force, high_force, workers=PSS_WORKERS,
+                           db_file=PSS_STORE_FILE):
+    '''  as pss_io.get_vps_force_for_days, reading the VPs from the store after
+         days with new or changed pss files have been loaded
+
+         return:
+         :vp_day_gpds: list of geopandas dataframes, None for days without data
+    '''
+    vp_day_gpds = []
+    with PssStore(db_file) as store:
+        store.update(days, workers=workers)
+        stored_days = store.stored_days()
+        for day in days:
+            if day.strftime(DAY_FORMAT) not in stored_days:
+                vp_day_gpds.append(None)
+                continue
+
+            vp_day_gpd = store.query(date_range=(day, day), attribute='Force Avg')
+            vp_day_gpd['force_level'] = group_forces(
+                vp_day_gpd['Force Avg'].to_numpy(), medium_force, high_force)
+            vp_day_gpds.append(vp_day_gpd)
+
+    return vp_day_gpds
+
+
+def get_vps_force_for_date_range(start_date, end_date, medium_force, high_force,
+                                 workers=PSS_WORKERS, db_file=PSS_STORE_FILE):
+    '''  as pss_io.get_vps_force_for_date_range, reading the VPs from the store '''
+    vp_gpd = get_vps_attribute_for_date_range(
+        'Force Avg', start_date, end_date, workers=workers, db_file=db_file)
+    vp_gpd['force_level'] = group_forces(
+        vp_gpd['Force Avg'].to_numpy(), medium_force, high_force)
+
+    return vp_gpd
+
+
+if __name__ == '__main__':
+    '''  load the pss files for a date range in the store '''
+    logformat = '%(asctime)s - %(levelname)s - %(message)s'
+    Logger.set_logger('autoseis.log', logformat, 'INFO')
+
+    start_date = -1
+    while start_date == -1:
+        start_date, end_date = get_date_range()
+
+    with PssStore() as pss_store:
+        for _day in pss_store.update(list(daterange(start_date, end_date))):
+            print(f'{_day.strftime("%d-%b-%y")}: loaded')
+
+        _vps = pss_store.query(date_range=(start_date, end_date))
+        print(f'vps in store for date range: {len(_vps)}')
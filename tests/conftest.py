@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+# the tools are flat modules in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# the tools write log files and caches to the working directory, the tests run
+# in a scratch directory so nothing is written to the repository
+os.chdir(tempfile.mkdtemp(prefix='autoseis_tests_'))
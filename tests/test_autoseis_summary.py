@@ -0,0 +1,52 @@
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from autoseis_summary import SummaryStore
+
+
+def test_upsert_same_date_and_new_column(tmp_path):
+    db_file = str(tmp_path / 'summary.sqlite')
+    with SummaryStore(db_file) as summary_store:
+        summary_store.upsert_day({'Date': [date(2020, 3, 2)], 'Checked / OK': np.int64(3),
+                                  'Perc. bad': np.nan, 'swaths': '1'})
+        summary_store.upsert_day({'Date': [date(2020, 3, 1)], 'Checked / OK': 5,
+                                  'Perc. bad': 0.5, 'swaths': '1, 2'})
+        # rerun of a date with a new status column
+        summary_store.upsert_day({'Date': [date(2020, 3, 2)], 'Checked / OK': 4,
+                                  'Perc. bad': 0.25, 'swaths': '1', 'New Peg needed': 2})
+
+        assert summary_store.columns() == ['Date', 'Checked / OK', 'Perc. bad', 'swaths',
+                                           'New Peg needed']
+        summary_df = summary_store.query()
+
+    assert summary_df['Date'].tolist() == [date(2020, 3, 1), date(2020, 3, 2)]
+    assert summary_df['Checked / OK'].tolist() == [5, 4]
+    assert summary_df['Perc. bad'].tolist() == [0.5, 0.25]
+    assert pd.isnull(summary_df['New Peg needed'][0])
+    assert summary_df['New Peg needed'][1] == 2
+
+
+def test_export_and_import_excel(tmp_path):
+    db_file = str(tmp_path / 'summary.sqlite')
+    excel_file = str(tmp_path / 'summary.xlsx')
+    columns = ['Date', 'Checked / OK', 'Perc. bad', 'swaths']
+    with SummaryStore(db_file) as summary_store:
+        summary_store.upsert_day({'Date': [date(2020, 3, 2)], 'Checked / OK': 3,
+                                  'Perc. bad': np.nan, 'swaths': '1'})
+        summary_store.upsert_day({'Date': [date(2020, 3, 1)], 'Checked / OK': 5,
+                                  'Perc. bad': 0.5, 'swaths': '1, 2'})
+        summary_store.export_excel(excel_file)
+
+    # no header, the rows as appended by df_to_excel
+    excel_df = pd.read_excel(excel_file, header=None)
+    assert excel_df.shape == (2, 4)
+    assert excel_df[1].tolist() == [5, 3]
+
+    with SummaryStore(str(tmp_path / 'imported.sqlite')) as summary_store:
+        assert summary_store.import_excel(columns, excel_file) == 2
+        summary_df = summary_store.query()
+
+    assert summary_df['Date'].tolist() == [date(2020, 3, 1), date(2020, 3, 2)]
+    assert summary_df['swaths'].tolist() == ['1, 2', '1']
@@ -0,0 +1,60 @@
+import os
+import datetime
+
+from Utils import file_index
+from Utils.file_index import FileIndex
+
+
+def touch(path):
+    with open(path, 'wt') as file_object:
+        file_object.write('x')
+
+
+def test_file_index_query_and_add_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_index, 'REFRESH_SECONDS', 0.0)
+    pss_dir = tmp_path / 'RAW_PSS'
+    pss_dir.mkdir()
+    for name in ['PSS_2020_03_01.csv', 'PSS_2020_03_02_rerun.csv', 'PSS_2020_03_03.xlsx',
+                 'PSS_notadate.csv', 'GEO_2020_03_04.csv']:
+        touch(pss_dir / name)
+
+    prefix = str(pss_dir / 'PSS_').replace(os.sep, '\\')
+    index_dir = str(tmp_path / 'file_index')
+    pss_files = FileIndex(prefix, '%Y_%m_%d', '.csv', index_dir=index_dir)
+    day_1, day_2, day_3 = (datetime.date(2020, 3, day) for day in (1, 2, 3))
+
+    assert pss_files.file_for_date(day_1) == os.path.join(
+        pss_files.directory, 'PSS_2020_03_01.csv')
+    assert pss_files.file_for_date(day_2) == os.path.join(
+        pss_files.directory, 'PSS_2020_03_02_rerun.csv')
+    assert pss_files.file_for_date(day_3) is None
+    assert sorted(pss_files.files) == [day_1, day_2]
+
+    # a new file is found on the next query, a second file for a date is ambiguous
+    touch(pss_dir / 'PSS_2020_03_03.csv')
+    touch(pss_dir / 'PSS_2020_03_01_copy.csv')
+    assert pss_files.file_for_date(day_3) == os.path.join(
+        pss_files.directory, 'PSS_2020_03_03.csv')
+    assert pss_files.file_for_date(day_1) is None
+    assert len(pss_files.files_for_date(day_1)) == 2
+    assert list(pss_files.ambiguous()) == [day_1]
+
+
+def test_file_index_stored(tmp_path, monkeypatch):
+    pss_dir = tmp_path / 'RAW_PSS'
+    pss_dir.mkdir()
+    touch(pss_dir / 'PSS_2020_03_01.csv')
+    # an old mtime of the directory so the stored index is settled
+    os.utime(pss_dir, (1e9, 1e9))
+
+    prefix = str(pss_dir / 'PSS_')
+    index_dir = str(tmp_path / 'file_index')
+    FileIndex(prefix, '%Y_%m_%d', '.csv', index_dir=index_dir).refresh(force=True)
+
+    def no_scan(self, mtime):
+        raise AssertionError('directory scanned with a valid stored index')
+
+    monkeypatch.setattr(FileIndex, 'scan', no_scan)
+    pss_files = FileIndex(prefix, '%Y_%m_%d', '.csv', index_dir=index_dir)
+    assert pss_files.files_for_date(datetime.date(2020, 3, 1)) == [
+        os.path.join(pss_files.directory, 'PSS_2020_03_01.csv')]
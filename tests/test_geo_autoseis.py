@@ -0,0 +1,92 @@
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+import geo_autoseis
+from geo_autoseis import calculate_bat_status, geo_stats, th_low, th_mid, th_high
+from autoseis_summary import SummaryStore
+
+STATUS_KEYS = ['Battery changed 20 Ah / OK', 'Checked / OK', 'New 1 String needed',
+               'New Battery needed', 'New Peg needed', 'PICKUP all']
+
+
+def calculate_bat_status_loop(geo_df):
+    '''  calculate_bat_status before vectorization, lists per row '''
+    days_in_field_type1, days_in_field_type2, days_over_threshold = [], [], []
+    for bat_type, days in zip(geo_df['Battype'].tolist(), geo_df['days_in_field'].tolist()):
+        try:
+            bat_type = int(bat_type)
+        except ValueError:
+            bat_type = 0
+
+        if pd.isnull(days) or bat_type not in [1, 2]:
+            days_in_field_type1.append(np.nan)
+            days_in_field_type2.append(np.nan)
+            days_over_threshold.append(np.nan)
+        elif bat_type == 1:
+            days_in_field_type1.append(days)
+            days_in_field_type2.append(np.nan)
+            days_over_threshold.append(days - geo_autoseis.thresholdtype1)
+        else:
+            days_in_field_type1.append(np.nan)
+            days_in_field_type2.append(days)
+            days_over_threshold.append(days - geo_autoseis.thresholdtype2)
+
+    return days_in_field_type1, days_in_field_type2, days_over_threshold
+
+
+def make_geo_df(rows=500):
+    rng = np.random.default_rng(0)
+    bat_types = rng.choice(np.array([1, 2, 3, 1.0, 2.7, '1', ' 2 ', 'x', '', np.nan], dtype=object),
+                           rows)
+    days_in_field = rng.integers(-5, 60, rows).astype(np.float64)
+    days_in_field[rng.random(rows) < 0.1] = np.nan
+    saved = [datetime(2020, 3, 2, 10) if rng.random() < 0.5 else datetime(2020, 3, 1, 10)
+             for _ in range(rows)]
+    return pd.DataFrame({'Battype': bat_types, 'days_in_field': days_in_field,
+                         'SAVED_TIMESTAMP': saved,
+                         'GP_TODO': rng.choice(STATUS_KEYS + ['unknown'], rows)})
+
+
+def assert_nan_equal(values, expected):
+    np.testing.assert_array_equal(np.asarray(values, dtype=np.float64),
+                                  np.asarray(expected, dtype=np.float64))
+
+
+def test_calculate_bat_status_equals_loop():
+    geo_df = make_geo_df()
+    for values, expected in zip(calculate_bat_status(geo_df), calculate_bat_status_loop(geo_df)):
+        assert_nan_equal(values, expected)
+
+
+def test_geo_stats_counts_equal_loop(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _date = date(2020, 3, 2)
+    geo_df = make_geo_df()
+    geo_stats(_date, [1, 2], geo_df)
+
+    with SummaryStore() as summary_store:
+        summary = summary_store.query().iloc[0]
+
+    geo_status = geo_df[pd.to_datetime(
+        geo_df['SAVED_TIMESTAMP']).dt.date == _date]['GP_TODO'].tolist()
+    for key in STATUS_KEYS:
+        assert summary[key] == geo_status.count(key), key
+
+    _, _, days_over_threshold = calculate_bat_status_loop(geo_df)
+    bats = {th_low: 0, th_mid: 0, th_high: 0}
+    for days in days_over_threshold:
+        if days >= th_high:
+            bats[th_high] += 1
+        elif days >= th_mid:
+            bats[th_mid] += 1
+        elif days >= th_low:
+            bats[th_low] += 1
+
+    for threshold, count in bats.items():
+        assert summary[f'bats {threshold}d'] == count, threshold
+
+    assert summary['total bats'] == len(geo_df)
+    assert summary['Total'] == sum(geo_status.count(key) for key in STATUS_KEYS)
+    assert summary['swaths'] == '1, 2'
@@ -0,0 +1,143 @@
+from datetime import date, datetime, timedelta
+import numpy as np
+from openpyxl import Workbook
+import pandas as pd
+from geopandas import GeoDataFrame
+from shapely.geometry import Point, box
+from shapely.ops import unary_union
+
+import geo_io
+from geo_io import (BoundaryCache, GeoData, EPSG_31256_adapted, stationvix_to_line_station,
+                    in_swaths, yyyyjjj_to_days, read_geo_file, GEO_COLUMNS)
+from Utils.utils import string_to_value_or_nan
+
+
+def test_boundary_crs_none_is_local(tmp_path, monkeypatch):
+    swaths_bnd_gdf = GeoDataFrame(geometry=[box(-8000, 331000, -7000, 332000)],
+                                  crs=EPSG_31256_adapted)
+    monkeypatch.setattr(geo_io, 'overlay_boundary', lambda *args: swaths_bnd_gdf)
+    monkeypatch.setattr(geo_io.swath_table, 'mtime', 0)
+    boundary_cache = BoundaryCache(cache_file=str(tmp_path / 'boundaries.pickle'))
+    monkeypatch.setattr(boundary_cache, 'shapefile_mtime', lambda: 0)
+
+    boundary_none = boundary_cache.boundary([1], None, False, crs=None)
+    boundary_local = boundary_cache.boundary([1], None, False, crs='local')
+
+    assert boundary_none.geom_equals(boundary_local).all()
+    assert boundary_none.geom_equals(swaths_bnd_gdf).all()
+
+
+def filter_by_swaths_loop(geo_df, swaths_pnt_polygon):
+    '''  the per row filter of filter_geo_data_by_swaths before vectorization '''
+    for index, row in geo_df.iterrows():
+        line = string_to_value_or_nan(str(row['STATIONVIX'])[0:4], 'int')
+        station = string_to_value_or_nan(str(row['STATIONVIX'])[4:8], 'int')
+        point = Point(line, station)
+        if swaths_pnt_polygon.contains(point) or swaths_pnt_polygon.intersects(point):
+            pass
+        else:
+            geo_df = geo_df.drop([index])
+
+    return geo_df.reset_index(drop=True)
+
+
+def test_in_swaths_equals_polygon_loop():
+    # (min RL, max RL, min RP, max RP) of two overlapping and one separate swath
+    swaths_rectangles = np.array([[1000, 1010, 2000, 2050],
+                                  [1005, 1020, 2040, 2100],
+                                  [1100, 1104, 2000, 2010]], dtype=np.float64)
+    swaths_pnt_polygon = unary_union([box(rl_0, rp_0, rl_1, rp_1)
+                                      for rl_0, rl_1, rp_0, rp_1 in swaths_rectangles])
+
+    rng = np.random.default_rng(0)
+    lines = rng.integers(1000, 1110, 400)
+    stations = rng.integers(1990, 2110, 400)
+    stationvix_int = [int(f'{line}{station}') for line, station in zip(lines, stations)]
+    # borders, short and invalid values in a string column
+    stationvix_str = ([str(value) for value in stationvix_int] +
+                      ['10002000', '10202100', '11042010', '11052010', ' 1002030',
+                       '1002', '100220', 'abcd2000', '1000x000', '', 'nan', '+1002030'])
+
+    # eight digit ints take the arithmetic path, a seven digit int the string path
+    for stationvix in [stationvix_int, stationvix_int + [9952030], stationvix_str]:
+        geo_df = pd.DataFrame({'STATIONVIX': stationvix, 'row': range(len(stationvix))})
+        line, station = stationvix_to_line_station(geo_df['STATIONVIX'])
+        filtered_df = geo_df[in_swaths(line, station, swaths_rectangles)]
+
+        expected_df = filter_by_swaths_loop(geo_df, swaths_pnt_polygon)
+        assert not expected_df.empty
+        pd.testing.assert_frame_equal(filtered_df.reset_index(drop=True), expected_df)
+
+
+def bat_start_loop(value):
+    '''  date of a YYYYJJJ value as before vectorization, None if not valid '''
+    bat_start = str(value)
+    try:
+        return date(int(bat_start[0:4]), 1, 1) + timedelta(int(bat_start[4:7]) - 1)
+    except ValueError:
+        return None
+
+
+# ints, floats, NaN, not 7 digits, day 366 of a non leap year and of a leap year
+BATSTART_VALUES = [[2020001, 2020366, 2019366, 2019365, 2021100, 2020000],
+                   [2020001.0, 2019366.0, np.nan, 2020032.5],
+                   [2020001, '2020001', ' 2020001', '2020-001', '20201', '2020',
+                    '202012345', 'abc', '', None, np.nan, 2019366.0, '2019366', 12345678]]
+
+
+def test_yyyyjjj_to_days_equals_loop():
+    for values in BATSTART_VALUES:
+        days, valid = yyyyjjj_to_days(pd.Series(values))
+        for value, day, is_valid in zip(values, days, valid):
+            expected = bat_start_loop(value)
+            assert is_valid == (expected is not None), value
+            if is_valid:
+                assert date(1970, 1, 1) + timedelta(int(day)) == expected, value
+
+
+def test_days_in_field_equals_loop():
+    bat_start = [2020001, 2020100, '2019366', 'abc', np.nan, 2020050, None]
+    bat_start_new = [2020010, np.nan, '', 2020060, 2020070, 2020040, None]
+    gd = GeoData()
+    gd.date = date(2020, 4, 1)
+    gd.geo_df = pd.DataFrame({'BATSTART': bat_start, 'BATSTART_NEW': bat_start_new})
+    gd.add_bat_days_in_field_to_df()
+
+    for start, start_new, days_in_field in zip(bat_start, bat_start_new,
+                                               gd.geo_df['days_in_field']):
+        _date = max(bat_start_loop(start) or date(1900, 1, 1),
+                    bat_start_loop(start_new) or date(1900, 1, 1))
+        if _date == date(1900, 1, 1):
+            assert np.isnan(days_in_field)
+        else:
+            assert days_in_field == (gd.date - _date).days
+
+
+def test_read_geo_file_sidecar_equals_workbook(tmp_path):
+    geo_file = str(tmp_path / '20200301.xlsx')
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(GEO_COLUMNS + ['Comment'])
+    sheet.append([10001234, -7500.5, 331000.25, 'L', 2020045, None,
+                  datetime(2020, 3, 1, 9, 30), datetime(2020, 3, 1, 17, 5), 1, 'x'])
+    sheet.append(['1001 234', -7501.5, 331001.25, 'S', '2020046', 2020060,
+                  'not saved', datetime(2020, 3, 1, 18, 0), None, 'y'])
+    sheet.append([None, -7502.5, 331002.25, None, None, 2020061,
+                  datetime(2020, 3, 2, 8, 0), None, 'todo', None])
+    workbook.save(geo_file)
+
+    cache_dir = str(tmp_path / 'geo_cache')
+    workbook_df = read_geo_file(geo_file, cache_dir=cache_dir)
+    sidecar = tmp_path / 'geo_cache' / '20200301.xlsx.npz'
+    assert sidecar.is_file()
+    with np.load(str(sidecar), allow_pickle=False) as npz:
+        assert all(npz[name].dtype != object for name in npz.files)
+
+    sidecar_df = read_geo_file(geo_file, cache_dir=cache_dir)
+    assert list(workbook_df.columns) == GEO_COLUMNS + ['Line', 'Station']
+    pd.testing.assert_frame_equal(sidecar_df, workbook_df)
+    for column in workbook_df.columns:
+        assert ([type(value) for value in sidecar_df[column]] ==
+                [type(value) for value in workbook_df[column]])
+
+    assert workbook_df['Line'].tolist()[:2] == [1000, 1001]
@@ -0,0 +1,106 @@
+import os
+import threading
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+import mercantile
+import numpy as np
+import pytest
+from PIL import Image
+
+import osm_tiles
+from osm_tiles import TileCache, TILE_PIXELS
+
+ZOOM = 12
+TILES = [mercantile.Tile(x, y, ZOOM) for y in (1420, 1421) for x in (2236, 2237)]
+
+
+class TileHandler(SimpleHTTPRequestHandler):
+    ''' serves the fake tile directory and counts the requests '''
+    requests = []
+
+    def do_GET(self):
+        self.requests.append(self.path)
+        super().do_GET()
+
+    def log_message(self, *args):
+        pass
+
+
+def tile_color(tile):
+    return (tile.x % 256, tile.y % 256, 100, 255)
+
+
+@pytest.fixture
+def tile_server(tmp_path, monkeypatch):
+    '''  local stand-in tile server of TILES as png, OSM_TILE_URL set to it '''
+    tile_root = tmp_path / 'server'
+    for tile in TILES:
+        os.makedirs(tile_root / str(tile.z) / str(tile.x), exist_ok=True)
+        Image.new('RGBA', (TILE_PIXELS, TILE_PIXELS), tile_color(tile)).save(
+            tile_root / str(tile.z) / str(tile.x) / f'{tile.y}.png')
+
+    TileHandler.requests = []
+    server = ThreadingHTTPServer(('127.0.0.1', 0),
+                                 partial(TileHandler, directory=str(tile_root)))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(osm_tiles, 'OSM_TILE_URL',
+                        f'http://127.0.0.1:{server.server_address[1]}/{{z}}/{{x}}/{{y}}.png')
+    yield TileHandler.requests
+    server.shutdown()
+    server.server_close()
+
+
+def test_mosaic_downloads_once_and_reads_cache(tile_server, tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    tile_cache = TileCache(offline=False, cache_dir=cache_dir)
+    image, extent = tile_cache.mosaic(TILES)
+
+    assert len(tile_server) == len(TILES)
+    assert image.shape == (2 * TILE_PIXELS, 2 * TILE_PIXELS, 4)
+    for tile in TILES:
+        row = (tile.y - TILES[0].y) * TILE_PIXELS
+        col = (tile.x - TILES[0].x) * TILE_PIXELS
+        assert tuple(image[row + 10, col + 10]) == tile_color(tile)
+    upper_left = mercantile.xy_bounds(TILES[0])
+    assert extent[0] == upper_left.left and extent[3] == upper_left.top
+    assert all(tile_cache.is_cached(tile) for tile in TILES)
+
+    # cached tiles are not requested again, also not by a new instance
+    image_cached, _ = TileCache(offline=False, cache_dir=cache_dir).mosaic(TILES)
+    assert len(tile_server) == len(TILES)
+    np.testing.assert_array_equal(image_cached, image)
+
+
+def test_offline_uses_cache_only(tile_server, tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    TileCache(offline=False, cache_dir=cache_dir).mosaic(TILES[:2])
+    requests = len(tile_server)
+
+    image, _ = TileCache(offline=True, cache_dir=cache_dir).mosaic(TILES)
+    assert len(tile_server) == requests
+    # tiles not in the cache are transparent
+    assert tuple(image[10, 10]) == tile_color(TILES[0])
+    assert image[TILE_PIXELS + 10, 10, 3] == 0
+
+
+def test_evict_only_over_max_bytes(tile_server, tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / 'cache')
+    tile_cache = TileCache(offline=False, cache_dir=cache_dir)
+    evicted = []
+    evict = tile_cache.evict
+    monkeypatch.setattr(tile_cache, 'evict', lambda: evicted.append(1) or evict())
+
+    tile_cache.mosaic(TILES)
+    assert not evicted
+    assert tile_cache.size == tile_cache.cache_size()
+
+    # a cap of about two tiles, the least recently used tiles are removed
+    tile_size = tile_cache.size // len(TILES)
+    small_cache = TileCache(offline=False, cache_dir=str(tmp_path / 'small'),
+                            max_bytes=2 * tile_size + tile_size // 2)
+    small_cache.mosaic(TILES)
+    assert small_cache.size <= small_cache.max_bytes
+    assert small_cache.size == small_cache.cache_size()
+    assert 0 < sum(small_cache.is_cached(tile) for tile in TILES) < len(TILES)
@@ -0,0 +1,103 @@
+import os
+import csv
+
+import numpy as np
+import pytest
+
+import pss_cache
+from pss_cache import PssCache, META_FILE
+
+
+def write_pss_file(pss_file, force=60.0, records=3):
+    header = ['Void', 'File Num', 'Force Avg', 'Comment', 'Unit ID', 'Lat', 'Lon']
+    rows = [['', 100 + i, force, 'ok', 1 + i % 2, 48.3, 16.6] for i in range(records)]
+    rows[-1][0] = 'Void'
+    with open(pss_file, 'wt', newline='') as csv_file:
+        csv.writer(csv_file).writerows([header] + rows)
+
+
+def assert_columns_equal(pss_columns, other):
+    assert pss_columns.header == other.header
+    assert pss_columns.kinds == other.kinds
+    for column, other_column in zip(pss_columns.columns, other.columns):
+        np.testing.assert_array_equal(column, other_column)
+
+
+def no_parse(csv_file):
+    raise AssertionError(f'{csv_file} parsed on a cache hit')
+
+
+def test_cache_hit_does_not_parse(tmp_path, monkeypatch):
+    pss_file = str(tmp_path / 'PSS_20200301.csv')
+    write_pss_file(pss_file)
+    cache = PssCache(cache_dir=str(tmp_path / 'cache'))
+
+    parsed = cache.read(pss_file)
+    assert_columns_equal(parsed, pss_cache.parse_pss_csv(pss_file))
+    assert parsed.kinds == ['str', 'int', 'float', 'str', 'int', 'float', 'float']
+
+    monkeypatch.setattr(pss_cache, 'parse_pss_csv', no_parse)
+    cached = cache.read(pss_file)
+    assert_columns_equal(cached, parsed)
+    assert all(isinstance(column, np.memmap) for column in cached.columns)
+
+
+def test_cache_invalidated_after_rewrite(tmp_path):
+    pss_file = str(tmp_path / 'PSS_20200301.csv')
+    write_pss_file(pss_file, force=60.0)
+    cache = PssCache(cache_dir=str(tmp_path / 'cache'))
+    stat = os.stat(pss_file)
+    assert cache.read(pss_file).columns[2][0] == 60.0
+
+    # same size, only the mtime changes
+    write_pss_file(pss_file, force=70.0)
+    os.utime(pss_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert os.stat(pss_file).st_size == stat.st_size
+    assert cache.read(pss_file).columns[2][0] == 70.0
+
+    # more records, the size changes
+    write_pss_file(pss_file, force=80.0, records=5)
+    pss_columns = cache.read(pss_file)
+    assert len(pss_columns.columns[0]) == 5
+    assert_columns_equal(pss_columns, pss_cache.parse_pss_csv(pss_file))
+    assert len(cache.entries()) == 1
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    pss_files = [str(tmp_path / f'PSS_2020030{day}.csv') for day in range(1, 5)]
+    for pss_file in pss_files:
+        write_pss_file(pss_file)
+
+    cache = PssCache(cache_dir=cache_dir, max_bytes=10**9)
+    entries = [cache.entry_dir(pss_file) for pss_file in pss_files]
+    for i, (pss_file, entry) in enumerate(zip(pss_files[:3], entries)):
+        cache.read(pss_file)
+        os.utime(os.path.join(entry, META_FILE), (1000 + i, 1000 + i))
+
+    entry_size = cache.size() // 3
+
+    # a hit on the oldest entry makes it the most recently used
+    cache.read(pss_files[0])
+
+    cache.max_bytes = 3 * entry_size
+    cache.read(pss_files[3])
+    assert sorted(entry for _, _, entry in cache.entries()) == sorted(
+        [entries[0], entries[2], entries[3]])
+    assert cache.size() <= cache.max_bytes
+
+    # the entry just read is kept even if it alone is over the limit
+    cache.max_bytes = 1
+    cache.read(pss_files[1])
+    assert [entry for _, _, entry in cache.entries()] == [entries[1]]
+
+
+@pytest.mark.parametrize('content', ['', 'Void,File Num\n'])
+def test_cache_empty_file(tmp_path, content):
+    pss_file = str(tmp_path / 'PSS_20200301.csv')
+    with open(pss_file, 'wt') as csv_file:
+        csv_file.write(content)
+
+    cache = PssCache(cache_dir=str(tmp_path / 'cache'))
+    assert_columns_equal(cache.read(pss_file), pss_cache.parse_pss_csv(pss_file))
+    assert_columns_equal(cache.read(pss_file), pss_cache.parse_pss_csv(pss_file))
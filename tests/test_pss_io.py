@@ -0,0 +1,107 @@
+import csv
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import pss_io_df
+from pss_io import (PssData, PssDataStream, read_pss_file, read_pss_table,
+                    make_vp_gpd_from_arrays)
+
+
+def make_pss_rows():
+    '''  header and rows of a PSS file with fleets {1, 2, 3}, {4, 5} and the
+         sub fleet {1, 2}, a void and a zero force row
+    '''
+    header = ['Void', 'File Num', 'Force Avg', 'Comment', 'Unit ID', 'Lat', 'Lon']
+    rows = []
+    fleets = [(1, 2, 3), (4, 5), (1, 2), (1, 2, 3), (4, 5)]
+    for record, fleet in enumerate(fleets, start=100):
+        for unit_id in fleet:
+            rows.append(['', record, 60.0, '', unit_id, 48.3, 16.6])
+
+    rows.append(['Void', 200, 60.0, '', 7, 48.3, 16.6])
+    rows.append(['', 201, 0.0, '', 8, 48.3, 16.6])
+    return [header] + rows
+
+
+def test_stream_fleets_equal_pss_data(tmp_path):
+    rows = make_pss_rows()
+    pss_file = str(tmp_path / 'PSS_20200301.csv')
+    with open(pss_file, 'wt', newline='') as csv_file:
+        csv.writer(csv_file).writerows(rows)
+
+    pss_data = PssData(rows)
+    pss_data.determine_fleets()
+
+    # chunks of 2 rows split the records over chunks
+    pss_stream = PssDataStream(pss_file, chunk_rows=2)
+    pss_stream.determine_fleets()
+
+    assert set(pss_stream.fleets) == set(pss_data.fleets)
+    assert set(pss_stream.fleets) == {frozenset({1, 2, 3}), frozenset({4, 5})}
+
+
+def test_read_pss_file_deprecated(tmp_path):
+    pss_file = str(tmp_path / 'PSS_20200301.csv')
+    with open(pss_file, 'wt', newline='') as csv_file:
+        csv.writer(csv_file).writerows(make_pss_rows())
+
+    with pytest.warns(DeprecationWarning):
+        pss_table = read_pss_file(pss_file)
+
+    expected = read_pss_table(pss_file)
+    assert pss_table.header == expected.header
+    assert len(pss_table) == len(expected)
+    for column in ['File Num', 'Unit ID', 'Force Avg']:
+        np.testing.assert_array_equal(pss_table[column], expected[column])
+
+
+def test_pss_io_df_sorted_on_file_num():
+    header, *rows = make_pss_rows()
+    pss_df = pd.DataFrame(rows[::-1], columns=header)
+    pss_df['Void'] = pss_df['Void'].replace('', np.nan)
+    pss_df['Comment'] = pss_df['Comment'].replace('', np.nan)
+
+    clean_df = pss_io_df.PssData(pss_df, 35, 60).get_pss_df()
+    expected = pss_df[(pss_df['Void'] != 'Void') & (pss_df['Force Avg'] != 0)]
+    expected = expected.sort_values('File Num', kind='mergesort')
+    assert clean_df['File Num'].tolist() == expected['File Num'].tolist()
+    assert clean_df['index'].tolist() == expected.index.tolist()
+    assert clean_df.index.tolist() == list(range(len(expected)))
+
+
+def make_record_rows():
+    '''  header and rows of three records, the first row of record 101 has
+         invalid coordinates and record 102 is the last record of the file
+    '''
+    header = ['Void', 'File Num', 'Force Avg', 'Comment', 'Unit ID', 'Lat', 'Lon']
+    rows = [['', 100, 50.0, '', 1, 48.2, 16.4],
+            ['', 100, 52.0, '', 2, 48.2, 16.4],
+            ['', 101, 90.0, '', 1, 0.0, 0.0],
+            ['', 101, 60.0, '', 2, 48.4, 16.6],
+            ['', 101, 62.0, '', 3, 48.4, 16.6],
+            ['', 102, 70.0, '', 1, 48.3, 16.5]]
+    return [header] + rows
+
+
+def assert_vps(vp_gpd, forces):
+    # the invalid row of 101 is ignored instead of adding 101 to the sums of 100
+    assert vp_gpd['File Num'].tolist() == [100, 101, 102]
+    np.testing.assert_allclose(forces, [51.0, 61.0, 70.0])
+    expected = make_vp_gpd_from_arrays(np.array([16.4, 16.6, 16.5]),
+                                       np.array([48.2, 48.4, 48.3]))
+    np.testing.assert_allclose(vp_gpd.geometry.x, expected.geometry.x)
+    np.testing.assert_allclose(vp_gpd.geometry.y, expected.geometry.y)
+
+
+def test_make_vp_gpd_last_record_and_invalid_coordinate():
+    vp_gpd = PssData(make_record_rows()).make_vp_gpd('Force Avg')
+    assert_vps(vp_gpd, vp_gpd['Force Avg'])
+
+
+def test_pss_io_df_make_vp_gpd_last_record_and_invalid_coordinate():
+    header, *rows = make_record_rows()
+    pss_df = pd.DataFrame(rows, columns=header).replace('', np.nan)
+    vp_gpd = pss_io_df.PssData(pss_df, 35, 60).make_vp_gpd()
+    assert_vps(vp_gpd, vp_gpd['forces'])
@@ -0,0 +1,99 @@
+import csv
+import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+from geopandas import points_from_xy
+from shapely.geometry import Polygon
+
+import pss_store
+from pss_io import PssData, read_pss_table
+from pss_store import PssStore, STORE_ATTRIBUTES
+
+DAY = datetime.date(2020, 3, 1)
+
+
+def write_pss_file(pss_file):
+    '''  PSS file of a 6 x 6 grid of VPs of two units each, a VP every 20 minutes
+         from 06:00, every fifth VP without a Phase Avg
+    '''
+    header = ['Void', 'File Num', 'Date', 'Time', 'Comment', 'Unit ID', 'Force Avg',
+              'Phase Avg', 'Lat', 'Lon']
+    rows = []
+    for i in range(36):
+        file_num = 1000 + i
+        lat = 48.20 + 0.002 * (i // 6)
+        lon = 16.40 + 0.003 * (i % 6)
+        _time = f'{6 + i // 3:02}:{20 * (i % 3):02}:00'
+        phase = '' if i % 5 == 0 else 2.0
+        for unit_id in (1, 2):
+            rows.append(['', file_num, '2020-03-01', _time, '', unit_id, 40.0 + i,
+                         phase, lat, lon])
+
+    with open(pss_file, 'wt', newline='') as csv_file:
+        csv.writer(csv_file).writerows([header] + rows)
+
+
+@pytest.fixture
+def store_and_records(tmp_path, monkeypatch):
+    pss_file = str(tmp_path / 'PSS_20200301.csv')
+    write_pss_file(pss_file)
+    monkeypatch.setattr(pss_store, 'pss_file_for_date', lambda _date: pss_file)
+
+    vp_records = PssData(read_pss_table(pss_file)).make_vp_records(DAY, STORE_ATTRIBUTES)
+    with PssStore(str(tmp_path / 'pss_store.sqlite')) as store:
+        assert store.update([DAY], workers=1) == [DAY]
+        yield store, vp_records
+
+
+def file_nums(vp_df):
+    return sorted(vp_df['File Num'].astype(int).tolist())
+
+
+def test_store_bbox(store_and_records):
+    store, vp_records = store_and_records
+    x, y = vp_records['x'], vp_records['y']
+    bbox = (x.quantile(0.2), y.quantile(0.3), x.quantile(0.7), y.quantile(0.9))
+
+    expected = vp_records[x.between(bbox[0], bbox[2]) & y.between(bbox[1], bbox[3])]
+    assert 0 < len(expected) < len(vp_records)
+    vp_gpd = store.vps_in_bbox(bbox)
+    assert file_nums(vp_gpd) == file_nums(expected)
+    np.testing.assert_allclose(vp_gpd.geometry.x, expected['x'])
+
+    expected = expected[expected['Phase Avg'].notna()]
+    assert 0 < len(expected) < len(vp_gpd)
+    assert file_nums(store.vps_in_bbox(bbox, attribute='Phase Avg')) == file_nums(expected)
+
+
+def test_store_polygon(store_and_records):
+    store, vp_records = store_and_records
+    x, y = vp_records['x'], vp_records['y']
+    polygon = Polygon([(x.min() - 1, y.min() - 1), (x.max() + 1, y.min() - 1),
+                       (x.min() - 1, y.max() + 1)])
+
+    expected = vp_records[points_from_xy(x, y).within(polygon)]
+    assert 0 < len(expected) < len(vp_records)
+    assert file_nums(store.vps_in_polygon(polygon)) == file_nums(expected)
+
+    # combined with a bbox on the lower half
+    bbox = (x.min(), y.min(), x.max(), y.median())
+    expected = expected[expected['y'] <= bbox[3]]
+    assert file_nums(store.query(bbox=bbox, polygon=polygon)) == file_nums(expected)
+
+
+def test_store_time_window(store_and_records):
+    store, vp_records = store_and_records
+    start_time, end_time = pd.Timestamp('2020-03-01 08:20'), pd.Timestamp('2020-03-01 11:00')
+
+    times = pd.to_datetime(vp_records['Time'])
+    expected = vp_records[(times >= start_time) & (times < end_time)]
+    assert 0 < len(expected) < len(vp_records)
+    vp_gpd = store.vps_in_time_window(start_time, end_time)
+    assert file_nums(vp_gpd) == file_nums(expected)
+    assert vp_gpd['Time'].tolist() == expected['Time'].tolist()
+
+    np.testing.assert_allclose(vp_gpd['Force Avg'], expected['Force Avg'].to_numpy())
+    assert file_nums(store.query(date_range=(DAY, DAY))) == file_nums(vp_records)
+    assert store.query(date_range=(DAY + datetime.timedelta(1),) * 2).empty
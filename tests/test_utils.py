@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+
+from Utils.utils import (average_with_outlier_removed, average_with_outlier_removed_segments,
+                         string_to_value_or_nan, strings_to_values_or_nan)
+
+
+def test_average_with_outlier_removed_segments_equals_loop():
+    # average_with_outlier_removed_segments against average_with_outlier_removed
+    # over random segments, including empty segments
+    rng = np.random.default_rng(0)
+    for _ in range(1000):
+        counts = rng.integers(0, 8, rng.integers(0, 50))
+        offsets = np.r_[0, np.cumsum(counts)]
+        allowed_range = rng.choice([0.5, 3, 10])
+        values = np.round(rng.normal(50, rng.choice([0.5, 3, 10]), offsets[-1]),
+                          rng.integers(0, 3))
+        averages, valid = average_with_outlier_removed_segments(
+            values, offsets, allowed_range)
+
+        for i in range(counts.size):
+            expected = average_with_outlier_removed(
+                values[offsets[i]:offsets[i+1]].tolist(), allowed_range)
+            assert (expected is not None) == valid[i], (values, offsets, i)
+            assert expected is None or expected == averages[i], (values, offsets, i)
+
+
+def test_strings_to_values_or_nan_equals_string_to_value_or_nan():
+    values = ['12', ' 7 ', '-3', '+4', '1.5', 'x', '', None, np.nan, 8, 9.0, 9.5,
+              '20200229', '20190229', '20181118', '2018111', 20181118, 'abcd1118']
+    for type in ['int', 'float', 'date']:
+        result = strings_to_values_or_nan(values, type)
+        for value, converted in zip(values, result):
+            expected = string_to_value_or_nan(value, type)
+            if type == 'int' and isinstance(value, float) and float(value).is_integer():
+                # numbers are taken as they are, an integral float is a valid int
+                expected = int(value)
+
+            if pd.isnull(expected):
+                assert pd.isnull(converted), (type, value, converted)
+            else:
+                assert converted == expected, (type, value, converted)